@@ -0,0 +1,102 @@
+import heapq
+import threading
+import time
+from collections import deque
+
+
+class AlarmStats:
+    """Running totals for one (ErrorCode, SubErrorCode)"""
+    __slots__ = ('count', 'closed', 'total_duration', 'max_duration', 'last_on')
+
+    def __init__(self):
+        self.count = 0
+        self.closed = 0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.last_on = None
+
+
+class AlarmIndex:
+    """Pairs MCALARMON with MCALARMOFF and keeps per-code counters in memory"""
+
+    def __init__(self, history_size=5000):
+        self._lock = threading.Lock()
+        self._open = {}
+        self._stats = {}
+        self.history = deque(maxlen=history_size)
+
+    def alarm_on(self, machine, module, error_code, sub_code, when):
+        key = (machine, str(module), error_code, sub_code)
+        with self._lock:
+            if key in self._open:
+                # Repeated ON without an OFF: keep the original start
+                return False
+            self._open[key] = when
+            stats = self._stats.get((error_code, sub_code))
+            if stats is None:
+                stats = self._stats[(error_code, sub_code)] = AlarmStats()
+            stats.count += 1
+            stats.last_on = when
+            return True
+
+    def alarm_off(self, machine, module, error_code, sub_code, when):
+        """Close an open alarm. Returns the closed alarm record, or None if it was not open"""
+        key = (machine, str(module), error_code, sub_code)
+        with self._lock:
+            started = self._open.pop(key, None)
+            if started is None:
+                return None
+            duration = max(when - started, 0.0)
+            stats = self._stats[(error_code, sub_code)]
+            stats.closed += 1
+            stats.total_duration += duration
+            stats.max_duration = max(stats.max_duration, duration)
+            record = {'machine': machine,
+                      'module': str(module),
+                      'error_code': error_code,
+                      'sub_error_code': sub_code,
+                      'start': started,
+                      'end': when,
+                      'duration': duration}
+            self.history.append(record)
+            return record
+
+    def active(self):
+        now = time.time()
+        with self._lock:
+            return [{'machine': machine,
+                     'module': module,
+                     'error_code': error_code,
+                     'sub_error_code': sub_code,
+                     'start': started,
+                     'elapsed': round(now - started, 1)}
+                    for (machine, module, error_code, sub_code), started in self._open.items()]
+
+    def _code_summary(self, code, stats):
+        return {'error_code': code[0],
+                'sub_error_code': code[1],
+                'count': stats.count,
+                'closed': stats.closed,
+                'total_duration': round(stats.total_duration, 1),
+                'max_duration': round(stats.max_duration, 1),
+                'mttr': round(stats.total_duration / stats.closed, 1) if stats.closed else None}
+
+    def mttr(self, error_code=None, sub_code=None):
+        """Mean time to repair per code, or for a single code"""
+        with self._lock:
+            if error_code is not None:
+                matches = {code: stats for code, stats in self._stats.items()
+                           if code[0] == error_code and (sub_code is None or code[1] == sub_code)}
+            else:
+                matches = self._stats
+            return [self._code_summary(code, stats) for code, stats in matches.items()]
+
+    def top(self, limit=10):
+        """Codes with the largest cumulative alarm duration"""
+        with self._lock:
+            largest = heapq.nlargest(limit, self._stats.items(), key=lambda item: item[1].total_duration)
+            return [self._code_summary(code, stats) for code, stats in largest]
+
+    def recent(self, limit=100):
+        with self._lock:
+            return list(self.history)[-limit:][::-1]
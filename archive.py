@@ -0,0 +1,242 @@
+import glob
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date
+
+# Optional dependency (see requirements.txt); without it the archive is disabled
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = ds = pq = None
+
+from db_catalog import TIME_COLUMNS
+
+backend_logger = logging.getLogger("backend_logger")
+
+ARCHIVE_DIR = "archive"
+COMPRESSION = "zstd"
+BATCH_ROWS = 100_000
+# production_logs is partitioned by command as well, the other tables by date only
+EVENT_PARTITIONED = {'production_logs': 'event_name'}
+
+_DAY_FILE = re.compile(r"production_(\d{8})\.db$")
+AVAILABLE = pa is not None
+MISSING = "pyarrow is not installed (pip install pyarrow); columnar archive disabled"
+
+
+def _arrow_type(declared):
+    types = {
+        'INTEGER': pa.int64(),
+        'FLOAT': pa.float64(),
+        'REAL': pa.float64(),
+        'DATETIME': pa.timestamp('us'),
+    }
+    return types.get(declared.upper().split("(")[0], pa.string())
+
+
+def _schema(db, table):
+    fields = []
+    for _, name, declared, *_ in db.execute(f"PRAGMA table_info({table})"):
+        fields.append(pa.field(name, _arrow_type(declared)))
+    return pa.schema(fields)
+
+
+def _column(values, field):
+    if pa.types.is_timestamp(field.type):
+        values = [datetime.fromisoformat(v) if v else None for v in values]
+    elif pa.types.is_string(field.type):
+        values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+    return pa.array(values, type=field.type)
+
+
+def _write(db, table, schema, sql, args, path):
+    """Stream one query into a parquet file. Returns the rows written"""
+    cursor = db.execute(sql, args)
+    written = 0
+    with pq.ParquetWriter(path, schema, compression=COMPRESSION) as writer:
+        while True:
+            rows = cursor.fetchmany(BATCH_ROWS)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            writer.write_table(pa.table([_column(columns[i], field) for i, field in enumerate(schema)],
+                                        schema=schema))
+            written += len(rows)
+    return written
+
+
+def export_day(db_path, archive_dir=ARCHIVE_DIR):
+    """Convert one closed daily database into parquet files under
+    <archive_dir>/<table>/date=YYYY-MM-DD[/event=<command>]/part-0.parquet.
+
+    Runs in a worker process (see _export_in_subprocess). Every table is
+    written to a staging directory, its row count checked against SQLite,
+    then moved into place.
+    """
+    if not AVAILABLE:
+        raise RuntimeError(MISSING)
+    day = datetime.strptime(_DAY_FILE.search(db_path).group(1), "%Y%m%d").date()
+    db = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    counts = {}
+    try:
+        present = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for table in TIME_COLUMNS:
+            if table not in present:
+                continue
+            expected = db.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+            schema = _schema(db, table)
+            order = TIME_COLUMNS[table]
+            final = os.path.join(archive_dir, table, f"date={day.isoformat()}")
+            # Hidden from read_archive until verified and renamed
+            staging = os.path.join(archive_dir, table, f".date={day.isoformat()}.tmp")
+            shutil.rmtree(staging, ignore_errors=True)
+            os.makedirs(staging)
+            written = 0
+            event_column = EVENT_PARTITIONED.get(table)
+            if event_column:
+                events = [row[0] for row in db.execute(f"SELECT DISTINCT {event_column} FROM {table}")]
+                for event in events:
+                    directory = os.path.join(staging, f"event={event}")
+                    os.makedirs(directory)
+                    written += _write(db, table, schema,
+                                      f"SELECT * FROM {table} WHERE {event_column} IS ? ORDER BY {order}",
+                                      (event,), os.path.join(directory, "part-0.parquet"))
+            else:
+                written = _write(db, table, schema, f"SELECT * FROM {table} ORDER BY {order}", (),
+                                 os.path.join(staging, "part-0.parquet"))
+            stored = sum(pq.read_metadata(path).num_rows
+                         for path in glob.glob(os.path.join(staging, "**", "*.parquet"), recursive=True))
+            if not expected == written == stored:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise ValueError(f"{table} of {day}: {expected} rows in SQLite, {stored} archived")
+            shutil.rmtree(final, ignore_errors=True)
+            os.replace(staging, final)
+            counts[table] = stored
+    finally:
+        db.close()
+    manifest = {'day': day.isoformat(), 'source': os.path.basename(db_path),
+                'exported': datetime.now().isoformat(), 'rows': counts}
+    with open(_manifest_path(archive_dir, day), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def _manifest_path(archive_dir, day):
+    return os.path.join(archive_dir, "_manifests", f"{day.isoformat()}.json")
+
+
+def _export_in_subprocess(db_path, archive_dir):
+    """export_day in a fresh interpreter that runs only this module.
+
+    A multiprocessing spawn worker would re-import the server's __main__ and
+    repeat its module-level setup (logging handlers, the interface).
+    """
+    done = subprocess.run([sys.executable, os.path.abspath(__file__), db_path, archive_dir],
+                          capture_output=True, text=True)
+    if done.returncode:
+        lines = done.stderr.strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"exit status {done.returncode}")
+    return json.loads(done.stdout)
+
+
+class ArchiveExporter:
+    """Exports closed daily databases to the parquet archive, one worker process per day"""
+
+    def __init__(self, directory=".", archive_dir=ARCHIVE_DIR, workers=2):
+        self.directory = directory
+        self.archive_dir = os.path.join(directory, archive_dir)
+        self.workers = workers
+        os.makedirs(os.path.join(self.archive_dir, "_manifests"), exist_ok=True)
+
+    def pending(self):
+        """Daily files of days before today that have no manifest yet"""
+        today = date.today()
+        found = []
+        for path in sorted(glob.glob(os.path.join(self.directory, "production_*.db"))):
+            match = _DAY_FILE.search(os.path.basename(path))
+            if not match:
+                continue
+            day = datetime.strptime(match.group(1), "%Y%m%d").date()
+            if day < today and not os.path.exists(_manifest_path(self.archive_dir, day)):
+                found.append(path)
+        return found
+
+    def run(self):
+        """Export every pending day. Returns the manifests written"""
+        if not AVAILABLE:
+            return []
+        paths = self.pending()
+        if not paths:
+            return []
+        manifests = []
+        # Threads only wait on the worker processes, which do the conversion
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="archive") as pool:
+            futures = {pool.submit(_export_in_subprocess, path, self.archive_dir): path for path in paths}
+            for future, path in futures.items():
+                try:
+                    manifest = future.result()
+                    manifests.append(manifest)
+                    backend_logger.info("Archived %s: %s rows", os.path.basename(path),
+                                        sum(manifest['rows'].values()))
+                except Exception as e:
+                    backend_logger.error("Failed to archive %s: %s", os.path.basename(path), e)
+        return manifests
+
+    def manifests(self):
+        found = []
+        for path in sorted(glob.glob(os.path.join(self.archive_dir, "_manifests", "*.json"))):
+            with open(path, encoding="utf-8") as f:
+                found.append(json.load(f))
+        return found
+
+
+def read_archive(table, start=None, end=None, columns=None, commands=None, archive_dir=ARCHIVE_DIR):
+    """Arrow table of archived rows between start and end (datetimes).
+
+    Date and command partitions outside the filter are skipped without
+    being opened, the time filter is pushed down to parquet row groups and
+    only `columns` are read.
+    """
+    if not AVAILABLE:
+        raise RuntimeError(MISSING)
+    if table not in TIME_COLUMNS:
+        raise ValueError(f"Unknown table: {table}")
+    root = os.path.join(archive_dir, table)
+    if not os.path.isdir(root):
+        return pa.table({})
+    partitioning = ds.partitioning(
+        pa.schema([('date', pa.string())] + ([('event', pa.string())] if table in EVENT_PARTITIONED else [])),
+        flavor="hive")
+    dataset = ds.dataset(root, format="parquet", partitioning=partitioning,
+                         exclude_invalid_files=True, ignore_prefixes=[".", "_"])
+    time_column = TIME_COLUMNS[table]
+    condition = None
+
+    def both(expr):
+        return expr if condition is None else condition & expr
+    if start is not None:
+        # ISO dates sort as strings, so the date partition can be pruned too
+        condition = both((ds.field('date') >= start.date().isoformat()) &
+                         (ds.field(time_column) >= pa.scalar(start, type=pa.timestamp('us'))))
+    if end is not None:
+        condition = both((ds.field('date') <= end.date().isoformat()) &
+                         (ds.field(time_column) <= pa.scalar(end, type=pa.timestamp('us'))))
+    if commands:
+        if table not in EVENT_PARTITIONED:
+            raise ValueError(f"{table} is not partitioned by command")
+        condition = both(ds.field('event').isin(list(commands)))
+    return dataset.to_table(columns=columns, filter=condition)
+
+
+if __name__ == "__main__":
+    # Worker entry point: python archive.py <production_YYYYMMDD.db> <archive dir>
+    print(json.dumps(export_day(sys.argv[1], sys.argv[2])))
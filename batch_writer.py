@@ -0,0 +1,81 @@
+import threading
+import time
+import logging
+import sqlalchemy as sa
+
+backend_logger = logging.getLogger("backend_logger")
+
+
+class BatchWriter:
+    """Buffers ORM rows and writes them in one transaction per batch.
+
+    A full batch is flushed by add() itself, or, when `on_full` is set, by
+    whoever that callback wakes up. add_urgent() makes the batch due at once.
+    """
+
+    def __init__(self, get_session, model, max_rows=100, max_age=10.0, on_full=None):
+        self._get_session = get_session
+        self.model = model
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._rows = []
+        self._first_at = None
+        self._urgent = False
+        self.on_full = on_full
+        self.written = 0
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, **row):
+        with self._lock:
+            if not self._rows:
+                self._first_at = time.monotonic()
+            self._rows.append(row)
+            full = len(self._rows) >= self.max_rows
+        if full:
+            if self.on_full:
+                self.on_full()
+            else:
+                self.flush()
+
+    def add_urgent(self, **row):
+        """Add a row that should be written without waiting for the batch to fill or age"""
+        with self._lock:
+            if not self._rows:
+                self._first_at = time.monotonic()
+            self._rows.append(row)
+            self._urgent = True
+        if self.on_full:
+            self.on_full()
+        else:
+            self.flush()
+
+    def due(self):
+        with self._lock:
+            return bool(self._rows) and (self._urgent or len(self._rows) >= self.max_rows or
+                                         time.monotonic() - self._first_at >= self.max_age)
+
+    def flush_if_due(self):
+        if self.due():
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows, self._rows = self._rows, []
+            self._urgent = False
+        if not rows:
+            return 0
+        session = self._get_session()
+        try:
+            session.execute(sa.insert(self.model), rows)
+            session.commit()
+            self.written += len(rows)
+            return len(rows)
+        except Exception as e:
+            session.rollback()
+            backend_logger.error("Failed to write %s %s rows: %s", len(rows), self.model.__tablename__, str(e))
+            return 0
+        finally:
+            session.close()
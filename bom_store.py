@@ -0,0 +1,108 @@
+import hashlib
+import threading
+import time
+from collections import deque
+
+
+class BomVersion:
+    """One immutable BOMLIST of a program, with its lookup indexes built once"""
+    __slots__ = ('program', 'version', 'digest', 'received', 'items',
+                 'part_refs', 'ref_part', 'blocks')
+
+    def __init__(self, program, version, digest, items, received=None):
+        self.program = program
+        self.version = version
+        self.digest = digest
+        self.received = received or time.time()
+        # (block, reference) -> part
+        self.items = {(item['block'], item['reference']): item['part'] for item in items}
+        self.part_refs = {}
+        self.ref_part = {}
+        self.blocks = {}
+        for (block, ref), part in self.items.items():
+            self.part_refs.setdefault(part, []).append(ref)
+            self.ref_part[ref] = part
+            self.blocks.setdefault(block, []).append(ref)
+
+    def summary(self):
+        return {'program': self.program,
+                'version': self.version,
+                'hash': self.digest,
+                'received': self.received,
+                'items': len(self.items),
+                'parts': len(self.part_refs),
+                'blocks': len(self.blocks)}
+
+    def to_dict(self):
+        return {**self.summary(),
+                'part_refs': self.part_refs,
+                'blocks': self.blocks}
+
+
+def bom_digest(items):
+    h = hashlib.sha1()
+    for item in items:
+        h.update(f"{item['block']}\t{item['part']}\t{item['reference']}\n".encode())
+    return h.hexdigest()
+
+
+def bom_diff(old, new):
+    """Added, removed and changed (block, reference) placements between two versions"""
+    old_items = old.items if old else {}
+    added = [{'block': b, 'reference': r, 'part': p}
+             for (b, r), p in new.items.items() if (b, r) not in old_items]
+    removed = [{'block': b, 'reference': r, 'part': p}
+               for (b, r), p in old_items.items() if (b, r) not in new.items]
+    changed = [{'block': b, 'reference': r, 'from': old_items[(b, r)], 'to': p}
+               for (b, r), p in new.items.items() if (b, r) in old_items and old_items[(b, r)] != p]
+    return {'from': old.version if old else None,
+            'to': new.version,
+            'added': added,
+            'removed': removed,
+            'changed': changed}
+
+
+class BomStore:
+    """BOM versions per program, keyed by content hash"""
+
+    def __init__(self, keep_versions=10):
+        self._lock = threading.Lock()
+        self.keep_versions = keep_versions
+        self._versions = {}
+
+    def add(self, program, items):
+        """Store a received BOMLIST. Returns (version, diff); diff is None when unchanged"""
+        digest = bom_digest(items)
+        with self._lock:
+            history = self._versions.get(program)
+            current = history[-1] if history else None
+            if current is not None and current.digest == digest:
+                return current, None
+        version = BomVersion(program, current.version + 1 if current else 1, digest, items)
+        diff = bom_diff(current, version)
+        with self._lock:
+            history = self._versions.setdefault(program, deque(maxlen=self.keep_versions))
+            history.append(version)
+        return version, diff
+
+    def current(self, program):
+        with self._lock:
+            history = self._versions.get(program)
+            return history[-1] if history else None
+
+    def get(self, program, version):
+        with self._lock:
+            for v in self._versions.get(program, ()):
+                if v.version == version:
+                    return v
+        return None
+
+    def versions(self, program):
+        with self._lock:
+            return [v.summary() for v in self._versions.get(program, ())]
+
+    def diff(self, program, from_version, to_version):
+        old, new = self.get(program, from_version), self.get(program, to_version)
+        if old is None or new is None:
+            return None
+        return bom_diff(old, new)
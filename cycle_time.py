@@ -0,0 +1,182 @@
+import math
+import threading
+import time
+
+
+class QuantileSketch:
+    """Mergeable log-bucketed quantile sketch (DDSketch style).
+
+    Every quantile estimate is within `accuracy` relative error of a real
+    sample, memory is bounded by `max_bins`, and two sketches with the
+    same accuracy merge by adding their bin counts.
+    """
+    __slots__ = ('accuracy', 'gamma', '_log_gamma', 'max_bins', 'bins',
+                 'zeros', 'count', 'total', 'min', 'max')
+
+    def __init__(self, accuracy=0.01, max_bins=1024):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.max_bins = max_bins
+        self.bins = {}
+        self.zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value, count=1):
+        if value < 0:
+            raise ValueError(f"Negative cycle time: {value}")
+        if value == 0:
+            self.zeros += count
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[index] = self.bins.get(index, 0) + count
+            if len(self.bins) > self.max_bins:
+                self._collapse()
+        self.count += count
+        self.total += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def _collapse(self):
+        # Fold the lowest bins together; upper quantiles keep full accuracy
+        indexes = sorted(self.bins)
+        excess = len(indexes) - self.max_bins
+        target = indexes[excess]
+        for index in indexes[:excess]:
+            self.bins[target] += self.bins.pop(index)
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+        self.zeros += other.zeros
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                # Midpoint of the bucket (gamma^(i-1), gamma^i]
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        return {'count': self.count,
+                'mean': round(self.total / self.count, 3) if self.count else None,
+                'min': self.min,
+                'max': self.max,
+                'p50': self._rounded(self.quantile(0.5)),
+                'p90': self._rounded(self.quantile(0.9)),
+                'p99': self._rounded(self.quantile(0.99))}
+
+    @staticmethod
+    def _rounded(value):
+        return round(value, 3) if value is not None else None
+
+    def to_dict(self):
+        return {'accuracy': self.accuracy,
+                'bins': {str(k): v for k, v in self.bins.items()},
+                'zeros': self.zeros,
+                'count': self.count,
+                'total': self.total,
+                'min': self.min,
+                'max': self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(accuracy=data['accuracy'])
+        sketch.bins = {int(k): v for k, v in data['bins'].items()}
+        sketch.zeros = data['zeros']
+        sketch.count = data['count']
+        sketch.total = data['total']
+        sketch.min = data['min']
+        sketch.max = data['max']
+        return sketch
+
+
+class CycleTimeSketches:
+    """PRODCOMPLETEDII cycle times as one sketch per hour, line, machine, module and program"""
+
+    def __init__(self, bucket_seconds=3600, retention=2 * 86400):
+        self._lock = threading.Lock()
+        self.bucket_seconds = bucket_seconds
+        self.retention = retention
+        self._sketches = {}
+
+    def add(self, line, machine, module, program, cycle_time, when=None):
+        when = when or time.time()
+        bucket = int(when - when % self.bucket_seconds)
+        key = (bucket, line, machine, str(module), program)
+        with self._lock:
+            sketch = self._sketches.get(key)
+            if sketch is None:
+                sketch = self._sketches[key] = QuantileSketch()
+            sketch.add(cycle_time)
+
+    def load(self, bucket, line, machine, module, program, data):
+        """Merge a persisted sketch back in"""
+        key = (int(bucket), line, machine, str(module), program)
+        with self._lock:
+            sketch = QuantileSketch.from_dict(data)
+            existing = self._sketches.get(key)
+            self._sketches[key] = existing.merge(sketch) if existing else sketch
+
+    def query(self, t1, t2, line=None, machine=None, module=None, program=None):
+        """Merged percentiles over the buckets and dimensions that match"""
+        merged = QuantileSketch()
+        with self._lock:
+            for (bucket, l, m, mod, prog), sketch in self._sketches.items():
+                if bucket + self.bucket_seconds <= t1 or bucket > t2:
+                    continue
+                if ((line is not None and l != line) or (machine is not None and m != machine) or
+                        (module is not None and mod != str(module)) or (program is not None and prog != program)):
+                    continue
+                merged.merge(sketch)
+        return merged.summary()
+
+    def breakdown(self, t1, t2):
+        """Percentiles per program and module over a time range"""
+        groups = {}
+        with self._lock:
+            for (bucket, l, m, mod, prog), sketch in self._sketches.items():
+                if bucket + self.bucket_seconds <= t1 or bucket > t2:
+                    continue
+                key = (prog, mod)
+                if key not in groups:
+                    groups[key] = QuantileSketch()
+                groups[key].merge(sketch)
+        return [{'program': prog, 'module': mod, **sketch.summary()}
+                for (prog, mod), sketch in sorted(groups.items())]
+
+    def export(self, t1, t2):
+        """Rows to persist for buckets starting in [t1, t2)"""
+        with self._lock:
+            return [{'bucket': bucket, 'line': l, 'machine': m, 'module': mod,
+                     'program': prog, 'count': sketch.count, 'sketch': sketch.to_dict()}
+                    for (bucket, l, m, mod, prog), sketch in self._sketches.items()
+                    if t1 <= bucket < t2]
+
+    def prune(self, now=None):
+        """Drop in-memory buckets older than the retention window"""
+        horizon = (now or time.time()) - self.retention
+        with self._lock:
+            for key in [key for key in self._sketches if key[0] + self.bucket_seconds < horizon]:
+                del self._sketches[key]
@@ -0,0 +1,242 @@
+import glob
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Time column of every table a range query can be routed on
+TIME_COLUMNS = {
+    'production_logs': 'timestamp',
+    'machine_state_intervals': 'start_time',
+    'alarm_intervals': 'start_time',
+    'error_logs': 'timestamp',
+    'panel_expiries': 'event_time',
+    'panel_events': 'time',
+    'panel_components': 'time',
+    'refill_events': 'time',
+    'unload_events': 'time',
+    'bom_items': 'received',
+    'cycle_times': 'time',
+    'cycle_time_sketches': 'bucket_start',
+}
+
+_DAY_FILE = re.compile(r"production_(\d{8})\.db$")
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def db_time(when):
+    """Epoch seconds as SQLAlchemy stores DateTime in SQLite, for range comparisons"""
+    return datetime.fromtimestamp(when).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def _today():
+    return datetime.now().strftime("%Y%m%d")
+
+
+def _epoch(value):
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+class DailyDbCatalog:
+    """Catalog of production_YYYYMMDD.db files: per table row count and time range.
+
+    Kept in db_catalog.json and refreshed incrementally; only files whose
+    size or mtime changed are scanned again. Today's file changes with every
+    write, so it is rescanned at most every `live_interval` seconds and its
+    time range is treated as open-ended. Range queries go to the files whose
+    range overlaps, concurrently, over a pool of read-only connections.
+    """
+
+    def __init__(self, directory=".", path="db_catalog.json", workers=4, pool_size=2, live_interval=60.0):
+        self.directory = directory
+        self.path = os.path.join(directory, path)
+        self.pool_size = pool_size
+        self.workers = workers
+        self.live_interval = live_interval
+        self._live_scanned = {}
+        # Reentrant: refresh() scans through the connection pool
+        self._lock = threading.RLock()
+        self._entries = self._load()
+        self._pools = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db_catalog")
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def refresh(self):
+        """Rescan new or changed daily files and drop deleted ones"""
+        with self._lock:
+            found = {}
+            for path in glob.glob(os.path.join(self.directory, "production_*.db")):
+                match = _DAY_FILE.search(os.path.basename(path))
+                if match:
+                    found[os.path.basename(path)] = (path, match.group(1))
+            changed = False
+            for name in list(self._entries):
+                if name not in found:
+                    del self._entries[name]
+                    self._pools.pop(name, None)
+                    changed = True
+            today = _today()
+            now = time.monotonic()
+            for name, (path, day) in found.items():
+                stat = os.stat(path)
+                entry = self._entries.get(name)
+                if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                    continue
+                if entry and day == today and now - self._live_scanned.get(name, 0) < self.live_interval:
+                    continue
+                if day == today:
+                    self._live_scanned[name] = now
+                self._entries[name] = {'day': day,
+                                       'size': stat.st_size,
+                                       'mtime': stat.st_mtime,
+                                       'tables': self._scan(path)}
+                changed = True
+            if changed:
+                self._save()
+            return changed
+
+    def _scan(self, path):
+        tables = {}
+        with self._connection(os.path.basename(path)) as db:
+            present = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for table, column in TIME_COLUMNS.items():
+                if table not in present:
+                    continue
+                rows, first, last = db.execute(
+                    f"SELECT count(*), min({column}), max({column}) FROM {table}").fetchone()
+                tables[table] = {'rows': rows, 'start': _epoch(first), 'end': _epoch(last)}
+        return tables
+
+    def entries(self):
+        with self._lock:
+            return [dict(entry, file=name) for name, entry in sorted(self._entries.items())]
+
+    def files_for(self, table, start=None, end=None):
+        """Daily files holding rows of `table` between start and end, oldest first"""
+        today = _today()
+        picked = []
+        for entry in self.entries():
+            info = entry['tables'].get(table)
+            if not info:
+                continue
+            live = entry['day'] == today
+            # The live file may have rows newer than its last scan
+            if not live:
+                if not info['rows']:
+                    continue
+                if start is not None and info['end'] is not None and info['end'] < start:
+                    continue
+            if end is not None and info['start'] is not None and info['start'] > end:
+                continue
+            picked.append(entry['file'])
+        return picked
+
+    def _connection(self, name):
+        return _PooledConnection(self, name)
+
+    def _acquire(self, name):
+        with self._lock:
+            pool = self._pools.setdefault(name, queue.SimpleQueue())
+        try:
+            return pool.get_nowait()
+        except queue.Empty:
+            path = os.path.abspath(os.path.join(self.directory, name))
+            db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False, timeout=30)
+            db.row_factory = sqlite3.Row
+            return db
+
+    def _release(self, name, db):
+        with self._lock:
+            pool = self._pools.get(name)
+        if pool is not None and pool.qsize() < self.pool_size:
+            pool.put(db)
+        else:
+            db.close()
+
+    def query(self, table, columns="*", start=None, end=None, where=None, params=(), order_by=None):
+        """Rows of `table` between start and end (epoch seconds) across the daily files.
+
+        Files are queried concurrently and rows are yielded file by file in
+        day order, so an ORDER BY on the time column gives a sorted stream.
+        """
+        if table not in TIME_COLUMNS:
+            raise ValueError(f"Unknown table: {table}")
+        column = TIME_COLUMNS[table]
+        if not isinstance(columns, str):
+            columns = ", ".join(columns)
+        if columns != "*" and not all(_IDENTIFIER.match(c.strip()) for c in columns.split(",")):
+            raise ValueError(f"Invalid columns: {columns}")
+        clauses, bounds = [], []
+        if start is not None:
+            clauses.append(f"{column} >= ?")
+            bounds.append(db_time(start))
+        if end is not None:
+            clauses.append(f"{column} <= ?")
+            bounds.append(db_time(end))
+        if where:
+            clauses.append(f"({where})")
+        sql = f"SELECT {columns} FROM {table}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY {order_by or column}"
+        args = tuple(bounds) + tuple(params)
+
+        self.refresh()
+        names = self.files_for(table, start, end)
+        # At most `workers` files are read ahead of the one being yielded
+        futures = deque(self._executor.submit(self._run, name, sql, args) for name in names[:self.workers])
+        pending = iter(names[self.workers:])
+        try:
+            while futures:
+                rows = futures.popleft().result()
+                name = next(pending, None)
+                if name is not None:
+                    futures.append(self._executor.submit(self._run, name, sql, args))
+                yield from rows
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def _run(self, name, sql, args):
+        with self._connection(name) as db:
+            return db.execute(sql, args).fetchall()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            while not pool.empty():
+                pool.get_nowait().close()
+
+
+class _PooledConnection:
+    def __init__(self, catalog, name):
+        self.catalog = catalog
+        self.name = name
+        self.db = None
+
+    def __enter__(self):
+        self.db = self.catalog._acquire(self.name)
+        return self.db
+
+    def __exit__(self, *exc):
+        self.catalog._release(self.name, self.db)
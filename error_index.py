@@ -0,0 +1,90 @@
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# ERRORREPORT statuses
+ERROR_STATUS = {
+    '1': 'Vision error',
+    '4': 'No pickup',
+    '5': 'Parts out',
+    '10': 'Feeder type check error',
+    '998': 'Processing error',
+    '999': 'Format error',
+}
+
+
+class ErrorCounter:
+    """Running totals for one (module, stage, slot, status)"""
+    __slots__ = ('count', 'today', 'first', 'last')
+
+    def __init__(self, when):
+        self.count = 0
+        self.today = 0
+        self.first = when
+        self.last = when
+
+
+class ErrorIndex:
+    """Recent ERRORREPORTs in a bounded ring plus cumulative counters per slot and status.
+
+    Counters are one entry per (module, stage, slot, status) ever seen, so
+    memory is bounded by the machine layout, not by uptime.
+    """
+
+    def __init__(self, ring_size=1000):
+        self._lock = threading.Lock()
+        self.recent = deque(maxlen=ring_size)
+        self._counters = {}
+        self.day = datetime.now().date()
+
+    def add(self, module, stage, slot, code, when=None):
+        when = when or time.time()
+        key = (sys.intern(str(module)), sys.intern(str(stage)), sys.intern(str(slot)), sys.intern(code))
+        with self._lock:
+            self._roll_day(when)
+            counter = self._counters.get(key)
+            if counter is None:
+                counter = self._counters[key] = ErrorCounter(when)
+            counter.count += 1
+            counter.today += 1
+            counter.last = when
+            self.recent.append((int(when),) + key)
+
+    def _roll_day(self, when):
+        day = datetime.fromtimestamp(when).date()
+        if day > self.day:
+            self.day = day
+            for counter in self._counters.values():
+                counter.today = 0
+
+    def by_slot(self, today=True, module=None, code=None):
+        """Error counts per slot and status, today's or since start"""
+        with self._lock:
+            self._roll_day(time.time())
+            rows = []
+            for (mod, stage, slot, c), counter in self._counters.items():
+                if (module is not None and mod != str(module)) or (code is not None and c != code):
+                    continue
+                count = counter.today if today else counter.count
+                if count:
+                    rows.append({'module': mod,
+                                 'stage': stage,
+                                 'slot': slot,
+                                 'code': c,
+                                 'status': ERROR_STATUS.get(c, 'Unknown'),
+                                 'count': count,
+                                 'last': counter.last})
+        return sorted(rows, key=lambda r: r['count'], reverse=True)
+
+    def latest(self, limit=100):
+        with self._lock:
+            rows = list(self.recent)[-limit:][::-1]
+        return [{'time': when,
+                 'module': module,
+                 'stage': stage,
+                 'slot': slot,
+                 'code': code,
+                 'status': ERROR_STATUS.get(code, 'Unknown')}
+                for when, module, stage, slot, code in rows]
@@ -0,0 +1,86 @@
+import threading
+import time
+import logging
+
+backend_logger = logging.getLogger("backend_logger")
+
+
+class FeederListCache:
+    """Parsed FEEDERLIST_ACK replies keyed by (machine, group, program)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._inflight = {}
+        # Bumped per key on invalidation, so only that key's outstanding replies are dropped
+        self._generations = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry['reply']
+
+    def inflight(self, key):
+        with self._lock:
+            return self._inflight.get(key)
+
+    def track(self, key, future):
+        """Remember an outstanding FEEDERLIST so the reply lands in the cache"""
+        with self._lock:
+            generation = self._generations.setdefault(key, 0)
+            self._inflight[key] = future
+        future.add_done_callback(lambda f: self._on_reply(key, f, generation))
+
+    def _on_reply(self, key, future, generation):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            if future.cancelled() or future.exception() is not None:
+                return
+            reply = future.result()
+            # Drop replies that were requested before an invalidation
+            if reply['result'] != "0" or generation != self._generations.get(key, 0):
+                return
+            self._entries[key] = {'reply': reply, 'stored_at': time.time()}
+
+    def invalidate(self, machine=None, program=None):
+        """Drop entries for a machine and/or program (everything when both are None)"""
+        def matches(key):
+            return (machine is None or key[0] == machine) and (program is None or key[2] == program)
+
+        with self._lock:
+            stale = [key for key in self._entries if matches(key)]
+            for key in stale:
+                del self._entries[key]
+            # Outstanding requests for these keys may carry the old layout
+            for key in [key for key in self._inflight if matches(key)]:
+                del self._inflight[key]
+            for key in self._generations:
+                if matches(key):
+                    self._generations[key] += 1
+        if stale:
+            backend_logger.info("Feeder list cache invalidated %s entries", len(stale))
+        return len(stale)
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+                'inflight': len(self._inflight),
+                'entries': [{'machine': key[0],
+                             'group': key[1],
+                             'program': key[2],
+                             'feeders': len(entry['reply']['feeders']),
+                             'age': round(now - entry['stored_at'], 1)}
+                            for key, entry in self._entries.items()]
+            }
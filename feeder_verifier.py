@@ -0,0 +1,140 @@
+import threading
+
+# FEEDERSETUP_ACK / PARTSREFILL_ACK results
+VERIFY_OK = "0"
+VERIFY_NG = "1"
+VERIFY_NO_DATA = "2"
+
+
+def _position(module, stage, slot):
+    return int(module), int(stage), int(slot)
+
+
+class ProgramPlan:
+    """Allowed (module, stage, slot, part) pairs of one program, precomputed as hash sets"""
+    __slots__ = ('program', 'pairs', 'slot_parts', 'part_refs', 'modules')
+
+    def __init__(self, program):
+        self.program = program
+        self.pairs = set()
+        self.slot_parts = {}
+        self.part_refs = {}
+        self.modules = set()
+
+    def set_slot(self, module, stage, slot, parts, references=()):
+        position = _position(module, stage, slot)
+        for part in self.slot_parts.get(position, ()):
+            self.pairs.discard(position + (part,))
+        self.slot_parts[position] = frozenset(parts)
+        self.modules.add(position[0])
+        for part in parts:
+            self.pairs.add(position + (part,))
+            if references:
+                self.part_refs.setdefault(part, set()).update(references)
+
+    def clear_module(self, module):
+        for position in [p for p in self.slot_parts if p[0] == int(module)]:
+            for part in self.slot_parts.pop(position):
+                self.pairs.discard(position + (part,))
+        self.modules.discard(int(module))
+
+
+class FeederVerifier:
+    """Checks refills and feeder setups against the active program before they are ACKed.
+
+    Plans are built when FEEDERLIST_ACK, PGCHANGEII and BOMLIST arrive, so a
+    check is a couple of set/dict lookups.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._plans = {}
+        self._boms = {}
+        self.active_program = None
+        self.counts = {VERIFY_OK: 0, VERIFY_NG: 0, VERIFY_NO_DATA: 0, 'unverified': 0}
+
+    def _plan(self, program):
+        plan = self._plans.get(program)
+        if plan is None:
+            plan = self._plans[program] = ProgramPlan(program)
+        return plan
+
+    def load_feeder_list(self, program, feeders):
+        """FEEDERLIST_ACK positions: replaces the whole plan of the program"""
+        plan = ProgramPlan(program)
+        for fd in feeders:
+            plan.set_slot(fd['module'], fd['stage'], fd['slot'], fd['parts'], fd['references'])
+        with self._lock:
+            self._plans[program] = plan
+
+    def load_module(self, program, module, slots):
+        """PGCHANGEII used parts of one module"""
+        with self._lock:
+            plan = self._plan(program)
+            plan.clear_module(module)
+            for s in slots:
+                plan.set_slot(module, s['stage'], s['slot'], s['parts'])
+
+    def load_bom(self, program, part_refs):
+        """BOMLIST part -> references index of the current BOM version"""
+        with self._lock:
+            self._boms[program] = part_refs
+
+    def activate(self, program):
+        self.active_program = program
+
+    def references(self, part, program=None):
+        program = program or self.active_program
+        refs = set(self._boms.get(program, {}).get(part, ()))
+        plan = self._plans.get(program)
+        if plan:
+            refs.update(plan.part_refs.get(part, ()))
+        return sorted(refs)
+
+    def verify_part(self, module, stage, slot, part, program=None):
+        """Result and reason for loading `part` on a slot of `program` (default: the active one)"""
+        program = program or self.active_program
+        plan = self._plans.get(program)
+        bom = self._boms.get(program)
+        position = _position(module, stage, slot)
+        # No data for the module yet (e.g. PGCHANGEII still arriving module by module)
+        if plan is None or position[0] not in plan.modules:
+            if bom is not None and part not in bom:
+                return self._count(VERIFY_NG, f"Part {part} is not in the BOM of {program}")
+            return self._count('unverified', None)
+        if position + (part,) in plan.pairs:
+            return self._count(VERIFY_OK, None)
+        expected = plan.slot_parts.get(position)
+        if expected is None:
+            return self._count(VERIFY_NG, f"Slot {module}-{stage}-{slot} is not used by {program}")
+        return self._count(VERIFY_NG, f"Part {part} not allowed on {module}-{stage}-{slot}, "
+                                      f"expected {', '.join(sorted(expected))}")
+
+    def verify_slot(self, module, stage, slot, program=None):
+        """Result and reason for setting a feeder on a slot of `program` (default: the active one).
+
+        FEEDERSETUP carries no part number, so only the position is checked;
+        the part is checked when its reel is refilled. The frame names its
+        program, which can be a job not yet switched to by PGCHANGEII.
+        """
+        program = program or self.active_program
+        plan = self._plans.get(program)
+        position = _position(module, stage, slot)
+        if plan is None or position[0] not in plan.modules:
+            return self._count('unverified', None)
+        if position not in plan.slot_parts:
+            return self._count(VERIFY_NO_DATA, f"Slot {module}-{stage}-{slot} is not used by {program}")
+        return self._count(VERIFY_OK, None)
+
+    def _count(self, result, reason):
+        with self._lock:
+            self.counts[result] += 1
+        # Unverified checks are let through
+        return (VERIFY_OK if result == 'unverified' else result), reason
+
+    def stats(self):
+        with self._lock:
+            return {'active_program': self.active_program,
+                    'programs': {p: len(plan.pairs) for p, plan in self._plans.items()},
+                    'boms': {p: len(refs) for p, refs in self._boms.items()},
+                    'results': dict(self.counts)}
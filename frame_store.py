@@ -0,0 +1,315 @@
+import bisect
+import glob
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime
+
+backend_logger = logging.getLogger("backend_logger")
+
+# Record: payload length, timestamp, direction, then the raw frame (utf-8)
+RECORD = struct.Struct(">IdB")
+# Sparse index entry every INDEX_EVERY records: timestamp, seq id (-1 if not numeric), offset
+INDEX_ENTRY = struct.Struct(">dqQ")
+# Compressed block: first timestamp, first seq id, raw offset, compressed offset, compressed length
+BLOCK_ENTRY = struct.Struct(">dqQQI")
+INDEX_EVERY = 128
+MAX_SEGMENT_BYTES = 256 * 1024 * 1024
+# zlib preset dictionaries are limited to 32 KiB
+DICT_BYTES = 32 * 1024
+DIRECTIONS = ('sent', 'receive')
+
+
+def _seq(raw):
+    parts = raw.split(b"\t", 2)
+    return int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else -1
+
+
+def train_dictionary(frames, size=DICT_BYTES):
+    """Preset dictionary for zlib from sample frames.
+
+    One sample per command, rarest first, so the most frequent frame
+    shapes sit at the end of the dictionary where matches are cheapest.
+    """
+    by_command = {}
+    counts = Counter()
+    for raw in frames:
+        command = raw.split(b"\t", 1)[0]
+        counts[command] += 1
+        by_command.setdefault(command, []).append(raw)
+    chunks = []
+    used = 0
+    for command, _ in counts.most_common():
+        for raw in by_command[command][:4]:
+            if used + len(raw) > size:
+                break
+            chunks.append(raw)
+            used += len(raw)
+    return b"".join(reversed(chunks))
+
+
+class FrameSegment:
+    """One segment: records appended to <name>.seg with a sparse <name>.idx sidecar,
+    or, once closed and compressed, zlib blocks in <name>.segz with <name>.zidx and <name>.zdict"""
+
+    def __init__(self, path):
+        self.path = path
+        self.base = path[:-4] if path.endswith(".seg") else path[:-5]
+        self.compressed = path.endswith(".segz")
+        self.index = []
+        self.blocks = []
+        self.dictionary = None
+        if self.compressed:
+            with open(f"{self.base}.zidx", "rb") as f:
+                data = f.read()
+            self.blocks = [BLOCK_ENTRY.unpack_from(data, i) for i in range(0, len(data), BLOCK_ENTRY.size)]
+            with open(f"{self.base}.zdict", "rb") as f:
+                self.dictionary = f.read()
+        else:
+            try:
+                with open(f"{self.base}.idx", "rb") as f:
+                    data = f.read()
+                usable = len(data) - len(data) % INDEX_ENTRY.size
+                self.index = [INDEX_ENTRY.unpack_from(data, i) for i in range(0, usable, INDEX_ENTRY.size)]
+            except OSError:
+                pass
+
+    @property
+    def first_time(self):
+        entries = self.blocks or self.index
+        return entries[0][0] if entries else None
+
+    def _start_offset(self, start):
+        """Raw offset of the index entry at or before `start`"""
+        if start is None or not self.index:
+            return 0
+        i = bisect.bisect_right(self.index, (start, float('inf'))) - 1
+        return self.index[i][2] if i >= 0 else 0
+
+    def records(self, start=None):
+        """(timestamp, direction, raw bytes) from the first block that can hold `start`"""
+        if self.compressed:
+            yield from self._compressed_records(start)
+            return
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if not size:
+                return
+            with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+                yield from _parse(mm, self._start_offset(start), size)
+
+    def _compressed_records(self, start):
+        first = 0
+        if start is not None:
+            first = max(bisect.bisect_right([b[0] for b in self.blocks], start) - 1, 0)
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if not size:
+                return
+            with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+                for _, _, _, offset, length in self.blocks[first:]:
+                    block = zlib.decompressobj(zdict=self.dictionary).decompress(mm[offset:offset + length])
+                    yield from _parse(block, 0, len(block))
+
+
+def _parse(buf, pos, end):
+    while pos + RECORD.size <= end:
+        length, when, direction = RECORD.unpack_from(buf, pos)
+        stop = pos + RECORD.size + length
+        if stop > end:
+            # Torn tail of a live segment
+            return
+        yield when, direction, bytes(buf[pos + RECORD.size:stop])
+        pos = stop
+
+
+class FrameStore:
+    """Append-only store of raw frames in segment files.
+
+    Replaces a production_logs row per frame with a length-prefixed append;
+    a sparse (timestamp, seq) -> offset index makes time-range replay a
+    bisect plus an mmap scan. Closed segments are compressed in independent
+    blocks with a dictionary trained on the segment's own frames.
+    """
+
+    def __init__(self, directory="frames", max_bytes=MAX_SEGMENT_BYTES, compress=True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self._lock = threading.Lock()
+        self._finish_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._file = None
+        self._idx = None
+        self.segment = None
+        self.day = None
+        self._count = 0
+        self._open(datetime.now().strftime("%Y%m%d"))
+        # Segments left uncompressed by an earlier run
+        for path in self._paths():
+            if path.endswith(".seg") and path != self.segment.path:
+                self._finish_async(path)
+
+    def _paths(self):
+        return sorted(glob.glob(os.path.join(self.directory, "frames_*.seg")) +
+                      glob.glob(os.path.join(self.directory, "frames_*.segz")))
+
+    def _open(self, day):
+        """Continue the day's latest segment or start a new one"""
+        self.day = day
+        today = [p for p in self._paths() if os.path.basename(p).startswith(f"frames_{self.day}_")]
+        n = int(os.path.basename(today[-1]).split(".")[0].rsplit("_", 1)[1]) if today else 0
+        path = os.path.join(self.directory, f"frames_{self.day}_{n:03d}.seg")
+        if today and (today[-1].endswith(".segz") or os.path.getsize(today[-1]) >= self.max_bytes):
+            path = os.path.join(self.directory, f"frames_{self.day}_{n + 1:03d}.seg")
+        self.segment = FrameSegment(path)
+        valid = self._recover(self.segment)
+        self._file = open(path, "ab")
+        self._file.truncate(valid)
+        self._file.seek(0, os.SEEK_END)
+        self._idx = open(f"{self.segment.base}.idx", "ab")
+
+    def _recover(self, segment):
+        """Re-index records written after the last sidecar entry and drop a torn tail"""
+        if not os.path.exists(segment.path):
+            return 0
+        base = segment.index[-1][2] if segment.index else 0
+        with open(segment.path, "rb") as f:
+            f.seek(base)
+            data = f.read()
+        pos = count = 0
+        while pos + RECORD.size <= len(data):
+            length, when, _ = RECORD.unpack_from(data, pos)
+            if pos + RECORD.size + length > len(data):
+                break
+            if count % INDEX_EVERY == 0 and (not segment.index or segment.index[-1][2] != base + pos):
+                raw = data[pos + RECORD.size:pos + RECORD.size + length]
+                segment.index.append((when, _seq(raw), base + pos))
+            count += 1
+            pos += RECORD.size + length
+        self._count = count
+        with open(f"{segment.base}.idx", "wb") as f:
+            f.write(b"".join(INDEX_ENTRY.pack(*entry) for entry in segment.index))
+        return base + pos
+
+    def append(self, event_type, raw_message, when=None):
+        when = when or time.time()
+        raw = raw_message.encode()
+        direction = 0 if event_type == "sent" else 1
+        with self._lock:
+            # Days only move forward, so a clock step back never reopens a closed segment;
+            # a size roll stays on the current day so segment names keep time order
+            day = datetime.fromtimestamp(when).strftime("%Y%m%d")
+            if day > self.day:
+                self._roll(day)
+            elif self._file.tell() >= self.max_bytes:
+                self._roll(self.day)
+            offset = self._file.tell()
+            if self._count % INDEX_EVERY == 0:
+                entry = (when, _seq(raw), offset)
+                self.segment.index.append(entry)
+                self._idx.write(INDEX_ENTRY.pack(*entry))
+                self._idx.flush()
+            self._file.write(RECORD.pack(len(raw), when, direction) + raw)
+            self._file.flush()
+            self._count += 1
+
+    def _roll(self, day):
+        closed = self.segment.path
+        self._file.close()
+        self._idx.close()
+        self._count = 0
+        self._open(day)
+        self._finish_async(closed)
+
+    def _finish_async(self, path):
+        if self.compress:
+            threading.Thread(target=self._compress_segment, args=(path,), daemon=True).start()
+
+    def _compress_segment(self, path):
+        """Rewrite a closed segment as dictionary-compressed blocks, one per index entry"""
+        with self._finish_lock:
+            try:
+                segment = FrameSegment(path)
+                with open(path, "rb") as f:
+                    data = f.read()
+                if not data:
+                    return
+                offsets = [entry[2] for entry in segment.index] or [0]
+                bounds = list(zip(offsets, offsets[1:] + [len(data)]))
+                samples = [raw for _, _, raw in _parse(data, 0, min(len(data), 4 * 1024 * 1024))]
+                dictionary = train_dictionary(samples)
+                blocks = []
+                out = bytearray()
+                for entry, (lo, hi) in zip(segment.index or [(0.0, -1, 0)], bounds):
+                    packer = zlib.compressobj(9, zdict=dictionary)
+                    chunk = packer.compress(data[lo:hi]) + packer.flush()
+                    blocks.append(BLOCK_ENTRY.pack(entry[0], entry[1], lo, len(out), len(chunk)))
+                    out += chunk
+                base = segment.base
+                with open(f"{base}.zdict", "wb") as f:
+                    f.write(dictionary)
+                with open(f"{base}.zidx", "wb") as f:
+                    f.write(b"".join(blocks))
+                with open(f"{base}.segz.tmp", "wb") as f:
+                    f.write(out)
+                os.replace(f"{base}.segz.tmp", f"{base}.segz")
+                os.remove(path)
+                os.remove(f"{base}.idx")
+                backend_logger.info("Compressed frame segment %s: %s -> %s bytes", os.path.basename(base),
+                                    len(data), len(out))
+            except Exception as e:
+                backend_logger.error("Failed to compress frame segment %s: %s", path, e)
+
+    def segments(self, start=None, end=None):
+        """Segments that can hold frames between start and end, oldest first"""
+        with self._finish_lock:
+            found = [FrameSegment(p) for p in self._paths()]
+        found = [s for s in found if s.first_time is not None]
+        picked = []
+        for i, segment in enumerate(found):
+            following = found[i + 1].first_time if i + 1 < len(found) else None
+            if end is not None and segment.first_time > end:
+                break
+            if start is not None and following is not None and following < start:
+                continue
+            picked.append(segment)
+        return picked
+
+    def replay(self, start=None, end=None):
+        """(timestamp, event_type, raw_message) of every stored frame in [start, end]"""
+        for segment in self.segments(start, end):
+            for when, direction, raw in segment.records(start):
+                if start is not None and when < start:
+                    continue
+                if end is not None and when > end:
+                    return
+                yield when, DIRECTIONS[direction], raw.decode("utf-8", "replace")
+
+    def history(self, start=None, end=None, command=None, seq=None, limit=1000):
+        """Stored frames as production_logs-like rows, oldest first"""
+        rows = []
+        for when, event_type, raw in self.replay(start, end):
+            parts = raw.split("\t", 2)
+            if command is not None and parts[0] != command:
+                continue
+            if seq is not None and (len(parts) < 2 or parts[1] != seq):
+                continue
+            rows.append({'timestamp': datetime.fromtimestamp(when).isoformat(),
+                         'event_type': event_type,
+                         'event_name': parts[0],
+                         'seq_id': parts[1] if len(parts) > 1 else None,
+                         'data': raw})
+            if len(rows) >= limit:
+                break
+        return rows
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+            self._idx.close()
@@ -0,0 +1,88 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+from log_segments import SegmentedFileHandler
+
+# Echo traffic and progress messages to stdout (FUJI_ECHO_STDOUT=0 to silence)
+ECHO_STDOUT = os.environ.get("FUJI_ECHO_STDOUT", "1") != "0"
+
+# Per-category levels, overridable with e.g. FUJI_LOG_LEVELS="keepalive=INFO,frames=WARNING"
+LOG_LEVELS = {
+    'frames': logging.INFO,
+    'keepalive': logging.WARNING,
+    'events': logging.INFO,
+}
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_listeners = []
+
+
+def _level_overrides():
+    levels = dict(LOG_LEVELS)
+    for item in os.environ.get("FUJI_LOG_LEVELS", "").split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records as they are, so `msg % args` is formatted on the listener thread.
+
+    The stock prepare() formats on the caller's thread (it expects the queue
+    may be pickled); this queue stays in-process.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def _start(logger, handlers):
+    """Put a QueueHandler on `logger` and do the formatting and I/O of `handlers` on a listener thread"""
+    q = queue.SimpleQueue()
+    logger.addHandler(_LazyQueueHandler(q))
+    listener = logging.handlers.QueueListener(q, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    return listener
+
+
+def setup_backend_logging(logger, filename):
+    """File logging for the interface, written off the receive/ACK thread.
+
+    Categories are child loggers (backend_logger.frames, .keepalive, .events)
+    with their own levels; they propagate to the queue handler of `logger`.
+    """
+    if logger.handlers:
+        return
+    file_handler = SegmentedFileHandler(filename)
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    _start(logger, [file_handler])
+    for name, level in _level_overrides().items():
+        logging.getLogger(f"{logger.name}.{name}").setLevel(level)
+
+
+def setup_console(logger):
+    """Replacement for print(): stdout echo through the same queue, switchable off"""
+    if logger.handlers:
+        return
+    logger.propagate = False
+    if not ECHO_STDOUT:
+        logger.disabled = True
+        return
+    logger.setLevel(logging.INFO)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s %(message)s', '%H:%M:%S'))
+    _start(logger, [stream_handler])
+
+
+@atexit.register
+def stop_listeners():
+    """Drain the queues before the process exits"""
+    while _listeners:
+        _listeners.pop().stop()
@@ -0,0 +1,262 @@
+import glob
+import gzip
+import mmap
+import os
+import re
+import sqlite3
+import threading
+
+from log_segments import SegmentIndex, line_time
+
+# Lines are grouped into buckets of this many seconds; the index points at bucket byte ranges
+BUCKET_SECONDS = 60
+KEY_KINDS = ('command', 'seq', 'panel', 'reel', 'level')
+# Sequence ids are indexed in blocks: consecutive ids share one key per bucket
+SEQ_BLOCK = 64
+
+_LEVEL = re.compile(r" - ([A-Z]+) - ")
+_FRAME = re.compile(r" - [A-Z]+ - (?:Sent|Received): (.*)$")
+_PANEL = re.compile(r"\bPanel (\S+)")
+
+
+def _frame_keys(frame):
+    """command, seq id, panel and reel ids of one logged frame"""
+    parts = frame.rstrip("\r\n").split("\t")
+    keys = [('command', parts[0])]
+    if len(parts) > 1:
+        keys.append(('seq', parts[1]))
+    command = parts[0]
+    try:
+        if command in ("PCBCHECKIN", "PCBCHECKOUT") and len(parts) > 7:
+            keys.append(('panel', parts[7]))
+        if command == "PCBCHECKOUT":
+            # 11 fields per component block from index 11, ReelID is the 5th
+            for i in range(11 + 4, len(parts), 11):
+                keys.append(('reel', parts[i]))
+        elif command == "PARTSREFILL":
+            for i in range(12, len(parts), 11):
+                keys.append(('reel', parts[i]))
+        elif command in ("PCBCHECKIN_ACK", "PCBCHECKOUT_ACK") and len(parts) > 6:
+            keys.append(('panel', parts[6]))
+    except IndexError:
+        pass
+    return keys
+
+
+def seq_key(seq):
+    return str(int(seq) // SEQ_BLOCK) if seq.isdigit() else seq
+
+
+def line_keys(line):
+    keys = []
+    level = _LEVEL.search(line[:40])
+    if level:
+        keys.append(('level', level.group(1)))
+    frame = _FRAME.search(line)
+    if frame:
+        keys.extend(_frame_keys(frame.group(1)))
+    else:
+        panel = _PANEL.search(line)
+        if panel:
+            keys.append(('panel', panel.group(1)))
+    return keys
+
+
+class LogSearch:
+    """On-disk index of interface logs by time bucket and extracted keys.
+
+    Only bucket byte ranges are stored, so the index stays small; a query
+    picks the buckets whose keys match and scans just those ranges, through
+    mmap for plain files. Compressed segments are streamed: ranges are read
+    in offset order from one open gzip reader per file, so nothing is
+    decompressed past the last range needed and nothing is written to disk.
+    """
+
+    def __init__(self, base="fuji_interface.log", history_dir="log_history", index_path="log_index.db"):
+        self.base = base
+        self.history_dir = history_dir
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        db = self._connect()
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS log_files (
+                id INTEGER PRIMARY KEY, path TEXT UNIQUE, head TEXT, indexed_to INTEGER);
+            CREATE TABLE IF NOT EXISTS log_buckets (
+                file_id INTEGER, bucket INTEGER, start INTEGER, end INTEGER, lines INTEGER,
+                PRIMARY KEY (file_id, bucket)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS ix_log_buckets_time ON log_buckets (bucket);
+            CREATE TABLE IF NOT EXISTS log_keys (
+                kind TEXT, value TEXT, file_id INTEGER, bucket INTEGER,
+                PRIMARY KEY (kind, value, file_id, bucket)) WITHOUT ROWID;
+        """)
+        db.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.index_path, timeout=30)
+
+    def sources(self):
+        """Historical logs first, then the rotated segments and the live file"""
+        name = os.path.basename(self.base)
+        paths = sorted(glob.glob(os.path.join(self.history_dir, f"{name}*")))
+        paths = [p for p in paths if not p.endswith(".json")]
+        return paths + [seg['path'] for seg in SegmentIndex(self.base).segments()]
+
+    def update(self):
+        """Index whatever was appended or added since the last run"""
+        with self._lock:
+            db = self._connect()
+            try:
+                known = set()
+                for path in self.sources():
+                    known.add(os.path.abspath(path))
+                    self._index_file(db, path)
+                # Segments removed by retention
+                for file_id, path in db.execute("SELECT id, path FROM log_files").fetchall():
+                    if path not in known and not os.path.exists(path):
+                        self._drop_file(db, file_id)
+                db.commit()
+            finally:
+                db.close()
+
+    def _drop_file(self, db, file_id):
+        db.execute("DELETE FROM log_keys WHERE file_id = ?", (file_id,))
+        db.execute("DELETE FROM log_buckets WHERE file_id = ?", (file_id,))
+        db.execute("DELETE FROM log_files WHERE id = ?", (file_id,))
+
+    def _index_file(self, db, path):
+        path = os.path.abspath(path)
+        compressed = path.endswith(".gz")
+        opener = gzip.open if compressed else open
+        with opener(path, "rb") as f:
+            head = f.readline()[:64].decode("utf-8", "replace")
+            row = db.execute("SELECT id, head, indexed_to FROM log_files WHERE path = ?", (path,)).fetchone()
+            if row and row[1] != head:
+                # Same name, new content (the live file after a roll)
+                self._drop_file(db, row[0])
+                row = None
+            if row is None:
+                cur = db.execute("INSERT INTO log_files (path, head, indexed_to) VALUES (?, ?, 0)", (path, head))
+                file_id, offset = cur.lastrowid, 0
+            else:
+                file_id, offset = row[0], row[2]
+                if compressed and offset:
+                    return
+            f.seek(offset)
+            buckets = {}
+            keys = set()
+            bucket = None
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                line = raw.decode("utf-8", "replace")
+                when = line_time(line)
+                if when is not None:
+                    bucket = int(when // BUCKET_SECONDS)
+                if bucket is not None:
+                    entry = buckets.get(bucket)
+                    if entry is None:
+                        buckets[bucket] = [offset, offset + len(raw), 1]
+                    else:
+                        entry[1] = offset + len(raw)
+                        entry[2] += 1
+                    for kind, value in line_keys(line):
+                        if kind == 'seq':
+                            value = seq_key(value)
+                        keys.add((kind, value, file_id, bucket))
+                offset += len(raw)
+        for bucket, (start, end, lines) in buckets.items():
+            db.execute("""INSERT INTO log_buckets (file_id, bucket, start, end, lines) VALUES (?, ?, ?, ?, ?)
+                          ON CONFLICT (file_id, bucket) DO UPDATE SET end = excluded.end,
+                          lines = lines + excluded.lines""", (file_id, bucket, start, end, lines))
+        db.executemany("INSERT OR IGNORE INTO log_keys VALUES (?, ?, ?, ?)", keys)
+        db.execute("UPDATE log_files SET indexed_to = ? WHERE id = ?", (offset, file_id))
+
+    def search(self, command=None, seq=None, panel=None, reel=None, level=None,
+               start=None, end=None, text=None, limit=100, cursor=None):
+        """Matching lines in time order. `cursor` is the 'next' value of the previous page,
+        the (bucket, file id, offset) of the first line not yet returned"""
+        wanted = [(kind, value) for kind, value in zip(KEY_KINDS, (command, seq, panel, reel, level))
+                  if value is not None]
+        where, params = [], []
+        for kind, value in wanted:
+            if kind == 'seq':
+                value = seq_key(value)
+            where.append("EXISTS (SELECT 1 FROM log_keys k WHERE k.kind = ? AND k.value = ? "
+                         "AND k.file_id = b.file_id AND k.bucket = b.bucket)")
+            params += [kind, value]
+        if start is not None:
+            where.append("b.bucket >= ?")
+            params.append(int(start // BUCKET_SECONDS))
+        if end is not None:
+            where.append("b.bucket <= ?")
+            params.append(int(end // BUCKET_SECONDS))
+        after_bucket, after_file, after_offset = cursor if cursor else (-1, 0, 0)
+        # Rotated files overlap at their edges, so pages follow time first, then file
+        where.append("(b.bucket > ? OR (b.bucket = ? AND (b.file_id > ? OR (b.file_id = ? AND b.end > ?))))")
+        params += [after_bucket, after_bucket, after_file, after_file, after_offset]
+        sql = ("SELECT b.bucket, b.file_id, f.path, b.start, b.end FROM log_buckets b "
+               "JOIN log_files f ON f.id = b.file_id "
+               f"WHERE {' AND '.join(where)} ORDER BY b.bucket, b.file_id")
+
+        with self._lock:
+            db = self._connect()
+            try:
+                ranges = db.execute(sql, params).fetchall()
+            finally:
+                db.close()
+        matches = []
+        next_cursor = None
+        readers = {}
+        try:
+            for bucket, file_id, path, range_start, range_end in ranges:
+                if (bucket, file_id) == (after_bucket, after_file):
+                    range_start = max(range_start, after_offset)
+                for offset, line in self._scan(path, range_start, range_end, readers):
+                    when = line_time(line)
+                    if (start is not None and when is not None and when < start) or \
+                            (end is not None and when is not None and when > end):
+                        continue
+                    if text is not None and text not in line:
+                        continue
+                    if wanted and not set(wanted) <= set(line_keys(line)):
+                        continue
+                    if len(matches) == limit:
+                        next_cursor = [bucket, file_id, offset]
+                        break
+                    matches.append({'file': os.path.basename(path), 'offset': offset, 'line': line.rstrip("\r\n")})
+                if next_cursor:
+                    break
+        finally:
+            for reader in readers.values():
+                reader.close()
+        return {'lines': matches, 'next': next_cursor}
+
+    def _scan(self, path, start, end, readers):
+        """(offset, line) pairs of one byte range: mmap for plain files, a streamed gzip reader otherwise"""
+        try:
+            if path.endswith(".gz"):
+                reader = readers.get(path)
+                if reader is None:
+                    reader = readers[path] = gzip.open(path, "rb")
+                # Forward seeks only decompress the gap; ranges of one file usually come in order
+                reader.seek(start)
+                data = reader.read(end - start)
+                pos = 0
+                while pos < len(data):
+                    nl = data.find(b"\n", pos)
+                    stop = len(data) if nl == -1 else nl + 1
+                    yield start + pos, data[pos:stop].decode("utf-8", "replace")
+                    pos = stop
+                return
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size < end:
+                    return
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    pos = start
+                    while pos < end:
+                        nl = mm.find(b"\n", pos, end)
+                        stop = end if nl == -1 else nl + 1
+                        yield pos, mm[pos:stop].decode("utf-8", "replace")
+                        pos = stop
+        except (OSError, ValueError, EOFError):
+            return
@@ -0,0 +1,200 @@
+import gzip
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+# Segments are rolled at midnight or at this size, whichever comes first
+MAX_SEGMENT_BYTES = 50 * 1024 * 1024
+RETENTION_DAYS = 90
+MAX_SEGMENTS = 500
+
+# asctime of LOG_FORMAT, e.g. "2026-10-19 07:12:48,538"
+_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def line_time(line):
+    """Timestamp of a log line written with LOG_FORMAT, or None"""
+    try:
+        return datetime.strptime(line[:19], _TIME_FORMAT).timestamp()
+    except ValueError:
+        return None
+
+
+def _first_time(path):
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                when = line_time(line)
+                if when is not None:
+                    return when
+    except OSError:
+        pass
+    return None
+
+
+def open_segment(path, mode="rt"):
+    """Open a live or gzip-compressed segment transparently"""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode, encoding="utf-8", errors="replace") if "t" in mode else gzip.open(path, mode)
+    if "t" in mode:
+        return open(path, mode, encoding="utf-8", errors="replace")
+    return open(path, mode)
+
+
+class SegmentIndex:
+    """<log>.segments.json: file, start/end time and size of every closed segment"""
+
+    def __init__(self, base):
+        self.base = base
+        self.path = f"{base}.segments.json"
+        self._lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _save(self, segments):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(segments, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def update(self, change):
+        """Apply `change(segments)` to the index under its lock"""
+        with self._lock:
+            segments = self.load()
+            changed = change(segments)
+            if changed is not None:
+                segments = changed
+            self._save(segments)
+            return segments
+
+    def segments(self, start=None, end=None):
+        """Closed segments overlapping [start, end] plus the live file, oldest first"""
+        directory = os.path.dirname(os.path.abspath(self.base))
+        found = []
+        for seg in self.load():
+            if (start is not None and seg['end'] < start) or (end is not None and seg['start'] > end):
+                continue
+            found.append(dict(seg, path=os.path.join(directory, seg['file'])))
+        if os.path.exists(self.base):
+            live_start = _first_time(self.base) or os.path.getmtime(self.base)
+            if end is None or live_start <= end:
+                found.append({'file': os.path.basename(self.base), 'path': self.base,
+                              'start': live_start, 'end': time.time(),
+                              'bytes': os.path.getsize(self.base), 'compressed': False})
+        # The index is in roll order and the live file is always the newest
+        return found
+
+
+def iter_lines(base, start=None, end=None):
+    """Lines of a rotated log across its segments, compressed ones included"""
+    for seg in SegmentIndex(base).segments(start, end):
+        with open_segment(seg['path']) as f:
+            yield from f
+
+
+class SegmentedFileHandler(logging.FileHandler):
+    """FileHandler that rolls daily or by size, gzips closed segments in the
+    background and keeps them within a retention limit"""
+
+    def __init__(self, filename, max_bytes=MAX_SEGMENT_BYTES, retention_days=RETENTION_DAYS,
+                 max_segments=MAX_SEGMENTS, compress=True):
+        super().__init__(filename, encoding="utf-8")
+        self.max_bytes = max_bytes
+        self.retention_days = retention_days
+        self.max_segments = max_segments
+        self.compress = compress
+        self.index = SegmentIndex(self.baseFilename)
+        self.segment_start = _first_time(self.baseFilename) or time.time()
+        self.segment_day = datetime.fromtimestamp(self.segment_start).date()
+        # One background job at a time, so retention never races a compression
+        self._finish_lock = threading.Lock()
+
+    def emit(self, record):
+        try:
+            if self._should_roll(record):
+                self._roll(record.created)
+        except Exception:
+            self.handleError(record)
+        super().emit(record)
+
+    def _should_roll(self, record):
+        if self.stream is None or self.stream.tell() == 0:
+            return False
+        if datetime.fromtimestamp(record.created).date() != self.segment_day:
+            return True
+        return bool(self.max_bytes) and self.stream.tell() >= self.max_bytes
+
+    def _roll(self, now):
+        self.acquire()
+        try:
+            self.stream.close()
+            self.stream = None
+            stamp = datetime.fromtimestamp(self.segment_start).strftime("%Y%m%d-%H%M%S")
+            closed = f"{self.baseFilename}.{stamp}"
+            n = 1
+            while os.path.exists(closed) or os.path.exists(f"{closed}.gz"):
+                closed = f"{self.baseFilename}.{stamp}-{n}"
+                n += 1
+            os.replace(self.baseFilename, closed)
+            segment = {'file': os.path.basename(closed),
+                       'start': self.segment_start,
+                       'end': now,
+                       'bytes': os.path.getsize(closed),
+                       'compressed': False}
+            self.index.update(lambda segments: segments + [segment])
+            self.segment_start = now
+            self.segment_day = datetime.fromtimestamp(now).date()
+            self.stream = self._open()
+        finally:
+            self.release()
+        threading.Thread(target=self._finish_segment, args=(closed,), daemon=True).start()
+
+    def _finish_segment(self, closed):
+        """Compress a closed segment and apply retention, off the logging thread"""
+        with self._finish_lock:
+            self._compress(closed)
+            self._apply_retention()
+
+    def _compress(self, closed):
+        if self.compress:
+            try:
+                with open(closed, "rb") as src, gzip.open(f"{closed}.gz.tmp", "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(f"{closed}.gz.tmp", f"{closed}.gz")
+                name = os.path.basename(closed)
+
+                def mark(segments):
+                    for seg in segments:
+                        if seg['file'] == name:
+                            seg['file'] = f"{name}.gz"
+                            seg['compressed'] = True
+                # The index points at the .gz before the plain file goes away
+                self.index.update(mark)
+                os.remove(closed)
+            except OSError:
+                pass
+
+    def _apply_retention(self):
+        horizon = time.time() - self.retention_days * 86400
+        directory = os.path.dirname(self.baseFilename)
+
+        def prune(segments):
+            keep = [seg for seg in segments if seg['end'] >= horizon]
+            keep = keep[-self.max_segments:] if self.max_segments else keep
+            for seg in segments:
+                if seg not in keep:
+                    try:
+                        os.remove(os.path.join(directory, seg['file']))
+                    except OSError:
+                        pass
+            return keep
+        self.index.update(prune)
@@ -0,0 +1,199 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+# MCSTATECHANGE status codes (Host I/F spec 6.15.1)
+MACHINE_STATES = {
+    0: 'Unknown',
+    1: 'Unknown',
+    2: 'Change Over',
+    3: 'Idle',
+    4: 'Loading',
+    5: 'Run',
+    6: 'Stop',
+    7: 'Wait Next',
+    8: 'Wait Parts',
+    9: 'Wait Previous',
+    10: 'Wait Switch',
+    11: 'Maintenance'
+}
+NUM_STATES = 12
+# States counted as downtime caused by the machine itself
+DOWNTIME_STATES = (2, 6, 8, 10, 11)
+# Shift start hours
+SHIFT_HOURS = (6, 14, 22)
+
+
+def state_code(value):
+    code = int(value)
+    return code if 0 <= code < NUM_STATES else 0
+
+
+def shift_start(at=None):
+    """Start of the shift containing `at` (defaults to now)"""
+    at = at or datetime.now()
+    starts = [at.replace(hour=h, minute=0, second=0, microsecond=0) for h in SHIFT_HOURS]
+    current = [s for s in starts if s <= at]
+    if current:
+        return current[-1]
+    # Before the first shift of the day: still in yesterday's last shift
+    return starts[-1] - timedelta(days=1)
+
+
+class _Track:
+    """Run-length intervals of one machine/module.
+
+    starts[i] / states[i] describe interval i, which ends at starts[i+1]
+    (the last one is open until `tail_end`, or now). cum[s][i] holds the
+    seconds spent in state s over intervals [0, i), so any whole run of
+    intervals is summed with two lookups.
+    """
+    __slots__ = ('starts', 'states', 'cum', 'tail_end')
+
+    def __init__(self):
+        self.starts = array('d')
+        self.states = array('B')
+        self.cum = [array('d') for _ in range(NUM_STATES)]
+        self.tail_end = None
+
+    def append(self, start, state):
+        n = len(self.starts)
+        if n:
+            prev_state = self.states[-1]
+            duration = max(start - self.starts[-1], 0.0)
+            for s in range(NUM_STATES):
+                self.cum[s].append(self.cum[s][-1] + (duration if s == prev_state else 0.0))
+        else:
+            for s in range(NUM_STATES):
+                self.cum[s].append(0.0)
+        self.starts.append(start)
+        self.states.append(state)
+
+    def end_of(self, i, now):
+        if i + 1 < len(self.starts):
+            return self.starts[i + 1]
+        return self.tail_end if self.tail_end is not None else now
+
+    def durations(self, t1, t2, now):
+        totals = [0.0] * NUM_STATES
+        n = len(self.starts)
+        if not n or t2 <= t1:
+            return totals
+        i1 = max(bisect_right(self.starts, t1) - 1, 0)
+        i2 = bisect_left(self.starts, t2) - 1
+        if i2 < i1:
+            return totals
+        # Partial intervals at both ends
+        for i in {i1, i2}:
+            overlap = min(t2, self.end_of(i, now)) - max(t1, self.starts[i])
+            if overlap > 0:
+                totals[self.states[i]] += overlap
+        # Whole intervals in between from the prefix sums
+        if i2 > i1 + 1:
+            for s in range(NUM_STATES):
+                totals[s] += self.cum[s][i2] - self.cum[s][i1 + 1]
+        return totals
+
+    def trim(self, before):
+        """Drop intervals that ended before `before`"""
+        keep = bisect_right(self.starts, before) - 1
+        if keep <= 0:
+            return
+        self.starts = self.starts[keep:]
+        self.states = self.states[keep:]
+        self.cum = [c[keep:] for c in self.cum]
+
+
+class MachineStateTimeline:
+    """Append-only machine/module state intervals built from MCSTATECHANGE"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tracks = {}
+
+    def record(self, machine, module, when, prev_status, curr_status):
+        """Apply a transition. Returns the interval it closed as (start, end, state), if any"""
+        key = (machine, str(module))
+        prev_state, curr_state = state_code(prev_status), state_code(curr_status)
+        with self._lock:
+            track = self._tracks.get(key)
+            if track is None:
+                track = self._tracks[key] = _Track()
+            closed = None
+            if track.tail_end is not None:
+                # Resuming after a reload: the gap belongs to the reported previous state
+                track.append(track.tail_end, prev_state)
+                track.tail_end = None
+            if len(track.starts):
+                start, state = track.starts[-1], track.states[-1]
+                if when < start:
+                    when = start
+                closed = (start, when, state)
+            track.append(when, curr_state)
+            return closed
+
+    def load(self, machine, module, start, end, state):
+        """Restore a persisted closed interval (must be fed in time order)"""
+        key = (machine, str(module))
+        with self._lock:
+            track = self._tracks.get(key)
+            if track is None:
+                track = self._tracks[key] = _Track()
+            if len(track.starts) and track.tail_end is None:
+                return
+            track.append(start, state_code(state))
+            track.tail_end = end
+
+    def trim(self, before):
+        with self._lock:
+            for track in self._tracks.values():
+                track.trim(before)
+
+    def current(self):
+        """Current state of every known machine/module"""
+        with self._lock:
+            result = []
+            for (machine, module), track in self._tracks.items():
+                if not len(track.starts) or track.tail_end is not None:
+                    continue
+                state = track.states[-1]
+                result.append({'machine': machine,
+                               'module': module,
+                               'state': state,
+                               'name': MACHINE_STATES[state],
+                               'since': track.starts[-1]})
+            return result
+
+    def time_in_states(self, t1, t2, machine=None, module=None):
+        """Seconds per state between t1 and t2 (epoch seconds), per machine/module"""
+        now = time.time()
+        result = []
+        with self._lock:
+            for (m, mod), track in self._tracks.items():
+                if (machine is not None and m != machine) or (module is not None and mod != str(module)):
+                    continue
+                totals = track.durations(t1, t2, now)
+                result.append({'machine': m,
+                               'module': mod,
+                               'states': {MACHINE_STATES[s]: round(v, 1)
+                                          for s, v in enumerate(totals) if v > 0}})
+        return result
+
+    def top_downtime(self, t1, t2, limit=10):
+        """Largest downtime contributors between t1 and t2 as (machine, module, state)"""
+        now = time.time()
+        causes = []
+        with self._lock:
+            for (m, mod), track in self._tracks.items():
+                totals = track.durations(t1, t2, now)
+                for s in DOWNTIME_STATES:
+                    if totals[s] > 0:
+                        causes.append({'machine': m,
+                                       'module': mod,
+                                       'state': s,
+                                       'name': MACHINE_STATES[s],
+                                       'seconds': round(totals[s], 1)})
+        causes.sort(key=lambda c: c['seconds'], reverse=True)
+        return causes[:limit]
@@ -1,7 +1,13 @@
 from fastapi import FastAPI, WebSocket, Request,Form
-from fastapi.responses import HTMLResponse,FileResponse,RedirectResponse,JSONResponse
+from fastapi.responses import HTMLResponse,FileResponse,RedirectResponse,JSONResponse,StreamingResponse
 from contextlib import asynccontextmanager
 from test import FujiHostInterface,backend_logger
+from machine_timeline import shift_start
+from log_segments import SegmentedFileHandler
+from log_search import LogSearch
+from db_catalog import DailyDbCatalog, TIME_COLUMNS
+import archive
+from archive import ArchiveExporter, read_archive
 from configuration import SECRET_KEY
 import asyncio
 import logging
@@ -11,9 +17,10 @@ import threading
 from weakref import WeakSet
 import colorlog
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Literal
 import os
+import json
 from starlette.middleware.sessions import SessionMiddleware
 from fastapi import HTTPException
 import xml.etree.ElementTree as ET
@@ -34,7 +41,7 @@ CONFIG_DIR = Path("config")
 # Configure API Request Logger
 api_logger = logging.getLogger("api_logger")
 api_logger.setLevel(logging.INFO)
-api_handler = logging.FileHandler("api_requests.log")
+api_handler = SegmentedFileHandler("api_requests.log")
 api_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
 api_logger.addHandler(api_handler)
 api_logger.propagate = False  # Disable propagation to root
@@ -47,6 +54,11 @@ clients = WeakSet()
 fuji_instance: FujiHostInterface | None = None
 hostname = socket.gethostname()
 connection_lock = threading.Lock()
+log_search = LogSearch("fuji_interface.log")
+LOG_INDEX_INTERVAL = 60
+db_catalog = DailyDbCatalog()
+archive_exporter = ArchiveExporter()
+ARCHIVE_INTERVAL = 3600
 
 def get_fuji_status() -> dict:
     """Returns the current connection status of the Fuji machine"""
@@ -55,17 +67,24 @@ def get_fuji_status() -> dict:
         'host': fuji_instance.HOST if fuji_instance else 'N/A',
         'hostname': fuji_instance.HOSTNAME if fuji_instance else 'N/A',
         'port': fuji_instance.PORT if fuji_instance else 'N/A',
-        'local_hostname': hostname
+        'local_hostname': hostname,
+        'liveness': fuji_instance.liveness() if fuji_instance else None
     }
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     global fuji_instance
     try:
+        # Reported before anything else starts, not at the first export
+        if not archive.AVAILABLE:
+            backend_logger.error(archive.MISSING)
         fuji_instance = FujiHostInterface()
         await asyncio.to_thread(fuji_instance.connect)
         asyncio.create_task(broadcast_updates())
         asyncio.create_task(connection_monitor())
+        asyncio.create_task(log_index_updater())
+        if archive.AVAILABLE:
+            asyncio.create_task(archive_job())
         yield
     finally:
         if fuji_instance:
@@ -103,6 +122,24 @@ async def connection_monitor():
             backend_logger.error(f"Connection monitor error: {str(e)}")
             await asyncio.sleep(5)
 
+# Keeps the log search index up to date with the live log and new segments
+async def log_index_updater():
+    while True:
+        try:
+            await asyncio.to_thread(log_search.update)
+        except Exception as e:
+            backend_logger.error("Log index update error: %s", e)
+        await asyncio.sleep(LOG_INDEX_INTERVAL)
+
+# Exports closed daily databases to the columnar archive
+async def archive_job():
+    while True:
+        try:
+            await asyncio.to_thread(archive_exporter.run)
+        except Exception as e:
+            backend_logger.error("Archive export error: %s", e)
+        await asyncio.sleep(ARCHIVE_INTERVAL)
+
 @app.middleware("http")
 
 async def log_requests(request: Request, call_next):
@@ -141,32 +178,50 @@ async def websocket_endpoint(websocket: WebSocket):
         
         if fuji_instance:
             with connection_lock:
-                all_messages = fuji_instance.production_state.get('message_log', [])
-                # Send last 100 messages in reverse order (newest first)
-                initial_data['message_log'] = all_messages[-10000:][::-1]
+                message_log = fuji_instance.production_state['message_log']
+                # Send the buffered messages newest first
+                initial_data['message_log'] = message_log.tail(10000)[::-1]
+            initial_data['slot_map'] = fuji_instance.slot_state.snapshot()
         
         await websocket.send_json(initial_data)
         
-        # Keep connection alive
+        # Keep connection alive and answer client requests
         while True:
-            await websocket.receive_text()
+            text = await websocket.receive_text()
+            await handle_client_message(websocket, text)
     except Exception as e:
         logger.error(f"WebSocket error: {str(e)}")
     finally:
         clients.discard(websocket)
 
+async def handle_client_message(websocket: WebSocket, text: str):
+    """Client requests sent over /ws, e.g. {"type": "slot_resync", "version": 42}"""
+    try:
+        msg = json.loads(text)
+    except ValueError:
+        return
+    if not isinstance(msg, dict) or not fuji_instance:
+        return
+    if msg.get('type') == 'slot_resync':
+        # A client that missed a patch gets everything it lacks, or a full snapshot
+        version = int(msg.get('version') or 0)
+        await websocket.send_json({'slot_map': fuji_instance.slot_state.diff_since(version)})
+
 async def broadcast_updates():
     last_index = 0
+    last_slot_version = 0
+    last_reel_alert = 0
+    last_critical_error = 0
     while True:
         try:
             if fuji_instance and fuji_instance.connected:
                 with connection_lock:
-                    messages = fuji_instance.production_state.get('message_log', [])
-                    current_count = len(messages)
+                    message_log = fuji_instance.production_state['message_log']
+                    current_count = message_log.total
                     
                     if current_count > last_index:
                         # Send messages in reverse order (newest first)
-                        new_messages = messages[last_index:current_count][::-1]
+                        new_messages = message_log.since(last_index)[::-1]
                         last_index = current_count
                         
                         for client in list(clients):
@@ -178,6 +233,38 @@ async def broadcast_updates():
                             except Exception as e:
                                 logger.error(f"Client error: {str(e)}")
                                 clients.discard(client)
+
+            if fuji_instance and fuji_instance.slot_state.version != last_slot_version:
+                # Only the slots changed since the last push go out
+                slot_patch = fuji_instance.slot_state.diff_since(last_slot_version)
+                slot_patch['from'] = last_slot_version
+                last_slot_version = slot_patch['version']
+                for client in list(clients):
+                    try:
+                        await client.send_json({'slot_patch': slot_patch})
+                    except Exception as e:
+                        logger.error(f"Client error: {str(e)}")
+                        clients.discard(client)
+
+            if fuji_instance and fuji_instance.reel_alert_id != last_reel_alert:
+                reel_alerts = [a for a in list(fuji_instance.reel_alerts) if a['id'] > last_reel_alert]
+                last_reel_alert = fuji_instance.reel_alert_id
+                for client in list(clients):
+                    try:
+                        await client.send_json({'reel_alerts': reel_alerts})
+                    except Exception as e:
+                        logger.error(f"Client error: {str(e)}")
+                        clients.discard(client)
+
+            if fuji_instance and fuji_instance.critical_error_id != last_critical_error:
+                critical_errors = [e for e in list(fuji_instance.critical_errors) if e['id'] > last_critical_error]
+                last_critical_error = fuji_instance.critical_error_id
+                for client in list(clients):
+                    try:
+                        await client.send_json({'critical_errors': critical_errors})
+                    except Exception as e:
+                        logger.error(f"Client error: {str(e)}")
+                        clients.discard(client)
             await asyncio.sleep(0.1)
         except Exception as e:
             logger.error(f"Broadcast error: {str(e)}")
@@ -378,6 +465,359 @@ async def get_line_config(line: str):
         logger.error(f"Error loading config: {str(e)}")
         raise HTTPException(status_code=500, detail="Error loading configuration")
 
+@app.get("/feederlist")
+async def get_feederlist(program: str, group: str = "PAM", timeout: float = 20.0, refresh: bool = False):
+    """Feeder positions for a program, from the cache or a FEEDERLIST round trip"""
+    if not fuji_instance or not fuji_instance.connected:
+        raise HTTPException(status_code=503, detail="Machine not connected")
+    timeout = min(max(timeout, 0.1), 60.0)
+    future = await asyncio.to_thread(fuji_instance.get_feeder_list, program, group, timeout, refresh)
+    try:
+        # Shielded: the future is shared with other callers and the cache
+        reply = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+    except (asyncio.TimeoutError, TimeoutError):
+        raise HTTPException(status_code=504, detail="FEEDERLIST_ACK timeout")
+    except ConnectionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if reply['result'] != "0":
+        raise HTTPException(status_code=502, detail=f"FEEDERLIST NG, Result={reply['result']}")
+    return JSONResponse(content=reply)
+
+@app.get("/feederlist/cache")
+async def get_feederlist_cache():
+    """Hit ratio and entry ages of the FEEDERLIST cache"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    return JSONResponse(content=fuji_instance.feeder_cache.stats())
+
+@app.get("/slots")
+async def get_slots(since: int | None = None):
+    """Feeder slot state; with `since`, only the slots changed after that version"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    if since is None:
+        return JSONResponse(content=fuji_instance.slot_state.snapshot())
+    return JSONResponse(content=fuji_instance.slot_state.diff_since(since))
+
+def _time_range(start: datetime | None, end: datetime | None) -> tuple[float, float]:
+    """Epoch bounds of a query, defaulting to the current shift"""
+    start = start or shift_start()
+    end = end or datetime.now()
+    return start.timestamp(), end.timestamp()
+
+@app.get("/machine-states/current")
+async def get_machine_states():
+    """Current state of every machine/module"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    return JSONResponse(content=fuji_instance.state_timeline.current())
+
+@app.get("/machine-states/durations")
+async def get_state_durations(start: datetime | None = None, end: datetime | None = None,
+                              machine: str | None = None, module: str | None = None):
+    """Seconds spent in each state between start and end (default: this shift)"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    t1, t2 = _time_range(start, end)
+    return JSONResponse(content=fuji_instance.state_timeline.time_in_states(t1, t2, machine, module))
+
+@app.get("/machine-states/downtime")
+async def get_top_downtime(start: datetime | None = None, end: datetime | None = None, limit: int = 10):
+    """Top downtime causes between start and end (default: this shift)"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    t1, t2 = _time_range(start, end)
+    return JSONResponse(content=fuji_instance.state_timeline.top_downtime(t1, t2, limit))
+
+@app.get("/kpi")
+async def get_kpi():
+    """Dashboard KPIs from the streaming panel aggregator and the state timeline"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    kpis = fuji_instance.panel_stats.kpis()
+    # Availability = Run time share of the shift; performance is not measured, so OEE = A x Q
+    t1, t2 = _time_range(None, None)
+    run = observed = 0.0
+    for entry in fuji_instance.state_timeline.time_in_states(t1, t2):
+        run += entry['states'].get('Run', 0.0)
+        observed += sum(entry['states'].values())
+    availability = run / observed if observed else None
+    quality = kpis['shift']['yield']
+    kpis['availability'] = round(availability * 100, 2) if availability is not None else None
+    kpis['oee'] = round(availability * quality, 2) if availability is not None and quality is not None else None
+    return JSONResponse(content=kpis)
+
+@app.get("/kpi/{dimension}")
+async def get_kpi_totals(dimension: Literal['line', 'module', 'slot', 'part', 'feeder'], key: str | None = None):
+    """Shift totals per line, module, slot, part or feeder"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    return JSONResponse(content=fuji_instance.panel_stats.totals(dimension, key))
+
+@app.get("/heatmap")
+async def get_heatmap(start: datetime | None = None, end: datetime | None = None):
+    """Slot and head error-rate heatmaps with z-scores against the line median"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    t1, t2 = _time_range(start, end)
+    result = await asyncio.to_thread(fuji_instance.heatmap.heatmap, t1, t2)
+    return JSONResponse(content=result)
+
+@app.get("/heatmap/trend")
+async def get_heatmap_trend(start: datetime | None = None, end: datetime | None = None):
+    """Line-wide pickup error rate per hour"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    t1, t2 = _time_range(start, end)
+    return JSONResponse(content=fuji_instance.heatmap.trend(t1, t2))
+
+@app.get("/cycle-times")
+async def get_cycle_times(start: datetime | None = None, end: datetime | None = None,
+                          line: str | None = None, machine: str | None = None,
+                          module: str | None = None, program: str | None = None):
+    """Cycle time p50/p90/p99 merged over the matching sketches (default: this shift)"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    t1, t2 = _time_range(start, end)
+    return JSONResponse(content=fuji_instance.cycle_times.query(t1, t2, line, machine, module, program))
+
+@app.get("/cycle-times/breakdown")
+async def get_cycle_time_breakdown(start: datetime | None = None, end: datetime | None = None):
+    """Cycle time percentiles per program and module (default: this shift)"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    t1, t2 = _time_range(start, end)
+    return JSONResponse(content=fuji_instance.cycle_times.breakdown(t1, t2))
+
+@app.get("/errors/slots")
+async def get_errors_by_slot(today: bool = True, module: str | None = None, code: str | None = None):
+    """ERRORREPORT counts per slot and status"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    return JSONResponse(content=fuji_instance.error_index.by_slot(today, module, code))
+
+@app.get("/errors/recent")
+async def get_recent_errors(limit: int = 100):
+    """Most recent ERRORREPORTs"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    return JSONResponse(content=fuji_instance.error_index.latest(limit))
+
+@app.get("/bom/{program}")
+async def get_bom(program: str, version: int | None = None):
+    """Current (or a given) BOM version of a program"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    store = fuji_instance.bom_store
+    bom = store.get(program, version) if version is not None else store.current(program)
+    if bom is None:
+        raise HTTPException(status_code=404, detail=f"No BOM for {program}")
+    return JSONResponse(content=bom.to_dict())
+
+@app.get("/bom/{program}/versions")
+async def get_bom_versions(program: str):
+    """Stored BOM versions of a program"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    return JSONResponse(content=fuji_instance.bom_store.versions(program))
+
+@app.get("/bom/{program}/diff")
+async def get_bom_diff(program: str, from_version: int, to_version: int):
+    """Added, removed and changed references between two BOM versions"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    diff = fuji_instance.bom_store.diff(program, from_version, to_version)
+    if diff is None:
+        raise HTTPException(status_code=404, detail="Unknown BOM version")
+    return JSONResponse(content=diff)
+
+@app.get("/verification")
+async def get_verification_stats():
+    """Loaded verification plans and PARTSREFILL/FEEDERSETUP result counts"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    return JSONResponse(content=fuji_instance.verifier.stats())
+
+@app.get("/trace/panels")
+async def trace_panels(reel: str | None = None, feeder: str | None = None, part: str | None = None,
+                       start: datetime | None = None, end: datetime | None = None):
+    """Panels that used a reel, feeder or part (default: the last 30 days)"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    keys = {k: v for k, v in (('reel', reel), ('feeder', feeder), ('part', part)) if v is not None}
+    if len(keys) != 1:
+        raise HTTPException(status_code=400, detail="Give exactly one of reel, feeder or part")
+    key, value = keys.popitem()
+    t1, t2 = _time_range(start or datetime.now() - timedelta(days=30), end)
+    panels = await asyncio.to_thread(fuji_instance.trace.panels, key, value, t1, t2)
+    return JSONResponse(content={'key': key, 'value': value, 'count': len(panels), 'panels': panels})
+
+@app.get("/trace/panel/{panel_id}")
+async def trace_panel(panel_id: str):
+    """Every component placed on a panel"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    components = await asyncio.to_thread(fuji_instance.trace.panel, panel_id)
+    if not components:
+        raise HTTPException(status_code=404, detail=f"Panel {panel_id} not found")
+    return JSONResponse(content=components)
+
+@app.get("/logs/search")
+async def search_logs(command: str | None = None, seq: str | None = None, panel: str | None = None,
+                      reel: str | None = None, level: str | None = None,
+                      start: datetime | None = None, end: datetime | None = None,
+                      text: str | None = None, limit: int = 100, cursor: str | None = None):
+    """Interface log lines by command, seq id, panel, reel, level, time and text.
+    Pass the returned 'next' as cursor for the following page"""
+    if not any((command, seq, panel, reel, level, start, end, text)):
+        raise HTTPException(status_code=400, detail="Give at least one search criterion")
+    position = None
+    if cursor:
+        try:
+            bucket, file_id, offset = cursor.split(":")
+            position = (int(bucket), int(file_id), int(offset))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    result = await asyncio.to_thread(log_search.search, command, seq, panel, reel, level,
+                                     start.timestamp() if start else None,
+                                     end.timestamp() if end else None,
+                                     text, max(1, min(limit, 1000)), position)
+    if result['next']:
+        result['next'] = ":".join(str(part) for part in result['next'])
+    return JSONResponse(content=result)
+
+@app.get("/frames")
+async def get_frames(start: datetime | None = None, end: datetime | None = None,
+                     command: str | None = None, seq: str | None = None, limit: int = 1000):
+    """Raw frames sent and received, oldest first (default: the current shift)"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    t1, t2 = _time_range(start, end)
+    rows = await asyncio.to_thread(fuji_instance.frame_history, t1, t2, command, seq, max(1, min(limit, 10000)))
+    return JSONResponse(content=rows)
+
+@app.get("/history/catalog")
+async def get_history_catalog():
+    """Daily database files with row counts and time range per table"""
+    await asyncio.to_thread(db_catalog.refresh)
+    return JSONResponse(content=db_catalog.entries())
+
+@app.get("/history/{table}")
+async def get_history(table: str, start: datetime | None = None, end: datetime | None = None, limit: int = 100000):
+    """Rows of a table across the daily databases, streamed as JSON lines in time order"""
+    if table not in TIME_COLUMNS:
+        raise HTTPException(status_code=404, detail=f"Unknown table {table}")
+    t1, t2 = _time_range(start, end)
+    rows = db_catalog.query(table, start=t1, end=t2)
+
+    def lines():
+        try:
+            for n, row in enumerate(rows):
+                if n >= limit:
+                    break
+                yield json.dumps(dict(row), default=str) + "\n"
+        finally:
+            rows.close()
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.get("/rollups/{kind}")
+async def get_rollups(kind: Literal['hour', 'shift'], start: datetime | None = None, end: datetime | None = None,
+                      machine: str | None = None):
+    """Hourly or per-shift rollups (default: buckets of the last 24 hours)"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    t1, t2 = _time_range(start or datetime.now() - timedelta(hours=24), end)
+    rows = await asyncio.to_thread(fuji_instance.rollups.rows, kind, t1, t2, machine)
+    return JSONResponse(content=rows)
+
+@app.post("/rollups/{kind}/recompute")
+async def recompute_rollup(kind: Literal['hour', 'shift'], start: datetime):
+    """Rebuild the hour or shift containing `start` from the daily databases"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    written = await asyncio.to_thread(fuji_instance.recompute_rollup, kind, start, db_catalog)
+    return JSONResponse(content={'kind': kind, 'start': start.isoformat(), 'rows': written})
+
+@app.get("/archive")
+async def get_archive_manifests():
+    """Days exported to the columnar archive with their row counts"""
+    if not archive.AVAILABLE:
+        raise HTTPException(status_code=503, detail=archive.MISSING)
+    return JSONResponse(content=await asyncio.to_thread(archive_exporter.manifests))
+
+@app.get("/archive/{table}")
+async def query_archive(table: str, start: datetime, end: datetime, columns: str | None = None,
+                        command: str | None = None, limit: int = 10000):
+    """Archived rows of a table between start and end, only the requested columns"""
+    if not archive.AVAILABLE:
+        raise HTTPException(status_code=503, detail=archive.MISSING)
+    if table not in TIME_COLUMNS:
+        raise HTTPException(status_code=404, detail=f"Unknown table {table}")
+    try:
+        result = await asyncio.to_thread(read_archive, table, start, end,
+                                         columns.split(",") if columns else None,
+                                         command.split(",") if command else None,
+                                         archive_exporter.archive_dir)
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows = result.slice(0, limit).to_pylist()
+    return JSONResponse(content=json.loads(json.dumps({'count': result.num_rows, 'rows': rows}, default=str)))
+
+@app.get("/panels/msl")
+async def get_panels_near_msl(within: int = 1800):
+    """Active panels close to (or past) their MSL floor life limit"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    return JSONResponse(content=fuji_instance.panels_near_msl(within))
+
+@app.get("/reels/next")
+async def get_next_reels(limit: int = 10):
+    """Reels predicted to run out first"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    return JSONResponse(content=fuji_instance.reel_queue.next(limit))
+
+@app.get("/reels/alerts")
+async def get_reel_alerts(limit: int = 100):
+    """Most recent reel depletion alerts"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    return JSONResponse(content=list(fuji_instance.reel_alerts)[-limit:][::-1])
+
+@app.get("/alarms/active")
+async def get_active_alarms():
+    """Alarms that are ON and not yet OFF"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    return JSONResponse(content=fuji_instance.alarm_index.active())
+
+@app.get("/alarms/mttr")
+async def get_alarm_mttr(error_code: str | None = None, sub_error_code: str | None = None):
+    """Mean time to repair per alarm code"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    return JSONResponse(content=fuji_instance.alarm_index.mttr(error_code, sub_error_code))
+
+@app.get("/alarms/top")
+async def get_top_alarms(limit: int = 10):
+    """Alarm codes with the largest cumulative duration"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    return JSONResponse(content=fuji_instance.alarm_index.top(limit))
+
+@app.get("/alarms/history")
+async def get_alarm_history(limit: int = 100):
+    """Most recently closed alarms"""
+    if not fuji_instance:
+        raise HTTPException(status_code=503, detail="Interface not initialized")
+    return JSONResponse(content=fuji_instance.alarm_index.recent(limit))
+
+@app.get("/live", response_class=HTMLResponse)
+async def live_page(request: Request):
+    if not request.session.get("authenticated"):
+        return RedirectResponse(url="/login")
+    return FileResponse(r"pages/live.html")
+
 @app.get("/edit-line", response_class=HTMLResponse)
 async def edit_line_page(request: Request, line: str):
     if not request.session.get("authenticated"):
@@ -581,6 +1021,39 @@ async def read_root(request: Request):
                         </div>
                     </div>
 
+                    <div class="grid grid-cols-2 md:grid-cols-5 gap-4 mb-8">
+                        <div class="bg-gray-800 p-4 rounded-lg">
+                            <div class="text-xs text-gray-400">Panels (shift)</div>
+                            <div id="kpi-panels" class="text-2xl font-bold">-</div>
+                        </div>
+                        <div class="bg-gray-800 p-4 rounded-lg">
+                            <div class="text-xs text-gray-400">Yield (last hour)</div>
+                            <div id="kpi-yield-hour" class="text-2xl font-bold">-</div>
+                        </div>
+                        <div class="bg-gray-800 p-4 rounded-lg">
+                            <div class="text-xs text-gray-400">Yield (last 100 panels)</div>
+                            <div id="kpi-yield-panels" class="text-2xl font-bold">-</div>
+                        </div>
+                        <div class="bg-gray-800 p-4 rounded-lg">
+                            <div class="text-xs text-gray-400">Availability (shift)</div>
+                            <div id="kpi-availability" class="text-2xl font-bold">-</div>
+                        </div>
+                        <div class="bg-gray-800 p-4 rounded-lg">
+                            <div class="text-xs text-gray-400">OEE (shift)</div>
+                            <div id="kpi-oee" class="text-2xl font-bold">-</div>
+                        </div>
+                    </div>
+
+                    <div class="bg-gray-800 rounded-lg shadow-xl p-6 mb-8">
+                        <div class="flex justify-between items-center mb-4">
+                            <h2 class="text-xl font-semibold">Feeder Slots</h2>
+                            <span id="slot-version" class="bg-gray-700 px-3 py-1 rounded-full text-sm">v0</span>
+                        </div>
+                        <div id="slot-map" class="grid grid-cols-6 md:grid-cols-10 lg:grid-cols-12 gap-1 text-xs font-mono">
+                            <!-- Slots inserted here -->
+                        </div>
+                    </div>
+
                     <div class="bg-gray-800 rounded-lg shadow-xl p-6">
                         <div class="flex justify-between items-center mb-4">
                             <h2 class="text-xl font-semibold">Communication Log</h2>
@@ -674,10 +1147,85 @@ async def read_root(request: Request):
                         }}
                     }}
 
+                    function percent(value) {{
+                        return value === null || value === undefined ? '-' : `${{value.toFixed(1)}}%`;
+                    }}
+
+                    async function refreshKpis() {{
+                        try {{
+                            const response = await fetch('/kpi');
+                            if(!response.ok) return;
+                            const kpi = await response.json();
+                            document.getElementById('kpi-panels').textContent = kpi.shift.panels;
+                            document.getElementById('kpi-yield-hour').textContent = percent(kpi.last_hour.yield);
+                            document.getElementById('kpi-yield-panels').textContent = percent(kpi.last_panels.yield);
+                            document.getElementById('kpi-availability').textContent = percent(kpi.availability);
+                            document.getElementById('kpi-oee').textContent = percent(kpi.oee);
+                        }} catch(e) {{
+                            console.error(e);
+                        }}
+                    }}
+                    refreshKpis();
+                    setInterval(refreshKpis, 5000);
+
+                    const slotMap = document.getElementById('slot-map');
+                    const slotElements = new Map();
+                    let slotVersion = 0;
+
+                    function slotClass(slot) {{
+                        if(slot.error) return 'bg-red-700';
+                        if(slot.status === '3') return 'bg-yellow-600';
+                        if(slot.status) return 'bg-orange-700';
+                        if(!slot.feeder_id && !slot.part_no) return 'bg-gray-700';
+                        return 'bg-green-800';
+                    }}
+
+                    function applySlots(slots) {{
+                        slots.forEach(slot => {{
+                            const key = `${{slot.module}}-${{slot.stage}}-${{slot.slot}}`;
+                            let element = slotElements.get(key);
+                            if(!element) {{
+                                element = document.createElement('div');
+                                slotElements.set(key, element);
+                                slotMap.appendChild(element);
+                            }}
+                            element.className = `p-1 rounded ${{slotClass(slot)}}`;
+                            element.title = `Part: ${{slot.part_no || '-'}} | Feeder: ${{slot.feeder_id || '-'}} | Error: ${{slot.error || '-'}}`;
+                            element.textContent = `${{key}} ${{slot.qty ?? ''}}`;
+                        }});
+                    }}
+
+                    function handleSlotMap(map) {{
+                        if(map.full) {{
+                            slotMap.innerHTML = '';
+                            slotElements.clear();
+                        }}
+                        applySlots(map.slots);
+                        slotVersion = map.version;
+                        document.getElementById('slot-version').textContent = `v${{slotVersion}}`;
+                    }}
+
+                    function handleSlotPatch(patch) {{
+                        if(patch.from !== slotVersion) {{
+                            // Missed a patch: ask the server for what we lack
+                            ws.send(JSON.stringify({{type: 'slot_resync', version: slotVersion}}));
+                            return;
+                        }}
+                        handleSlotMap(patch);
+                    }}
+
                     ws.onmessage = (event) => {{
                         const data = JSON.parse(event.data);
                         updateConnectionStatus(data);
 
+                        if(data.slot_map) {{
+                            handleSlotMap(data.slot_map);
+                        }}
+
+                        if(data.slot_patch) {{
+                            handleSlotPatch(data.slot_patch);
+                        }}
+
                         if(data.message_log) {{
                             logContainer.innerHTML = '';
                             handleNewMessages(data.message_log);
@@ -0,0 +1,71 @@
+import math
+import threading
+import time
+
+
+class TimerWheel:
+    """Hashed timer wheel: O(1) schedule and cancel, expiry cost proportional
+    to the ticks elapsed plus the timers that fire.
+
+    Timers further out than one revolution carry a round count and are
+    skipped until it reaches zero.
+    """
+
+    def __init__(self, tick=1.0, size=3600, now=None):
+        self._lock = threading.Lock()
+        self.tick = tick
+        self.size = size
+        self._slots = [{} for _ in range(size)]
+        # (key, kind) -> slot index, for O(1) cancel
+        self._where = {}
+        self._current = int((now or time.time()) // tick)
+
+    def __len__(self):
+        return len(self._where)
+
+    def schedule(self, key, kind, when):
+        """Fire (key, kind) once `when` has passed; rescheduling replaces the old timer"""
+        with self._lock:
+            self._remove(key, kind)
+            tick = max(math.ceil(when / self.tick), self._current + 1)
+            index = tick % self.size
+            self._slots[index][(key, kind)] = (tick - self._current - 1) // self.size
+            self._where[(key, kind)] = index
+
+    def _remove(self, key, kind):
+        index = self._where.pop((key, kind), None)
+        if index is not None:
+            del self._slots[index][(key, kind)]
+
+    def cancel(self, key, kinds):
+        with self._lock:
+            for kind in kinds:
+                self._remove(key, kind)
+
+    def advance(self, now=None):
+        """Move the wheel up to `now` and return the (key, kind) timers that fired"""
+        target = int((now or time.time()) // self.tick)
+        fired = []
+        with self._lock:
+            if target - self._current >= self.size:
+                # Long pause: visit each slot once, counting how often it came round
+                for index, slot in enumerate(self._slots):
+                    first = self._current + 1 + (index - self._current - 1) % self.size
+                    visits = (target - first) // self.size + 1 if first <= target else 0
+                    self._expire(slot, visits, fired)
+            else:
+                for tick in range(self._current + 1, target + 1):
+                    slot = self._slots[tick % self.size]
+                    if slot:
+                        self._expire(slot, 1, fired)
+            self._current = max(self._current, target)
+        return fired
+
+    def _expire(self, slot, visits, fired):
+        for timer, rounds in list(slot.items()):
+            if rounds < visits:
+                del slot[timer]
+                del self._where[timer]
+                fired.append(timer)
+            else:
+                slot[timer] = rounds - visits
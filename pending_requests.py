@@ -0,0 +1,126 @@
+import threading
+import time
+import logging
+from concurrent.futures import Future
+
+backend_logger = logging.getLogger("backend_logger")
+
+# SeqID range from the Host I/F spec: 1~999999, returns to 1 after the maximum
+SEQ_ID_MIN = 1
+SEQ_ID_MAX = 999999
+
+
+class SequenceAllocator:
+    """Thread-safe SeqID counter that wraps around at SEQ_ID_MAX"""
+
+    def __init__(self, start=0):
+        self._lock = threading.Lock()
+        self._current = start
+
+    @property
+    def current(self):
+        return self._current
+
+    def next(self):
+        with self._lock:
+            self._current += 1
+            if self._current > SEQ_ID_MAX:
+                self._current = SEQ_ID_MIN
+            return self._current
+
+
+class PendingRequests:
+    """Host-initiated requests waiting for their *_ACK, keyed by SeqID"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def register(self, seq_id, command, timeout=20.0):
+        """Create the future for a request before it is sent"""
+        seq_id = str(seq_id)
+        future = Future()
+        entry = {
+            'command': command,
+            'future': future,
+            'sent_at': time.monotonic(),
+            'deadline': time.monotonic() + timeout if timeout else None
+        }
+        with self._lock:
+            previous = self._pending.pop(seq_id, None)
+            self._pending[seq_id] = entry
+        if previous:
+            # SeqID wrapped while the old request was still open
+            previous['future'].cancel()
+        future.add_done_callback(lambda f: self._discard(seq_id, f))
+        return future
+
+    def _discard(self, seq_id, future):
+        with self._lock:
+            entry = self._pending.get(seq_id)
+            if entry and entry['future'] is future:
+                del self._pending[seq_id]
+
+    def resolve(self, seq_id, command, result):
+        """Complete the request matching an incoming ACK. Returns False if nobody was waiting"""
+        with self._lock:
+            entry = self._pending.get(str(seq_id))
+        if not entry or entry['command'] != command:
+            return False
+        return self._complete(entry['future'], result=result)
+
+    def fail(self, seq_id, exc):
+        with self._lock:
+            entry = self._pending.get(str(seq_id))
+        if not entry:
+            return False
+        return self._complete(entry['future'], exc=exc)
+
+    def cancel(self, seq_id):
+        with self._lock:
+            entry = self._pending.get(str(seq_id))
+        return entry['future'].cancel() if entry else False
+
+    def expire(self, now=None):
+        """Fail every request whose deadline has passed"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = [(seq_id, entry) for seq_id, entry in self._pending.items()
+                       if entry['deadline'] is not None and entry['deadline'] <= now]
+        for seq_id, entry in expired:
+            backend_logger.warning("%s %s timed out waiting for ACK", entry['command'], seq_id)
+            self._complete(entry['future'], exc=TimeoutError(f"{entry['command']} {seq_id} timed out"))
+        return len(expired)
+
+    def fail_all(self, exc):
+        """Fail every open request, e.g. when the connection drops"""
+        with self._lock:
+            entries = list(self._pending.values())
+        for entry in entries:
+            self._complete(entry['future'], exc=exc)
+        return len(entries)
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            return [{'seq_id': seq_id,
+                     'command': entry['command'],
+                     'age': round(now - entry['sent_at'], 3)}
+                    for seq_id, entry in self._pending.items()]
+
+    @staticmethod
+    def _complete(future, result=None, exc=None):
+        if future.done():
+            return False
+        try:
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+            return True
+        except Exception:
+            # Cancelled or completed by another thread in the meantime
+            return False
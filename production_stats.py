@@ -0,0 +1,158 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from machine_timeline import shift_start
+
+# PCBCHECKOUT per-component counters, in this order everywhere below
+COUNTERS = ('pickups', 'errors', 'rejects', 'dislodged', 'nopickup')
+
+
+def _summary(totals, panels):
+    pickups = totals[0]
+    # Same definition as process_panel_checkout: errors + rejects + dislodged
+    failed = totals[1] + totals[2] + totals[3]
+    summary = dict(zip(COUNTERS, totals))
+    summary['panels'] = panels
+    summary['yield'] = round((pickups - failed) / pickups * 100, 2) if pickups else None
+    return summary
+
+
+class PanelCountWindow:
+    """Totals over the last N panels"""
+
+    def __init__(self, size):
+        self.size = size
+        self._panels = deque()
+        self.totals = [0] * len(COUNTERS)
+
+    def add(self, counts):
+        self._panels.append(counts)
+        for i, v in enumerate(counts):
+            self.totals[i] += v
+        if len(self._panels) > self.size:
+            evicted = self._panels.popleft()
+            for i, v in enumerate(evicted):
+                self.totals[i] -= v
+
+    def summary(self):
+        return _summary(self.totals, len(self._panels))
+
+
+class PanelTimeWindow:
+    """Totals over a sliding time window, kept as per-bucket partial sums"""
+
+    def __init__(self, seconds, bucket=60):
+        self.seconds = seconds
+        self.bucket = bucket
+        self._buckets = deque()
+        self.totals = [0] * len(COUNTERS)
+        self.panels = 0
+
+    def _evict(self, now):
+        horizon = now - self.seconds
+        while self._buckets and self._buckets[0][0] + self.bucket <= horizon:
+            _, counts, panels = self._buckets.popleft()
+            for i, v in enumerate(counts):
+                self.totals[i] -= v
+            self.panels -= panels
+
+    def add(self, counts, now):
+        slot = now - now % self.bucket
+        if not self._buckets or self._buckets[-1][0] != slot:
+            self._buckets.append((slot, [0] * len(COUNTERS), 0))
+        start, bucket_counts, bucket_panels = self._buckets[-1]
+        for i, v in enumerate(counts):
+            bucket_counts[i] += v
+            self.totals[i] += v
+        self._buckets[-1] = (start, bucket_counts, bucket_panels + 1)
+        self.panels += 1
+        self._evict(now)
+
+    def summary(self, now):
+        self._evict(now)
+        return _summary(self.totals, self.panels)
+
+
+class PanelStatsAggregator:
+    """Streaming PCBCHECKOUT counters: rolling windows plus per-shift totals
+    by line, module, slot, part and feeder"""
+
+    DIMENSIONS = ('line', 'module', 'slot', 'part', 'feeder')
+
+    def __init__(self, last_panels=100, window_seconds=3600):
+        self._lock = threading.Lock()
+        self.last_panels = PanelCountWindow(last_panels)
+        self.last_hour = PanelTimeWindow(window_seconds)
+        self._reset_shift(shift_start())
+        self.previous_shift = None
+
+    def _reset_shift(self, start):
+        self.shift_start = start
+        self.shift_totals = [0] * len(COUNTERS)
+        self.shift_panels = 0
+        self.by = {dim: {} for dim in self.DIMENSIONS}
+
+    def _roll_shift(self, now_dt):
+        current = shift_start(now_dt)
+        if current != self.shift_start:
+            self.previous_shift = {'start': self.shift_start.isoformat(),
+                                   **_summary(self.shift_totals, self.shift_panels)}
+            self._reset_shift(current)
+
+    def _bump(self, dim, key, counts, panel_seen):
+        entry = self.by[dim].get(key)
+        if entry is None:
+            entry = self.by[dim][key] = [[0] * len(COUNTERS), 0]
+        for i, v in enumerate(counts):
+            entry[0][i] += v
+        if key not in panel_seen:
+            panel_seen.add(key)
+            entry[1] += 1
+
+    def add_panel(self, line, components, when=None):
+        """Fold one checked-out panel's component counters into every window"""
+        when = when or time.time()
+        panel_totals = [0] * len(COUNTERS)
+        rows = []
+        for comp in components:
+            counts = [int(comp[name]) for name in COUNTERS]
+            rows.append((comp, counts))
+            for i, v in enumerate(counts):
+                panel_totals[i] += v
+
+        with self._lock:
+            self._roll_shift(datetime.fromtimestamp(when))
+            self.last_panels.add(panel_totals)
+            self.last_hour.add(panel_totals, when)
+            for i, v in enumerate(panel_totals):
+                self.shift_totals[i] += v
+            self.shift_panels += 1
+
+            seen = {dim: set() for dim in self.DIMENSIONS}
+            self._bump('line', line, panel_totals, seen['line'])
+            for comp, counts in rows:
+                self._bump('module', comp['module'], counts, seen['module'])
+                self._bump('slot', f"{comp['module']}-{comp['stage']}-{comp['slot']}", counts, seen['slot'])
+                self._bump('part', comp['part'], counts, seen['part'])
+                self._bump('feeder', comp['feeder'], counts, seen['feeder'])
+
+    def kpis(self):
+        now = time.time()
+        with self._lock:
+            self._roll_shift(datetime.fromtimestamp(now))
+            return {'last_panels': self.last_panels.summary(),
+                    'last_hour': self.last_hour.summary(now),
+                    'shift': {'start': self.shift_start.isoformat(),
+                              **_summary(self.shift_totals, self.shift_panels)},
+                    'previous_shift': self.previous_shift}
+
+    def totals(self, dimension, key=None):
+        """Shift totals for one dimension, or for a single key of it"""
+        with self._lock:
+            table = self.by[dimension]
+            if key is not None:
+                entry = table.get(key)
+                return _summary(*entry) if entry else None
+            return {k: _summary(*entry) for k, entry in table.items()}
@@ -0,0 +1,122 @@
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime
+
+intern = sys.intern
+
+
+def clock(when):
+    """'%H:%M:%S' of an epoch timestamp, formatted only when shown"""
+    return time.strftime('%H:%M:%S', time.localtime(when))
+
+
+def iso(when):
+    return datetime.fromtimestamp(when).isoformat() if when is not None else None
+
+
+class MessageLog:
+    """Ring of the last `capacity` frames, kept as columns.
+
+    `total` counts every frame ever appended, so readers can ask for what
+    they have not seen yet with since(total_they_saw).
+    """
+    DIRECTIONS = ('sent', 'received')
+
+    def __init__(self, capacity=10000):
+        self._lock = threading.Lock()
+        self.capacity = capacity
+        self._times = array('q', bytes(8 * capacity))
+        self._directions = bytearray(capacity)
+        self._raw = [None] * capacity
+        self.total = 0
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, direction, raw, when=None):
+        with self._lock:
+            i = self.total % self.capacity
+            self._times[i] = int(when or time.time())
+            self._directions[i] = self.DIRECTIONS.index(direction)
+            self._raw[i] = raw
+            self.total += 1
+
+    def since(self, seen):
+        """Entries appended after the first `seen`, oldest first"""
+        with self._lock:
+            start = max(seen, self.total - self.capacity)
+            rows = [(self._times[n % self.capacity], self._directions[n % self.capacity],
+                     self._raw[n % self.capacity]) for n in range(start, self.total)]
+        return [{'timestamp': clock(t), 'direction': self.DIRECTIONS[d], 'raw': raw}
+                for t, d, raw in rows]
+
+    def tail(self, n):
+        return self.since(self.total - n)
+
+
+class PanelRecord:
+    """A checked-in panel; times are epoch seconds"""
+    __slots__ = ('panel_id', 'checkin_time', 'msl_deadline', 'status', 'checkout_time', 'yield_pct')
+
+    def __init__(self, panel_id, checkin_time, msl_deadline):
+        self.panel_id = panel_id
+        self.checkin_time = int(checkin_time)
+        self.msl_deadline = int(msl_deadline)
+        self.status = 'IN_PROGRESS'
+        self.checkout_time = None
+        self.yield_pct = None
+
+    def to_dict(self):
+        return {'panel_id': self.panel_id,
+                'status': self.status,
+                'checkin_time': iso(self.checkin_time),
+                'msl_deadline': iso(self.msl_deadline),
+                'checkout_time': iso(self.checkout_time),
+                'yield': self.yield_pct}
+
+
+class Component:
+    """One PCBCHECKOUT component block. Supports comp['field'] like the dicts it replaces"""
+    __slots__ = ('module', 'stage', 'slot', 'part', 'reel', 'feeder',
+                 'pickups', 'errors', 'rejects', 'dislodged', 'nopickup')
+
+    def __init__(self, module, stage, slot, part, reel, feeder,
+                 pickups, errors, rejects, dislodged, nopickup):
+        self.module = intern(module)
+        self.stage = intern(stage)
+        self.slot = intern(slot)
+        self.part = intern(part)
+        self.reel = reel
+        self.feeder = intern(feeder)
+        self.pickups = int(pickups)
+        self.errors = int(errors)
+        self.rejects = int(rejects)
+        self.dislodged = int(dislodged)
+        self.nopickup = int(nopickup)
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class FeederConfig:
+    """Feeder position from a FEEDERLIST_ACK"""
+    __slots__ = ('feeder_type', 'part_numbers', 'references', 'quantity', 'last_updated')
+
+    def __init__(self, feeder_type, part_numbers, references, quantity, last_updated=None):
+        self.feeder_type = intern(feeder_type)
+        self.part_numbers = tuple(intern(p) for p in part_numbers)
+        self.references = tuple(references)
+        self.quantity = int(quantity)
+        self.last_updated = int(last_updated or time.time())
+
+    def to_dict(self):
+        return {'feeder_type': self.feeder_type,
+                'part_numbers': list(self.part_numbers),
+                'references': list(self.references),
+                'quantity': self.quantity,
+                'last_updated': iso(self.last_updated)}
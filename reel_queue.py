@@ -0,0 +1,127 @@
+import heapq
+import math
+import threading
+import time
+
+
+class ReelState:
+    """Reel currently feeding one slot"""
+    __slots__ = ('reel_id', 'part_no', 'qty', 'rate', 'last_seen', 'deadline', 'alerted')
+
+    def __init__(self, reel_id, part_no, qty, now):
+        self.reel_id = reel_id
+        self.part_no = part_no
+        self.qty = qty
+        # Parts per second, learnt from PCBCHECKOUT pickups
+        self.rate = None
+        self.last_seen = now
+        self.deadline = math.inf
+        self.alerted = False
+
+
+class ReelDepletionQueue:
+    """Min-heap of reels ordered by predicted depletion time.
+
+    Updates push a fresh heap entry and leave the previous one stale
+    (lazy deletion), so each event costs O(log n).
+    """
+
+    def __init__(self, lead_time=900, smoothing=0.3):
+        self._lock = threading.Lock()
+        self.lead_time = lead_time
+        self.smoothing = smoothing
+        self._reels = {}
+        self._heap = []
+        self._counter = 0
+
+    def __len__(self):
+        return len(self._reels)
+
+    def _schedule(self, key, reel, now):
+        if reel.rate:
+            reel.deadline = now + max(reel.qty, 0) / reel.rate
+        else:
+            reel.deadline = math.inf
+        if reel.deadline != math.inf:
+            # The counter breaks ties so reels themselves are never compared
+            self._counter += 1
+            heapq.heappush(self._heap, (reel.deadline, self._counter, key, reel))
+        # Drop stale entries once they outnumber the live ones
+        if len(self._heap) > 2 * len(self._reels) + 64:
+            self._heap = [entry for entry in self._heap
+                          if self._reels.get(entry[2]) is entry[3] and entry[3].deadline == entry[0]]
+            heapq.heapify(self._heap)
+
+    def load_reel(self, key, reel_id, part_no, qty, now=None):
+        """A new reel was set on the slot (PARTSREFILL)"""
+        now = now or time.time()
+        with self._lock:
+            previous = self._reels.get(key)
+            reel = ReelState(reel_id, part_no, qty, now)
+            if previous:
+                # Same slot, same consumption: keep the learnt rate
+                reel.rate = previous.rate
+            self._reels[key] = reel
+            self._schedule(key, reel, now)
+
+    def set_quantity(self, key, qty, now=None):
+        """Remaining quantity reported by the machine (e.g. ERRORREPORT)"""
+        now = now or time.time()
+        with self._lock:
+            reel = self._reels.get(key)
+            if reel is None:
+                return
+            reel.qty = qty
+            self._schedule(key, reel, now)
+
+    def consume(self, key, pickups, now=None):
+        """Pickups from a PCBCHECKOUT component block"""
+        now = now or time.time()
+        with self._lock:
+            reel = self._reels.get(key)
+            if reel is None:
+                return
+            elapsed = now - reel.last_seen
+            if elapsed > 0 and pickups > 0:
+                rate = pickups / elapsed
+                reel.rate = rate if reel.rate is None else (
+                    self.smoothing * rate + (1 - self.smoothing) * reel.rate)
+            reel.qty -= pickups
+            reel.last_seen = now
+            self._schedule(key, reel, now)
+
+    def unload(self, key):
+        """Reel removed from the slot (UNLOADCOMP)"""
+        with self._lock:
+            self._reels.pop(key, None)
+
+    def due(self, now=None):
+        """Reels entering the lead-time window that have not been alerted yet"""
+        now = now or time.time()
+        alerts = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now + self.lead_time:
+                deadline, _, key, reel = heapq.heappop(self._heap)
+                if self._reels.get(key) is not reel or reel.deadline != deadline or reel.alerted:
+                    continue
+                reel.alerted = True
+                alerts.append(self._describe(key, reel, now))
+        return alerts
+
+    def next(self, limit=10, now=None):
+        """The `limit` reels predicted to run out first"""
+        now = now or time.time()
+        with self._lock:
+            soonest = heapq.nsmallest(limit, self._reels.items(), key=lambda item: item[1].deadline)
+            return [self._describe(key, reel, now) for key, reel in soonest]
+
+    @staticmethod
+    def _describe(key, reel, now):
+        return {'module': key[0],
+                'stage': key[1],
+                'slot': key[2],
+                'reel_id': reel.reel_id,
+                'part_no': reel.part_no,
+                'qty': reel.qty,
+                'rate_per_min': round(reel.rate * 60, 2) if reel.rate else None,
+                'depletes_in': round(reel.deadline - now) if reel.deadline != math.inf else None}
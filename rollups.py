@@ -0,0 +1,388 @@
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, UniqueConstraint, delete
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import sessionmaker, scoped_session, declarative_base
+
+from machine_timeline import shift_start, MACHINE_STATES, SHIFT_HOURS
+
+backend_logger = logging.getLogger("backend_logger")
+
+BUCKET_KINDS = ('hour', 'shift')
+METRICS = ('panels', 'placements', 'pickup_errors', 'nopickups', 'error_reports', 'alarms', 'alarm_seconds')
+# Alarm and state intervals are looked up from this long before a bucket when it is recomputed
+MAX_INTERVAL = 86400
+
+RollupBase = declarative_base()
+
+
+class RollupMetric(RollupBase):
+    """Counters of one machine/module over one hour or shift. Machine level rows have module ''"""
+    __tablename__ = 'rollup_metrics'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String)
+    bucket_start = Column(DateTime)
+    machine = Column(String)
+    module = Column(String)
+    panels = Column(Integer, default=0)
+    placements = Column(Integer, default=0)
+    pickup_errors = Column(Integer, default=0)
+    nopickups = Column(Integer, default=0)
+    error_reports = Column(Integer, default=0)
+    alarms = Column(Integer, default=0)
+    alarm_seconds = Column(Float, default=0.0)
+    __table_args__ = (UniqueConstraint('kind', 'bucket_start', 'machine', 'module'),)
+
+
+class RollupState(RollupBase):
+    __tablename__ = 'rollup_states'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String)
+    bucket_start = Column(DateTime)
+    machine = Column(String)
+    module = Column(String)
+    state = Column(Integer)
+    seconds = Column(Float, default=0.0)
+    __table_args__ = (UniqueConstraint('kind', 'bucket_start', 'machine', 'module', 'state'),)
+
+
+class RollupCommand(RollupBase):
+    __tablename__ = 'rollup_commands'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String)
+    bucket_start = Column(DateTime)
+    command = Column(String)
+    count = Column(Integer, default=0)
+    __table_args__ = (UniqueConstraint('kind', 'bucket_start', 'command'),)
+
+
+def bucket_start(kind, when):
+    """Start (datetime) of the hour or shift holding epoch `when`"""
+    at = datetime.fromtimestamp(when)
+    if kind == 'hour':
+        return at.replace(minute=0, second=0, microsecond=0)
+    return shift_start(at)
+
+
+def bucket_end(kind, start):
+    if kind == 'hour':
+        return start + timedelta(hours=1)
+    for hour in SHIFT_HOURS:
+        boundary = start.replace(hour=hour)
+        if boundary > start:
+            return boundary
+    return start.replace(hour=SHIFT_HOURS[0]) + timedelta(days=1)
+
+
+def split_interval(kind, t1, t2):
+    """(bucket start, seconds) pieces of the interval [t1, t2)"""
+    pieces = []
+    while t1 < t2:
+        start = bucket_start(kind, t1)
+        end = min(bucket_end(kind, start).timestamp(), t2)
+        pieces.append((start, end - t1))
+        t1 = end
+    return pieces
+
+
+class _Accumulator:
+    """Pending increments, folded into the tables by one upsert per row"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.states = {}
+        self.commands = {}
+
+    def __bool__(self):
+        return bool(self.metrics or self.states or self.commands)
+
+    def metric(self, kind, start, machine, module, **counts):
+        entry = self.metrics.setdefault((kind, start, machine, module), dict.fromkeys(METRICS, 0))
+        for name, value in counts.items():
+            entry[name] += value
+
+    def state(self, kind, start, machine, module, state, seconds):
+        key = (kind, start, machine, module, state)
+        self.states[key] = self.states.get(key, 0.0) + seconds
+
+    def command(self, kind, start, command, count=1):
+        key = (kind, start, command)
+        self.commands[key] = self.commands.get(key, 0) + count
+
+    def merge(self, other):
+        for key, counts in other.metrics.items():
+            self.metric(*key, **counts)
+        for key, seconds in other.states.items():
+            self.state(*key, seconds)
+        for key, count in other.commands.items():
+            self.command(*key, count)
+
+    def drop_bucket(self, kind, start):
+        for table in (self.metrics, self.states, self.commands):
+            for key in [k for k in table if k[0] == kind and k[1] == start]:
+                del table[key]
+
+
+class RollupStore:
+    """Hourly and per-shift rollups, updated incrementally from live events.
+
+    Events add to in-memory increments that flush() folds into rollups.db
+    with upserts; recompute() rebuilds one bucket from the daily databases
+    and replaces its rows, so it can be repeated safely. While a bucket is
+    being rebuilt its new increments are held back and added afterwards.
+    """
+
+    def __init__(self, path="rollups.db", max_age=30.0):
+        self._lock = threading.Lock()
+        # Serializes flush() with recompute(), so no flush lands between a rebuild's read and replace
+        self._write_lock = threading.Lock()
+        # (kind, bucket start) -> [held increments, time before which commands come from the rebuild]
+        self._recomputing = {}
+        self.engine = create_engine(f'sqlite:///{path}')
+        RollupBase.metadata.create_all(self.engine)
+        self.Session = scoped_session(sessionmaker(bind=self.engine))
+        self.max_age = max_age
+        self._pending = _Accumulator()
+        self._first_at = None
+
+    def _touch(self):
+        if self._first_at is None:
+            self._first_at = time.monotonic()
+
+    def _into(self, kind, start):
+        """Accumulator for increments to one bucket: held back while it is recomputed"""
+        held = self._recomputing.get((kind, start))
+        return held[0] if held else self._pending
+
+    def add_panel(self, machine, components, when):
+        """One checked-out panel: a panel for the machine, placements and errors per module"""
+        with self._lock:
+            self._touch()
+            for kind in BUCKET_KINDS:
+                start = bucket_start(kind, when)
+                self._into(kind, start).metric(kind, start, machine, '', panels=1)
+                for comp in components:
+                    self._into(kind, start).metric(kind, start, machine, comp['module'],
+                                         placements=int(comp['pickups']),
+                                         pickup_errors=int(comp['errors']) + int(comp['rejects']) +
+                                         int(comp['dislodged']),
+                                         nopickups=int(comp['nopickup']))
+
+    def add_error_report(self, machine, module, when):
+        with self._lock:
+            self._touch()
+            for kind in BUCKET_KINDS:
+                start = bucket_start(kind, when)
+                self._into(kind, start).metric(kind, start, machine, module, error_reports=1)
+
+    def add_alarm(self, machine, module, start, end):
+        """A cleared alarm: counted in the bucket it started in, its duration split over buckets"""
+        with self._lock:
+            self._touch()
+            for kind in BUCKET_KINDS:
+                first = bucket_start(kind, start)
+                self._into(kind, first).metric(kind, first, machine, module, alarms=1)
+                for piece_start, seconds in split_interval(kind, start, end):
+                    self._into(kind, piece_start).metric(kind, piece_start, machine, module,
+                                                         alarm_seconds=seconds)
+
+    def add_state(self, machine, module, start, end, state):
+        with self._lock:
+            self._touch()
+            for kind in BUCKET_KINDS:
+                for piece_start, seconds in split_interval(kind, start, end):
+                    self._into(kind, piece_start).state(kind, piece_start, machine, module, state, seconds)
+
+    def add_command(self, command, when):
+        with self._lock:
+            self._touch()
+            for kind in BUCKET_KINDS:
+                start = bucket_start(kind, when)
+                held = self._recomputing.get((kind, start))
+                if held and held[1] is not None and when < held[1]:
+                    # Already counted by the rebuild from the stored frames
+                    continue
+                self._into(kind, start).command(kind, start, command)
+
+    def __len__(self):
+        return len(self._pending.metrics) + len(self._pending.states) + len(self._pending.commands)
+
+    def due(self):
+        return self._first_at is not None and time.monotonic() - self._first_at >= self.max_age
+
+    def flush_if_due(self):
+        if self.due():
+            self.flush()
+
+    def flush(self):
+        """Fold pending increments into the rollup tables"""
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, _Accumulator()
+                self._first_at = None
+            if not pending:
+                return 0
+            session = self.Session()
+            try:
+                written = self._write(session, pending)
+                session.commit()
+                return written
+            except Exception as e:
+                session.rollback()
+                backend_logger.error("Failed to write rollups: %s", str(e))
+                return 0
+            finally:
+                session.close()
+
+    def _write(self, session, pending):
+        for (kind, start, machine, module), counts in pending.metrics.items():
+            stmt = insert(RollupMetric).values(kind=kind, bucket_start=start, machine=machine,
+                                               module=module, **counts)
+            session.execute(stmt.on_conflict_do_update(
+                index_elements=['kind', 'bucket_start', 'machine', 'module'],
+                set_={name: getattr(RollupMetric, name) + stmt.excluded[name] for name in METRICS}))
+        for (kind, start, machine, module, state), seconds in pending.states.items():
+            stmt = insert(RollupState).values(kind=kind, bucket_start=start, machine=machine,
+                                              module=module, state=state, seconds=seconds)
+            session.execute(stmt.on_conflict_do_update(
+                index_elements=['kind', 'bucket_start', 'machine', 'module', 'state'],
+                set_={'seconds': RollupState.seconds + stmt.excluded.seconds}))
+        for (kind, start, command), count in pending.commands.items():
+            stmt = insert(RollupCommand).values(kind=kind, bucket_start=start, command=command, count=count)
+            session.execute(stmt.on_conflict_do_update(
+                index_elements=['kind', 'bucket_start', 'command'],
+                set_={'count': RollupCommand.count + stmt.excluded['count']}))
+        return len(pending.metrics) + len(pending.states) + len(pending.commands)
+
+    def recompute(self, kind, start, catalog, flush_sources=None, frames=None):
+        """Rebuild one bucket from the daily databases (through a DailyDbCatalog) and replace its rows.
+
+        Increments pending for the bucket are dropped, since the rebuild reads
+        their source rows; `flush_sources` must write those rows out and the
+        caller must keep them from being written until this returns. Command
+        counts come from `frames` (a FrameStore) when raw frames are stored
+        there rather than in production_logs.
+        """
+        start = bucket_start(kind, start.timestamp())
+        bucket = (kind, start)
+        with self._write_lock:
+            with self._lock:
+                self._pending.drop_bucket(kind, start)
+                # Frames are appended as they arrive, so those before now are read by the rebuild
+                cutoff = time.time() if frames is not None else None
+                self._recomputing[bucket] = [_Accumulator(), cutoff]
+            try:
+                if flush_sources:
+                    flush_sources()
+                fresh = self._rebuild(kind, start, catalog, frames, cutoff)
+                session = self.Session()
+                try:
+                    for model in (RollupMetric, RollupState, RollupCommand):
+                        session.execute(delete(model).where(model.kind == kind, model.bucket_start == start))
+                    written = self._write(session, fresh)
+                    session.commit()
+                except Exception as e:
+                    session.rollback()
+                    backend_logger.error("Failed to recompute %s rollup for %s: %s", kind, start.isoformat(), str(e))
+                    raise
+                finally:
+                    session.close()
+            finally:
+                with self._lock:
+                    held = self._recomputing.pop(bucket)[0]
+                    if held:
+                        self._touch()
+                        self._pending.merge(held)
+        backend_logger.info("Recomputed %s rollup for %s: %s rows", kind, start.isoformat(), written)
+        return written
+
+    def _rebuild(self, kind, start, catalog, frames, cutoff):
+        t1, t2 = start.timestamp(), bucket_end(kind, start).timestamp()
+        fresh = _Accumulator()
+        # The last microsecond of the bucket belongs to it; rows at t2 belong to the next one
+        last = t2 - 1e-6
+
+        panel_machine = {}
+        for row in catalog.query('panel_events', ['panel_id', 'machine'], t1, last, where="event = 'checkout'"):
+            panel_machine[row['panel_id']] = row['machine']
+            fresh.metric(kind, start, row['machine'], '', panels=1)
+        for row in catalog.query('panel_components', ['panel_id', 'module', 'pickups', 'errors', 'rejects',
+                                                      'dislodged', 'nopickup'], t1, last):
+            fresh.metric(kind, start, panel_machine.get(row['panel_id'], ''), row['module'],
+                         placements=row['pickups'] or 0,
+                         pickup_errors=(row['errors'] or 0) + (row['rejects'] or 0) + (row['dislodged'] or 0),
+                         nopickups=row['nopickup'] or 0)
+        for row in catalog.query('error_logs', ['module', 'details'], t1, last):
+            try:
+                machine = json.loads(row['details'] or '{}').get('machine', '')
+            except ValueError:
+                machine = ''
+            fresh.metric(kind, start, machine, row['module'], error_reports=1)
+        for row in catalog.query('alarm_intervals', ['machine', 'module', 'start_time', 'end_time'],
+                                 t1 - MAX_INTERVAL, last):
+            a1, a2 = _epoch(row['start_time']), _epoch(row['end_time'])
+            if t1 <= a1 < t2:
+                fresh.metric(kind, start, row['machine'], row['module'], alarms=1)
+            if min(a2, t2) > max(a1, t1):
+                fresh.metric(kind, start, row['machine'], row['module'], alarm_seconds=min(a2, t2) - max(a1, t1))
+        for row in catalog.query('machine_state_intervals', ['machine', 'module', 'state', 'start_time', 'end_time'],
+                                 t1 - MAX_INTERVAL, last):
+            s1, s2 = _epoch(row['start_time']), _epoch(row['end_time'])
+            if min(s2, t2) > max(s1, t1):
+                fresh.state(kind, start, row['machine'], row['module'], row['state'], min(s2, t2) - max(s1, t1))
+        if frames is not None:
+            for when, _, raw in frames.replay(t1, last):
+                if when < cutoff:
+                    fresh.command(kind, start, raw.split("\t", 1)[0])
+        else:
+            for row in catalog.query('production_logs', ['event_name'], t1, last):
+                fresh.command(kind, start, row['event_name'])
+        return fresh
+
+    def rows(self, kind, start, end, machine=None):
+        """Rollup rows of the buckets starting in [start, end): metrics, state seconds and command counts"""
+        self.flush()
+        b1, b2 = datetime.fromtimestamp(start), datetime.fromtimestamp(end)
+        session = self.Session()
+        try:
+            metrics = session.query(RollupMetric).filter(RollupMetric.kind == kind,
+                                                         RollupMetric.bucket_start >= b1,
+                                                         RollupMetric.bucket_start < b2)
+            states = session.query(RollupState).filter(RollupState.kind == kind,
+                                                       RollupState.bucket_start >= b1,
+                                                       RollupState.bucket_start < b2)
+            if machine is not None:
+                metrics = metrics.filter(RollupMetric.machine == machine)
+                states = states.filter(RollupState.machine == machine)
+            commands = session.query(RollupCommand).filter(RollupCommand.kind == kind,
+                                                           RollupCommand.bucket_start >= b1,
+                                                           RollupCommand.bucket_start < b2)
+            return {
+                'metrics': [{'bucket_start': r.bucket_start.isoformat(),
+                             'machine': r.machine,
+                             'module': r.module,
+                             **{name: getattr(r, name) for name in METRICS}}
+                            for r in metrics.order_by(RollupMetric.bucket_start)],
+                'states': [{'bucket_start': r.bucket_start.isoformat(),
+                            'machine': r.machine,
+                            'module': r.module,
+                            'state': MACHINE_STATES.get(r.state, 'Unknown'),
+                            'seconds': round(r.seconds, 1)}
+                           for r in states.order_by(RollupState.bucket_start)],
+                'commands': [{'bucket_start': r.bucket_start.isoformat(),
+                              'command': r.command,
+                              'count': r.count}
+                             for r in commands.order_by(RollupCommand.bucket_start)],
+            }
+        finally:
+            session.close()
+
+
+def _epoch(value):
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return datetime.fromisoformat(value).timestamp()
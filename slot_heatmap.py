@@ -0,0 +1,176 @@
+import threading
+import time
+
+import numpy as np
+
+# PCBCHECKOUT component counters
+SLOT_COUNTERS = ('pickups', 'errors', 'rejects', 'dislodged', 'nopickup')
+# HEADUSAGE head counters
+HEAD_COUNTERS = ('pickup_count', 'error_head', 'error_reject', 'reject_head',
+                 'dislodged_head', 'rescan_count', 'no_pickup')
+
+
+class _LocationIndex:
+    """Dense column numbers for sparse keys such as (module, stage, slot)"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.columns = {}
+        self.keys = []
+
+    def column(self, key):
+        col = self.columns.get(key)
+        if col is None:
+            if len(self.keys) >= self.capacity:
+                return None
+            col = self.columns[key] = len(self.keys)
+            self.keys.append(key)
+        return col
+
+
+class _BucketedCounters:
+    """Ring of time buckets x locations x counters, preallocated once"""
+
+    def __init__(self, buckets, bucket_seconds, locations, counters):
+        self.bucket_seconds = bucket_seconds
+        self.counts = np.zeros((buckets, locations, counters), dtype=np.int32)
+        # Bucket number held by each ring slot, -1 when empty
+        self.bucket_ids = np.full(buckets, -1, dtype=np.int64)
+
+    def add(self, when, column, values):
+        bucket_id = int(when // self.bucket_seconds)
+        ring = bucket_id % len(self.bucket_ids)
+        if self.bucket_ids[ring] != bucket_id:
+            if bucket_id < self.bucket_ids[ring]:
+                # Older than anything the ring still holds
+                return
+            self.counts[ring] = 0
+            self.bucket_ids[ring] = bucket_id
+        self.counts[ring, column] += values
+
+    def mask(self, t1, t2):
+        first, last = int(t1 // self.bucket_seconds), int(t2 // self.bucket_seconds)
+        return (self.bucket_ids >= first) & (self.bucket_ids <= last)
+
+    def total(self, t1, t2, used):
+        return self.counts[self.mask(t1, t2), :used].sum(axis=0, dtype=np.int64)
+
+
+def _error_rate(totals, fail_cols, pickup_col=0):
+    pickups = totals[..., pickup_col].astype(np.float64)
+    failed = totals[..., fail_cols].sum(axis=-1).astype(np.float64)
+    rate = np.full(pickups.shape, np.nan)
+    np.divide(failed, pickups, out=rate, where=pickups > 0)
+    return rate
+
+
+def _robust_z(rate):
+    """z-score of each rate against the line median (MAD scaled, std fallback)"""
+    valid = ~np.isnan(rate)
+    z = np.full(rate.shape, np.nan)
+    if not valid.any():
+        return z, None
+    median = float(np.median(rate[valid]))
+    spread = 1.4826 * float(np.median(np.abs(rate[valid] - median)))
+    if spread == 0:
+        spread = float(rate[valid].std())
+    if spread > 0:
+        z[valid] = (rate[valid] - median) / spread
+    else:
+        z[valid] = 0.0
+    return z, median
+
+
+def _clean(values, digits=4):
+    return [None if np.isnan(v) else round(float(v), digits) for v in values]
+
+
+class SlotHeatmap:
+    """Per-slot and per-head pickup counters in preallocated NumPy arrays,
+    bucketed by hour for a week by default"""
+
+    def __init__(self, buckets=168, bucket_seconds=3600, max_slots=4096, max_heads=256):
+        self._lock = threading.Lock()
+        self.slots = _LocationIndex(max_slots)
+        self.heads = _LocationIndex(max_heads)
+        self.slot_counts = _BucketedCounters(buckets, bucket_seconds, max_slots, len(SLOT_COUNTERS))
+        self.head_counts = _BucketedCounters(buckets, bucket_seconds, max_heads, len(HEAD_COUNTERS))
+
+    def add_components(self, components, when=None):
+        """PCBCHECKOUT component blocks"""
+        when = when or time.time()
+        with self._lock:
+            for comp in components:
+                col = self.slots.column((int(comp['module']), int(comp['stage']), int(comp['slot'])))
+                if col is None:
+                    continue
+                self.slot_counts.add(when, col, [int(comp[name]) for name in SLOT_COUNTERS])
+
+    def add_heads(self, module, heads, when=None):
+        """HEADUSAGE head blocks"""
+        when = when or time.time()
+        with self._lock:
+            for head in heads:
+                col = self.heads.column((int(module), int(head['head_no'])))
+                if col is None:
+                    continue
+                self.head_counts.add(when, col, [int(head[name]) for name in HEAD_COUNTERS])
+
+    def heatmap(self, t1, t2):
+        """Error rates and z-scores per slot and per head between t1 and t2"""
+        with self._lock:
+            slot_keys = list(self.slots.keys)
+            head_keys = list(self.heads.keys)
+            slot_totals = self.slot_counts.total(t1, t2, len(slot_keys))
+            head_totals = self.head_counts.total(t1, t2, len(head_keys))
+
+        # errors + rejects + dislodged, as in the panel yield
+        slot_rate = _error_rate(slot_totals, [1, 2, 3])
+        slot_z, slot_median = _robust_z(slot_rate)
+        # ErrorHead already sums the individual error counters
+        head_rate = _error_rate(head_totals, [1])
+        head_z, head_median = _robust_z(head_rate)
+
+        modules = {}
+        for i, (module, stage, slot) in enumerate(slot_keys):
+            stages = modules.setdefault(module, {})
+            row = stages.setdefault(stage, {'slots': [], 'pickups': [], 'error_rate': [], 'z': []})
+            row['slots'].append(slot)
+            row['pickups'].append(int(slot_totals[i, 0]))
+            row['error_rate'].append(slot_rate[i])
+            row['z'].append(slot_z[i])
+        for stages in modules.values():
+            for row in stages.values():
+                # Present each stage as a slot-ordered row
+                order = np.argsort(row['slots'])
+                row['slots'] = [row['slots'][j] for j in order]
+                row['pickups'] = [row['pickups'][j] for j in order]
+                row['error_rate'] = _clean(np.asarray(row['error_rate'])[order])
+                row['z'] = _clean(np.asarray(row['z'])[order], 2)
+
+        return {
+            'line_median_error_rate': slot_median,
+            'modules': {str(m): {str(s): row for s, row in stages.items()} for m, stages in modules.items()},
+            'heads': {
+                'line_median_error_rate': head_median,
+                'keys': [{'module': m, 'head_no': h} for m, h in head_keys],
+                'pickups': head_totals[:, 0].tolist() if len(head_keys) else [],
+                'error_rate': _clean(head_rate),
+                'z': _clean(head_z, 2)
+            }
+        }
+
+    def trend(self, t1, t2):
+        """Line-wide pickups and error rate per time bucket"""
+        with self._lock:
+            mask = self.slot_counts.mask(t1, t2)
+            bucket_ids = self.slot_counts.bucket_ids[mask]
+            per_bucket = self.slot_counts.counts[mask].sum(axis=1, dtype=np.int64)
+        rate = _error_rate(per_bucket, [1, 2, 3])
+        order = np.argsort(bucket_ids)
+        seconds = self.slot_counts.bucket_seconds
+        return [{'start': int(bucket_ids[i] * seconds),
+                 'pickups': int(per_bucket[i, 0]),
+                 'errors': int(per_bucket[i, 1:4].sum()),
+                 'error_rate': None if np.isnan(rate[i]) else round(float(rate[i]), 4)}
+                for i in order]
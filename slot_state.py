@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import deque
+
+
+class SlotRecord:
+    """Current state of one feeder slot"""
+    __slots__ = ('module', 'stage', 'slot', 'feeder_id', 'part_no', 'reel_id',
+                 'qty', 'remaining_time', 'status', 'sub_status', 'error',
+                 'event', 'updated', 'version')
+
+    def __init__(self, module, stage, slot):
+        self.module = module
+        self.stage = stage
+        self.slot = slot
+        self.feeder_id = None
+        self.part_no = None
+        self.reel_id = None
+        self.qty = None
+        self.remaining_time = None
+        self.status = None
+        self.sub_status = None
+        self.error = None
+        self.event = None
+        self.updated = 0
+        self.version = 0
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class SlotStateStore:
+    """Slot-indexed feeder state updated by per-event deltas.
+
+    Every update bumps a global version and stamps it on the slot, so
+    clients can ask for the slots that changed since the version they hold.
+    """
+
+    def __init__(self, changelog_size=10000):
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._changelog = deque(maxlen=changelog_size)
+        self.version = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def apply(self, module, stage, slot, **fields):
+        """Update one slot in place. Returns the new store version"""
+        key = (int(module), int(stage), int(slot))
+        with self._lock:
+            record = self._slots.get(key)
+            if record is None:
+                record = self._slots[key] = SlotRecord(*key)
+            for name, value in fields.items():
+                setattr(record, name, value)
+            self.version += 1
+            record.version = self.version
+            record.updated = int(time.time())
+            self._changelog.append((self.version, key))
+            return self.version
+
+    def clear_module(self, module):
+        """Forget every slot of a module, e.g. before a full FEEDERLIST reload"""
+        module = int(module)
+        with self._lock:
+            stale = [key for key in self._slots if key[0] == module]
+            for key in stale:
+                del self._slots[key]
+            if stale:
+                self.version += 1
+                self._changelog.clear()
+            return self.version
+
+    def merge_plan(self, module, planned, event="FEEDERLIST"):
+        """Merge a module's planned layout, {(stage, slot): (part_no, qty)}, into its slots.
+
+        Live fields (feeder, reel, status, error) are left alone; the planned
+        part and quantity only fill slots that have no reel loaded. Slots
+        missing from the plan are dropped only when nothing is on them.
+        """
+        module = int(module)
+        planned = {(int(stage), int(slot)): plan for (stage, slot), plan in planned.items()}
+        with self._lock:
+            empty = [key for key, record in self._slots.items()
+                     if key[0] == module and key[1:] not in planned and record.feeder_id is None and
+                     record.reel_id is None and record.status is None and record.error is None]
+            for key in empty:
+                del self._slots[key]
+            if empty:
+                # Like clear_module: removals are not in the changelog, so clients resync
+                self.version += 1
+                self._changelog.clear()
+            for (stage, slot), (part_no, qty) in planned.items():
+                key = (module, stage, slot)
+                record = self._slots.get(key)
+                if record is None:
+                    record = self._slots[key] = SlotRecord(*key)
+                elif record.reel_id is not None:
+                    continue
+                record.part_no = part_no
+                record.qty = qty
+                record.event = event
+                self.version += 1
+                record.version = self.version
+                record.updated = int(time.time())
+                self._changelog.append((self.version, key))
+            return self.version
+
+    def get(self, module, stage, slot):
+        with self._lock:
+            record = self._slots.get((int(module), int(stage), int(slot)))
+            return record.to_dict() if record else None
+
+    def snapshot(self):
+        with self._lock:
+            return {'version': self.version,
+                    'full': True,
+                    'slots': [record.to_dict() for record in self._slots.values()]}
+
+    def diff_since(self, version):
+        """Slots changed after `version`, or a full snapshot when it is too old"""
+        with self._lock:
+            if version >= self.version:
+                return {'version': self.version, 'full': False, 'slots': []}
+            if not self._changelog or self._changelog[0][0] > version + 1:
+                # The changelog no longer covers the gap
+                return {'version': self.version,
+                        'full': True,
+                        'slots': [record.to_dict() for record in self._slots.values()]}
+            changed = {}
+            for entry_version, key in reversed(self._changelog):
+                if entry_version <= version:
+                    break
+                if key not in changed and key in self._slots:
+                    changed[key] = self._slots[key].to_dict()
+            return {'version': self.version, 'full': False, 'slots': list(changed.values())}
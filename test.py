@@ -11,6 +11,26 @@ from sqlalchemy.orm import sessionmaker,scoped_session,declarative_base
 import sqlalchemy as sa
 from collections import deque
 import os
+from concurrent.futures import Future
+from pending_requests import SequenceAllocator, PendingRequests
+from feeder_cache import FeederListCache
+from slot_state import SlotStateStore
+from machine_timeline import MachineStateTimeline
+from alarm_index import AlarmIndex
+from batch_writer import BatchWriter
+from production_stats import PanelStatsAggregator
+from slot_heatmap import SlotHeatmap
+from cycle_time import CycleTimeSketches
+from reel_queue import ReelDepletionQueue
+from panel_timers import TimerWheel
+from traceability import TraceStore
+from feeder_verifier import FeederVerifier, VERIFY_OK
+from bom_store import BomStore
+from error_index import ErrorIndex
+from frame_store import FrameStore
+from rollups import RollupStore
+from records import MessageLog, PanelRecord, Component, FeederConfig, intern, iso
+from log_pipeline import setup_backend_logging, setup_console
 
 # Constants
 
@@ -25,9 +45,44 @@ EVENT_NAMES = [
 LINE_NAME = "LINE1"
 MACHINE = "NXT1"
 MODULE_NO = "1"
+FEEDER_GROUP = "PAM"
+# Warn this many seconds before a reel is predicted to run out
+REEL_ALERT_LEAD_TIME = 15 * 60
+# Warn this many seconds before a panel reaches its MSL floor life limit
+MSL_WARNING_LEAD_TIME = 30 * 60
+# Panels without a PCBCHECKOUT after this many seconds are evicted
+PANEL_TTL = 8 * 3600
+PANEL_TIMERS = ('msl_warning', 'msl_expired', 'stale')
+# Traceability spans days, so it lives outside the daily databases
+TRACE_DB = "traceability.db"
+# Hourly and per-shift rollups span days too
+ROLLUP_DB = "rollups.db"
+# Every Nth KEEPALIVE goes through the full pipeline (log, message_log, DB); 0 = never
+KEEPALIVE_SAMPLE_EVERY = 0
+KEEPALIVE_FRAME = b"\x02KEEPALIVE\t"
+KEEPALIVE_ACK_PREFIX = b"\x02KEEPALIVE_ACK\t"
+# ERRORREPORT statuses that stop a slot: parts out, feeder type check, processing error
+CRITICAL_ERROR_CODES = ('5', '10', '998')
+# Where log_production_event stores raw frames: "sqlite" (production_logs rows) or
+# "segments" (append-only frame segments under FRAME_DIR)
+PRODUCTION_LOG_BACKEND = "sqlite"
+FRAME_DIR = "frames"
+# How often the flush thread writes batches that are due, in seconds
+FLUSH_INTERVAL = 1.0
+# How often timers, reel alerts, request timeouts and the day rollover are checked, in seconds
+HOUSEKEEPING_INTERVAL = 1.0
 
 Base = declarative_base()
 
+
+def _int_or_none(value):
+    """Integer field of a frame; None for blanks and 'Null'"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
 class ProductionLog(Base):
     __tablename__ = 'production_logs'
     id = Column(Integer, primary_key=True)
@@ -36,32 +91,214 @@ class ProductionLog(Base):
     event_name  = Column(String)
     Data = Column(String)
 
+class MachineStateInterval(Base):
+    __tablename__ = 'machine_state_intervals'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    machine = Column(String)
+    module = Column(String)
+    state = Column(Integer)
+    start_time = Column(DateTime, index=True)
+    end_time = Column(DateTime)
+
+class AlarmInterval(Base):
+    __tablename__ = 'alarm_intervals'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    machine = Column(String)
+    module = Column(String)
+    error_code = Column(String, index=True)
+    sub_error_code = Column(String)
+    start_time = Column(DateTime, index=True)
+    end_time = Column(DateTime)
+    duration = Column(sa.Float)
+
+class CycleTimeSketch(Base):
+    __tablename__ = 'cycle_time_sketches'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    bucket_start = Column(DateTime, index=True)
+    line = Column(String)
+    machine = Column(String)
+    module = Column(String)
+    program = Column(String)
+    count = Column(Integer)
+    sketch = Column(JSON)
+
+class PanelExpiry(Base):
+    __tablename__ = 'panel_expiries'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    panel_id = Column(String, index=True)
+    reason = Column(String)
+    checkin_time = Column(DateTime)
+    msl_deadline = Column(DateTime)
+    event_time = Column(DateTime)
+
+class PanelEvent(Base):
+    __tablename__ = 'panel_events'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    panel_id = Column(String, index=True)
+    event = Column(String)
+    time = Column(DateTime, index=True)
+    line = Column(String)
+    machine = Column(String)
+    lane = Column(String)
+    program = Column(String, index=True)
+    msl_minutes = Column(Integer)
+    status = Column(String)
+    components = Column(Integer)
+
+class PanelComponent(Base):
+    __tablename__ = 'panel_components'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    panel_id = Column(String, index=True)
+    time = Column(DateTime)
+    program = Column(String)
+    module = Column(String)
+    stage = Column(String)
+    slot = Column(String)
+    part = Column(String)
+    reel = Column(String)
+    feeder = Column(String)
+    pickups = Column(Integer)
+    errors = Column(Integer)
+    rejects = Column(Integer)
+    dislodged = Column(Integer)
+    nopickup = Column(Integer)
+    __table_args__ = (
+        sa.Index('ix_panel_components_part_time', 'part', 'time'),
+        sa.Index('ix_panel_components_slot_time', 'module', 'stage', 'slot', 'time'),
+    )
+
+class RefillEvent(Base):
+    __tablename__ = 'refill_events'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    time = Column(DateTime, index=True)
+    machine = Column(String)
+    module = Column(String)
+    stage = Column(String)
+    slot = Column(String)
+    feeder_id = Column(String)
+    reel_id = Column(String, index=True)
+    part_no = Column(String, index=True)
+    vendor = Column(String)
+    lot = Column(String)
+    datecode = Column(String)
+    qty = Column(Integer)
+    result = Column(Integer)
+
+class UnloadEvent(Base):
+    __tablename__ = 'unload_events'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    time = Column(DateTime, index=True)
+    machine = Column(String)
+    module = Column(String)
+    stage = Column(String)
+    slot = Column(String)
+    part_no = Column(String)
+    feeder_id = Column(String)
+    reel_id = Column(String, index=True)
+    quantity = Column(Integer)
+    remaining_time = Column(Integer)
+
+class BomItem(Base):
+    __tablename__ = 'bom_items'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    program = Column(String)
+    version = Column(Integer)
+    received = Column(DateTime)
+    block = Column(String)
+    part = Column(String, index=True)
+    reference = Column(String)
+    __table_args__ = (sa.Index('ix_bom_items_program_version', 'program', 'version'),)
+
+class CycleTime(Base):
+    __tablename__ = 'cycle_times'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    time = Column(DateTime, index=True)
+    line = Column(String)
+    machine = Column(String)
+    module = Column(String)
+    lane = Column(String)
+    program = Column(String, index=True)
+    panel = Column(String)
+    blocks = Column(Integer)
+    skips = Column(Integer)
+    cycle_time = Column(sa.Float)
+
 class ErrorLog(Base):
     __tablename__ = 'error_logs'
     id = Column(Integer, primary_key=True,autoincrement=True)
-    timestamp = Column(DateTime)
-    error_code = Column(String)
+    timestamp = Column(DateTime, index=True)
+    error_code = Column(String, index=True)
     module = Column(String)
     details = Column(JSON)
 
-# Initialize Backend Logger
+# Initialize Backend Logger (written by a queue listener thread)
 backend_logger = logging.getLogger("backend_logger")
 backend_logger.setLevel(logging.INFO)
 backend_logger.propagate = False  # Ensure no propagation
-# Add handler only if none exist
-if len(backend_logger.handlers) == 0:
-    backend_handler = logging.FileHandler("fuji_interface.log")
-    backend_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-    backend_logger.addHandler(backend_handler)
+setup_backend_logging(backend_logger, "fuji_interface.log")
+# Categories with their own levels
+frame_logger = logging.getLogger("backend_logger.frames")
+keepalive_logger = logging.getLogger("backend_logger.keepalive")
+event_logger = logging.getLogger("backend_logger.events")
+# stdout echo, replaces print()
+console = logging.getLogger("fuji_console")
+setup_console(console)
 
 
 
 class FujiHostInterface:
     def __init__(self):
         self.sock = None
-        self.seq_id = 0
+        self.seq = SequenceAllocator()
+        self.pending_requests = PendingRequests()
+        self.feeder_cache = FeederListCache()
+        self.slot_state = SlotStateStore()
+        self.state_timeline = MachineStateTimeline()
+        self.alarm_index = AlarmIndex()
+        self.panel_stats = PanelStatsAggregator()
+        self.heatmap = SlotHeatmap()
+        self.cycle_times = CycleTimeSketches()
+        self.reel_queue = ReelDepletionQueue(lead_time=REEL_ALERT_LEAD_TIME)
+        self.reel_alerts = deque(maxlen=500)
+        self.reel_alert_id = 0
+        # Alerts are raised by the housekeeping thread and right after receive-path updates
+        self._reel_alert_lock = threading.Lock()
+        self.panel_timers = TimerWheel()
+        self.alarm_writer = BatchWriter(lambda: self.Session(), AlarmInterval, max_rows=50, max_age=30.0)
+        self.state_writer = BatchWriter(lambda: self.Session(), MachineStateInterval, max_rows=50, max_age=30.0)
+        self.trace = TraceStore(TRACE_DB)
+        self.verifier = FeederVerifier()
+        self.bom_store = BomStore()
+        self.error_index = ErrorIndex()
+        self.critical_errors = deque(maxlen=200)
+        self.critical_error_id = 0
+        self.error_writer = BatchWriter(lambda: self.Session(), ErrorLog, max_rows=100, max_age=10.0)
+        # Parsed events, written next to the raw log so reports can query them in SQL
+        self.panel_writer = BatchWriter(lambda: self.Session(), PanelEvent, max_rows=100, max_age=10.0)
+        self.component_writer = BatchWriter(lambda: self.Session(), PanelComponent, max_rows=1000, max_age=10.0)
+        self.refill_writer = BatchWriter(lambda: self.Session(), RefillEvent, max_rows=50, max_age=10.0)
+        self.unload_writer = BatchWriter(lambda: self.Session(), UnloadEvent, max_rows=50, max_age=10.0)
+        self.bom_writer = BatchWriter(lambda: self.Session(), BomItem, max_rows=1000, max_age=5.0)
+        self.cycle_writer = BatchWriter(lambda: self.Session(), CycleTime, max_rows=100, max_age=10.0)
+        # Raw frames, one row per frame sent or received
+        self.production_writer = BatchWriter(lambda: self.Session(), ProductionLog, max_rows=200, max_age=2.0)
+        self.rollups = RollupStore(ROLLUP_DB)
+        self.batch_writers = [self.alarm_writer, self.state_writer, self.error_writer,
+                              self.trace.writer, self.panel_writer, self.component_writer, self.refill_writer,
+                              self.unload_writer, self.bom_writer, self.cycle_writer,
+                              self.production_writer, self.rollups]
+        # Batches are written by the flush thread; the receive loop only adds rows
+        self._flush_wakeup = threading.Event()
+        self._flush_lock = threading.RLock()
+        for writer in self.batch_writers:
+            if isinstance(writer, BatchWriter):
+                writer.on_full = self._flush_wakeup.set
+        threading.Thread(target=self._flush_loop, daemon=True, name="batch_flush").start()
+        self.frame_store = FrameStore(FRAME_DIR) if PRODUCTION_LOG_BACKEND == "segments" else None
         self.connected = False
         self.lock = threading.Lock()
+        self.keepalive_count = 0
+        self.last_keepalive = None
         self.HOST = '192.168.100.231'  # Central Server Lite IP
         self.PORT = 30040
         self.HOSTNAME = None
@@ -69,31 +306,37 @@ class FujiHostInterface:
         # Initialize production state with proper structure
         self.production_state = {
             'current_program': None,
+            # Program each module last reported in PGCHANGEII
+            'module_programs': {},
             'active_panels': {},
             'feeder_config': {},
-            'error_log': [],
-            'bom_data': {},
-            'slot_status': {},
+            'error_log': self.error_index,
+            'bom_data': self.bom_store,
+            'slot_status': self.slot_state,
             'production_history': [],
-            'message_log' : []
+            'message_log': MessageLog(10000)
 
         }
 
         self.current_db_day = datetime.now().day
+        self.current_db_date = datetime.now().date()
         self.engine = None
         self.Session = None
         self._init_daily_db()
+        self._load_state_timeline()
+        self._load_cycle_time_sketches()
+        threading.Thread(target=self._housekeeping_loop, daemon=True, name="housekeeping").start()
 
     def _init_daily_db(self):
         """Initialize database connection for the day"""
         self.engine = self._get_daily_engine()
         db_file = f"production_{datetime.now().strftime('%Y%m%d')}.db"
         if not os.path.exists(db_file):
-            backend_logger.error(f"Database file {db_file} not created!")
+            backend_logger.error("Database file %s not created!", db_file)
 
         self.Session = scoped_session(sessionmaker(bind=self.engine))
         Base.metadata.create_all(self.engine)
-        backend_logger.info(f"Initialized daily database: production_{datetime.now().strftime('%Y%m%d')}.db")
+        backend_logger.info("Initialized daily database: production_%s.db", datetime.now().strftime('%Y%m%d'))
 
     def _get_daily_engine(self):
         """Instance method to create daily database engine"""
@@ -104,8 +347,67 @@ class FujiHostInterface:
     def _check_daily_rotation(self):   
         if datetime.now().day != self.current_db_day:
             backend_logger.info("Rotating to new daily database")
+            # Pending rows belong to the day that is ending
+            self._flush_batches(force=True)
+            self._persist_cycle_time_sketches(self.current_db_date)
             self._init_daily_db()
             self.current_db_day = datetime.now().day
+            self.current_db_date = datetime.now().date()
+            # Keep one week of state intervals in memory
+            self.state_timeline.trim(time.time() - 7 * 86400)
+            self.cycle_times.prune()
+
+    def _load_cycle_time_sketches(self):
+        """Merge back the cycle time sketches persisted today"""
+        session = self.Session()
+        try:
+            for row in session.query(CycleTimeSketch).all():
+                self.cycle_times.load(row.bucket_start.timestamp(), row.line, row.machine,
+                                      row.module, row.program, row.sketch)
+        except Exception as e:
+            backend_logger.error("Failed to load cycle time sketches: %s", str(e))
+        finally:
+            session.close()
+
+    def _persist_cycle_time_sketches(self, day):
+        """Write the sketches of one day to the current daily database, replacing earlier copies"""
+        start = datetime.combine(day, datetime.min.time())
+        rows = self.cycle_times.export(start.timestamp(), start.timestamp() + 86400)
+        if not rows:
+            return
+        session = self.Session()
+        try:
+            session.query(CycleTimeSketch).delete()
+            session.add_all([CycleTimeSketch(bucket_start=datetime.fromtimestamp(r['bucket']),
+                                             line=r['line'],
+                                             machine=r['machine'],
+                                             module=r['module'],
+                                             program=r['program'],
+                                             count=r['count'],
+                                             sketch=r['sketch'])
+                             for r in rows])
+            session.commit()
+            backend_logger.info("Persisted %s cycle time sketches", len(rows))
+        except Exception as e:
+            session.rollback()
+            backend_logger.error("Failed to persist cycle time sketches: %s", str(e))
+        finally:
+            session.close()
+
+    def _load_state_timeline(self):
+        """Restore today's machine state intervals from the daily database"""
+        session = self.Session()
+        try:
+            rows = session.query(MachineStateInterval).order_by(MachineStateInterval.start_time).all()
+            for row in rows:
+                self.state_timeline.load(row.machine, row.module, row.start_time.timestamp(),
+                                         row.end_time.timestamp(), row.state)
+            if rows:
+                backend_logger.info("Restored %s machine state intervals", len(rows))
+        except Exception as e:
+            backend_logger.error("Failed to load machine state intervals: %s", str(e))
+        finally:
+            session.close()
             
 
     def resolve_hostname(self):
@@ -113,31 +415,109 @@ class FujiHostInterface:
         try:
             self.HOSTNAME = socket.gethostbyaddr(self.HOST)[0]
         except (socket.herror, socket.gaierror) as e:
-            backend_logger.warning(f"Could not resolve hostname: {str(e)}")
+            backend_logger.warning("Could not resolve hostname: %s", str(e))
             self.HOSTNAME = self.HOST  # Fallback to IP
 
     def log_production_event(self, seq_id, event_type, event_name, raw_message):
+        when = time.time()
+        if self.frame_store is not None:
+            # Stored before it is counted, with the same time, so a rollup rebuild counts it once
+            try:
+                self.frame_store.append(event_type, raw_message, when)
+            except Exception as e:
+                backend_logger.error("Failed to store frame: %s", str(e))
+            self.rollups.add_command(event_name, when)
+            return
+        self.rollups.add_command(event_name, when)
+        self.production_writer.add(timestamp=datetime.now(),
+                                   event_type=event_type,
+                                   event_name=event_name,
+                                   Data=raw_message)
+
+    def frame_history(self, start=None, end=None, command=None, seq_id=None, limit=1000):
+        """Logged frames between start and end (epoch seconds), from whichever backend stores them"""
+        if self.frame_store is not None:
+            return self.frame_store.history(start, end, command, seq_id, limit)
         session = self.Session()
         try:
-            log = ProductionLog(
-                timestamp=datetime.now(),
-                event_type=event_type,
-                event_name=event_name,
-                Data=raw_message)
-            session.add(log)
+            query = session.query(ProductionLog)
+            if start is not None:
+                query = query.filter(ProductionLog.timestamp >= datetime.fromtimestamp(start))
+            if end is not None:
+                query = query.filter(ProductionLog.timestamp <= datetime.fromtimestamp(end))
+            if command is not None:
+                query = query.filter(ProductionLog.event_name == command)
+            rows = []
+            for row in query.order_by(ProductionLog.id).limit(limit if seq_id is None else None):
+                parts = row.Data.split("\t", 2)
+                if seq_id is not None and (len(parts) < 2 or parts[1] != seq_id):
+                    continue
+                rows.append({'timestamp': row.timestamp.isoformat(),
+                             'event_type': row.event_type,
+                             'event_name': row.event_name,
+                             'seq_id': parts[1] if len(parts) > 1 else None,
+                             'data': row.Data})
+                if len(rows) >= limit:
+                    break
+            return rows
+        finally:
+            session.close()
+
+    def log_state_interval(self, machine, module, start, end, state):
+        self.state_writer.add(machine=machine,
+                              module=module,
+                              state=state,
+                              start_time=datetime.fromtimestamp(start),
+                              end_time=datetime.fromtimestamp(end))
+
+    def log_panel_expiry(self, panel_id, panel, reason):
+        session = self.Session()
+        try:
+            session.add(PanelExpiry(
+                panel_id=panel_id,
+                reason=reason,
+                checkin_time=datetime.fromtimestamp(panel.checkin_time),
+                msl_deadline=datetime.fromtimestamp(panel.msl_deadline),
+                event_time=datetime.now()))
             session.commit()
         except Exception as e:
             session.rollback()
-            backend_logger.error(f"Failed to log in DB event: {str(e)}")
+            backend_logger.error("Failed to log panel expiry: %s", str(e))
         finally:
             session.close()
 
+    def _flush_batches(self, force=False):
+        """Write buffered rows that are due (or all of them when forced)"""
+        with self._flush_lock:
+            for writer in self.batch_writers:
+                if force:
+                    writer.flush()
+                else:
+                    writer.flush_if_due()
+
+    def recompute_rollup(self, kind, start, catalog):
+        """Rebuild one rollup bucket with batch flushing paused, so its source rows are read exactly once"""
+        with self._flush_lock:
+            return self.rollups.recompute(
+                kind, start, catalog,
+                flush_sources=lambda: [writer.flush() for writer in self.batch_writers if writer is not self.rollups],
+                frames=self.frame_store)
+
+    def _flush_loop(self):
+        """Flush thread: writes due batches every FLUSH_INTERVAL, or as soon as one fills"""
+        while True:
+            self._flush_wakeup.wait(FLUSH_INTERVAL)
+            self._flush_wakeup.clear()
+            try:
+                self._flush_batches()
+            except Exception as e:
+                backend_logger.error("Batch flush error: %s", str(e))
 
-    def log_error_event(self, error_code: str, module: str, details: dict):
+    def log_error_event(self, error_code: str, module: str, details: dict, timestamp=None):
         session = self.Session()
         try:
             log = ErrorLog(
-                timestamp=datetime.now(),
+                timestamp=timestamp or datetime.now(),
                 error_code=error_code,
                 module=module,
                 details=details
@@ -145,7 +525,7 @@ class FujiHostInterface:
             session.add(log)
             session.commit()
         except Exception as e:
-            backend_logger.error(f"Failed to log error: {str(e)}")
+            backend_logger.error("Failed to log error: %s", str(e))
         finally:
             session.close()
 
@@ -162,6 +542,21 @@ class FujiHostInterface:
             raise ValueError(f"Invalid time format: {timestr}")
         return datetime.strptime(timestr, "%Y%m%d%H%M%S")
 
+    def _parse_used_pg(self, parts, index):
+        """Parse a <UsedPG> block: stage, slot and a variable-length part list per slot"""
+        slots = []
+        num_slots = int(parts[index])
+        index += 1
+        for _ in range(num_slots):
+            num_parts = int(parts[index+2])
+            slots.append({
+                'stage': parts[index],
+                'slot': parts[index+1],
+                'parts': parts[index+3 : index+3+num_parts]
+            })
+            index += 3 + num_parts
+        return slots
+
     def _parse_components(self, parts, fields_per_item, field_names):
         components = []
         for i in range(0, len(parts), fields_per_item):
@@ -189,8 +584,8 @@ class FujiHostInterface:
             self.sock.connect((self.HOST, self.PORT))
             self.connected = True
             self.resolve_hostname()  # Resolve hostname on connect
-            backend_logger.info(f"Connected to {self.HOSTNAME}==>{self.HOST}:{self.PORT}")
-            print(f"Connected to {self.HOST}:{self.PORT}")
+            backend_logger.info("Connected to %s==>%s:%s", self.HOSTNAME, self.HOST, self.PORT)
+            console.info("Connected to %s:%s", self.HOST, self.PORT)
 
             # Start thread to listen for incoming messages
             threading.Thread(target=self.listen_for_messages, daemon=True).start()
@@ -199,24 +594,29 @@ class FujiHostInterface:
             self.send_setev()
             self.send_startev()
         except Exception as e:
-            backend_logger.error(f"Connection failed: {str(e)}")
-            print(f"Connection failed: {str(e)}")
+            backend_logger.error("Connection failed: %s", str(e))
+            console.info("Connection failed: %s", str(e))
             self.connected = False
             time.sleep(5)
 
 
 
+    @property
+    def seq_id(self):
+        """Last SeqID allocated for a host-initiated message"""
+        return self.seq.current
+
     def send_setev(self):
         """Send SETEV to enable events with ACK."""
-        self.seq_id += 1
+        seq_id = self.seq.next()
         events_with_ack = [f"{event}\t1" for event in EVENT_NAMES]
-        setev_msg = f"SETEV\t{self.seq_id}\t{MACHINE}\t{len(EVENT_NAMES)}\t" + "\t".join(events_with_ack)
+        setev_msg = f"SETEV\t{seq_id}\t{MACHINE}\t{len(EVENT_NAMES)}\t" + "\t".join(events_with_ack)
         self._send_message(setev_msg)
 
     def send_startev(self):
         """Send STARTEV to begin event notifications."""
-        self.seq_id += 1
-        startev_msg = f"STARTEV\t{self.seq_id}\t{MACHINE}"
+        seq_id = self.seq.next()
+        startev_msg = f"STARTEV\t{seq_id}\t{MACHINE}"
         self._send_message(startev_msg)
 
     def handle_keepalive(self, seq_id):
@@ -224,36 +624,66 @@ class FujiHostInterface:
         keepalive_ack = f"KEEPALIVE_ACK\t{seq_id}"
         self._send_message(keepalive_ack)
 
+    def _fast_keepalive(self, data):
+        """Answer a KEEPALIVE frame straight from its bytes, without logging or persistence.
+
+        Returns False when the frame should also go through the full pipeline (sampling).
+        """
+        seq_id = data[len(KEEPALIVE_FRAME):].rstrip(b"\x03")
+        ack = KEEPALIVE_ACK_PREFIX + seq_id + b"\x03"
+        with self.lock:
+            self.sock.sendall(struct.pack(">I", len(ack)) + ack)
+        self.keepalive_count += 1
+        self.last_keepalive = time.time()
+        return not (KEEPALIVE_SAMPLE_EVERY and self.keepalive_count % KEEPALIVE_SAMPLE_EVERY == 0)
+
+    def _housekeeping(self):
+        """Periodic work: day rotation, request timeouts, reel alerts and panel timers"""
+        today = datetime.now().strftime("%Y%m%d")
+        if today != self.current_day:
+            self._check_daily_rotation()
+            self.current_day = today
+        self.pending_requests.expire()
+        self._check_reel_alerts()
+        self._check_panel_timers()
+
+    def _housekeeping_loop(self):
+        """Housekeeping thread: runs every HOUSEKEEPING_INTERVAL, so timers fire on an idle line too"""
+        while True:
+            time.sleep(HOUSEKEEPING_INTERVAL)
+            try:
+                self._housekeeping()
+            except Exception as e:
+                backend_logger.error("Housekeeping error: %s", str(e))
+
+    def liveness(self):
+        return {'keepalives': self.keepalive_count,
+                'last_keepalive': iso(self.last_keepalive),
+                'since_keepalive': round(time.time() - self.last_keepalive, 1) if self.last_keepalive else None}
+
     def _send_message(self, raw_msg):
         """Thread-safe message sending."""
         with self.lock:
             try:
                 full_msg = self.build_message(raw_msg)
                 self.sock.sendall(full_msg)
-                # In _send_message():
-                log_entry = {
-                    'timestamp': datetime.now().strftime('%H:%M:%S'),
-                    'direction': 'sent',
-                    'raw': raw_msg
-                }
-                self.production_state['message_log'].append(log_entry)
-                # Keep log size manageable
-                if len(self.production_state['message_log']) > 10000:
-                    self.production_state['message_log'].pop(0)
-                print(f"Sent: {raw_msg} Time: {time.strftime('%H:%M:%S')}")
-                backend_logger.info(f"Sent: {raw_msg}")
-                # Log to database
-                self.log_production_event(
-                    seq_id=raw_msg.split('\t')[1],
-                    event_type="sent",
-                    event_name=raw_msg.split('\t')[0],
-                    raw_message=raw_msg
-                )
-                
+                self.production_state['message_log'].append('sent', raw_msg)
+                log = keepalive_logger if raw_msg.startswith("KEEPALIVE") else frame_logger
+                if log.isEnabledFor(logging.INFO):
+                    log.info("Sent: %s", raw_msg)
+                    console.info("Sent: %s", raw_msg)
             except Exception as e:
-                backend_logger.error(f"Error sending message: {str(e)}")
-                print(f"Send error: {e}")
+                backend_logger.error("Error sending message: %s", str(e))
+                console.info("Send error: %s", e)
                 self.connected = False
+                return
+        # Log to database, outside the send lock
+        self.log_production_event(
+            seq_id=raw_msg.split('\t')[1],
+            event_type="sent",
+            event_name=raw_msg.split('\t')[0],
+            raw_message=raw_msg
+        )
 
     def listen_for_messages(self):
         """Listen for incoming messages and handle them."""
@@ -272,24 +702,16 @@ class FujiHostInterface:
                 if not data:
                     break
                 
-                today = datetime.now().strftime("%Y%m%d")
-
-                if today != self.current_day:
-                    self._check_daily_rotation()
-                    self.current_day = today
+                if data.startswith(KEEPALIVE_FRAME) and self._fast_keepalive(data):
+                    continue
                 # Parse message (strip STX/ETX)
                 decoded = data.decode().strip("\x02\x03")
-                backend_logger.info(f"Received: {decoded}")
-                print(f"Received: {decoded} Time: {time.strftime('%H:%M:%S')}")
-
-                log_entry = {
-                    'timestamp': datetime.now().strftime('%H:%M:%S'),
-                    'direction': 'received',
-                    'raw': decoded
-                }
-                self.production_state['message_log'].append(log_entry)
-                if len(self.production_state['message_log']) > 10000:
-                    self.production_state['message_log'].pop(0)              
+                log = keepalive_logger if decoded.startswith("KEEPALIVE") else frame_logger
+                if log.isEnabledFor(logging.INFO):
+                    log.info("Received: %s", decoded)
+                    console.info("Received: %s", decoded)
+
+                self.production_state['message_log'].append('received', decoded)
                 
                 # Handle message types
                 parts = decoded.split("\t")
@@ -299,7 +721,8 @@ class FujiHostInterface:
                 elif command == "STARTEV_ACK":
                     self.handle_startev_ack(parts)
                 elif command == "KEEPALIVE":
-                    self.handle_keepalive(parts[1])
+                    # Sampled frame: already answered by _fast_keepalive
+                    pass
                 elif command == "PGCHANGEII":
                     self.handle_pgchangeii(parts)
                 elif command == "PRODSTARTED":
@@ -343,9 +766,10 @@ class FujiHostInterface:
                 )
 
             except Exception as e:
-                print(f" error Receive : {e}")
-                backend_logger.error(f" error Receive : {e}")
+                console.info(" error Receive : %s", e)
+                backend_logger.error(" error Receive : %s", e)
                 self.connected = False
+                self.pending_requests.fail_all(ConnectionError(f"Connection lost: {e}"))
                 break
 
     def handle_setev_ack(self, parts):
@@ -353,22 +777,22 @@ class FujiHostInterface:
         seq_id = parts[1]
         result = parts[3]
         if result == "0":
-            print("SETEV successful!")
-            backend_logger.info(f"SETEV successful! {result}")
+            console.info("SETEV successful!")
+            backend_logger.info("SETEV successful! %s", result)
         else:
-            print(f"SETEV NG! Result: {result}")
-            backend_logger.critical(f"SETEV NG! Result: {result}")
+            console.info("SETEV NG! Result: %s", result)
+            backend_logger.critical("SETEV NG! Result: %s", result)
 
     def handle_startev_ack(self, parts):
         """Process STARTEV_ACK reply."""
         seq_id = parts[1]
         result = parts[3]
         if result == "0":
-            print("Event notifications started!")
-            backend_logger.info(f"Event notifications started! {result}")
+            console.info("Event notifications started!")
+            backend_logger.info("Event notifications started! %s", result)
         else:
-            print(f"STARTEV failed! Result: {result}")
-            backend_logger.critical(f"STARTEV failed! Result: {result}")
+            console.info("STARTEV failed! Result: %s", result)
+            backend_logger.critical("STARTEV failed! Result: %s", result)
 
     def handle_unloadcomp(self, parts):
         """UNLOADCOMP: Parts Removal Notification (UNLOADCOMP)"""
@@ -383,7 +807,7 @@ class FujiHostInterface:
                 'quantity', 'remaining_time'
             ])
         }
-        backend_logger.info(f"Parts unloaded: {data}")
+        event_logger.info("Parts unloaded: %s", data)
         
         # Build UNLOADCOMP_ACK
         num_list = len(data['components'])
@@ -408,23 +832,51 @@ class FujiHostInterface:
         ack_msg = "\t".join(ack_parts)
         self._send_message(ack_msg)
 
+        for comp in data['components']:
+            self.unload_writer.add(time=data['time'],
+                                   machine=data['Machine'],
+                                   module=data['module'],
+                                   stage=comp['stage'],
+                                   slot=comp['slot'],
+                                   part_no=comp['part_no'],
+                                   feeder_id=comp['feeder_id'],
+                                   reel_id=comp['reel_id'],
+                                   quantity=_int_or_none(comp['quantity']),
+                                   remaining_time=_int_or_none(comp['remaining_time']))
+        self.process_unload(data['module'], data['components'])
+
     def handle_pgchangeii(self, parts):
         """6.9.1 Program Change Completion 2 (PGCHANGEII)"""
-        seq_id = parts[1]
-        data = {
-            "time": self._parse_time(parts[2]),
-            "LineName": parts[3],
-            "Machine": parts[4],
-            "ModuleNo": parts[5],
-            "LaneNo": parts[6],
-            "ProgramName": parts[7],
-            "components": self._parse_components(parts[9:], 3, ['stage', 'slot', 'parts'])
-        }
-        backend_logger.info(f"Program change: {data}")
+        try:
+            seq_id = parts[1]
+            data = {
+                "time": self._parse_time(parts[2]),
+                "LineName": parts[3],
+                "Machine": parts[4],
+                "ModuleNo": parts[5],
+                "LaneNo": parts[6],
+                "ProgramName": parts[7],
+                "components": self._parse_used_pg(parts, 8)
+            }
+            event_logger.info("Program change: %s", data)
         
-        # PGCHANGEIL_ACK format: SEQ_ID|RESULT|MACHINE|MODULE|LANE|PROGRAM
-        ack_msg = f"PGCHANGEIL_ACK\t{seq_id}\t0\t{data['Machine']}\t{data['ModuleNo']}\t{data['LaneNo']}\t{data['ProgramName']}"
-        self._send_message(ack_msg)
+            # PGCHANGEIL_ACK format: SEQ_ID|RESULT|MACHINE|MODULE|LANE|PROGRAM
+            ack_msg = f"PGCHANGEIL_ACK\t{seq_id}\t0\t{data['Machine']}\t{data['ModuleNo']}\t{data['LaneNo']}\t{data['ProgramName']}"
+            self._send_message(ack_msg)
+
+            # Every module reports the change; only the first one invalidates. The program may
+            # have been edited since its layout was cached, so that entry is fetched again
+            if data['ProgramName'] != self.production_state['current_program']:
+                self.production_state['current_program'] = data['ProgramName']
+                self.feeder_cache.invalidate(machine=MACHINE, program=data['ProgramName'])
+                self.verifier.activate(data['ProgramName'])
+            self.production_state['module_programs'][data['ModuleNo']] = data['ProgramName']
+            self.verifier.load_module(data['ProgramName'], data['ModuleNo'], data['components'])
+            # Warm the cache for the new program without blocking the receive loop
+            self.get_feeder_list(data['ProgramName'])
+
+        except Exception as e:
+            backend_logger.error("PGCHANGEII error: %s", str(e))
 
     def handle_prodstarted(self, parts):
         """6.13.1 Production Start Notification (PRODSTARTED)"""
@@ -439,7 +891,7 @@ class FujiHostInterface:
             "ProgramName": parts[8],
             "PanelNo": parts[9]
         }
-        backend_logger.info(f"Production started: {data}")
+        event_logger.info("Production started: %s", data)
         
         # PRODSTARTED_ACK format: SEQ_ID|RESULT|MACHINE|MODULE|LANE|PROD_MODE|PROGRAM|PANEL
         ack_msg = f"PRODSTARTED_ACK\t{seq_id}\t0\t{data['Machine']}\t{data['ModuleNo']}\t{data['LaneNo']}\t{data['ProdMode']}\t{data['ProgramName']}\t{data['PanelNo']}"
@@ -460,7 +912,7 @@ class FujiHostInterface:
             "BlockCount": parts[10],
             "BlockSkipCount": parts[11]
         }
-        backend_logger.info(f"Production completed: {data}")
+        event_logger.info("Production completed: %s", data)
         
         # PRODCOMPLETED_ACK format: SEQ_ID|RESULT|MACHINE|MODULE|LANE|PROD_MODE|PROGRAM|PANEL
         ack_msg = f"PRODCOMPLETED_ACK\t{seq_id}\t0\t{data['Machine']}\t{data['ModuleNo']}\t{data['LaneNo']}\t{data['ProdMode']}\t{data['ProgramName']}\t{data['PanelNo']}"
@@ -468,20 +920,30 @@ class FujiHostInterface:
 
     def handle_mcstatechange(self, parts):
         """6.15.1 Machine State Change (MCSTATECHANGE)"""
-        seq_id = parts[1]
-        data = {
-            "time": self._parse_time(parts[2]),
-            "LineName": parts[3],
-            "Machine": parts[4],
-            "ModuleNo": parts[5],
-            "PrevStatus": parts[6],
-            "CurrStatus": parts[7]
-        }
-        backend_logger.info(f"Machine state changed: {data}")
+        try:
+            seq_id = parts[1]
+            data = {
+                "time": self._parse_time(parts[2]),
+                "LineName": parts[3],
+                "Machine": parts[4],
+                "ModuleNo": parts[5],
+                "PrevStatus": parts[6],
+                "CurrStatus": parts[7]
+            }
+            event_logger.info("Machine state changed: %s", data)
         
-        # MCSTATECHANGE_ACK format: SEQ_ID|RESULT|MACHINE|MODULE
-        ack_msg = f"MCSTATECHANGE_ACK\t{seq_id}\t0\t{data['Machine']}\t{data['ModuleNo']}"
-        self._send_message(ack_msg)
+            # MCSTATECHANGE_ACK format: SEQ_ID|RESULT|MACHINE|MODULE
+            ack_msg = f"MCSTATECHANGE_ACK\t{seq_id}\t0\t{data['Machine']}\t{data['ModuleNo']}"
+            self._send_message(ack_msg)
+
+            closed = self.state_timeline.record(data['Machine'], data['ModuleNo'], data['time'].timestamp(),
+                                                data['PrevStatus'], data['CurrStatus'])
+            if closed:
+                self.log_state_interval(data['Machine'], data['ModuleNo'], *closed)
+                self.rollups.add_state(data['Machine'], data['ModuleNo'], *closed)
+
+        except Exception as e:
+            backend_logger.error("MCSTATECHANGE error: %s", str(e))
 
     def handle_mcalarmon(self, parts):
         """6.16.1 Machine Alarm ON (MCALARMON)"""
@@ -494,12 +956,15 @@ class FujiHostInterface:
             "ErrorCode": parts[6],
             "SubErrorCode": parts[7]
         }
-        backend_logger.info(f"Machine alarm ON: {data}")
+        event_logger.info("Machine alarm ON: %s", data)
         
         # MCALARMON_ACK format: SEQ_ID|RESULT|MACHINE|MODULE
         ack_msg = f"MCALARMON_ACK\t{seq_id}\t0\t{data['Machine']}\t{data['ModuleNo']}"
         self._send_message(ack_msg)
 
+        self.alarm_index.alarm_on(data['Machine'], data['ModuleNo'], data['ErrorCode'],
+                                  data['SubErrorCode'], data['time'].timestamp())
+
     def handle_mcalarmoff(self, parts):
         """6.17.1 Machine Alarm OFF (MCALARMOFF)"""
         seq_id = parts[1]
@@ -511,44 +976,100 @@ class FujiHostInterface:
             "ErrorCode": parts[6],
             "SubErrorCode": parts[7]
         }
-        backend_logger.info(f"Machine alarm OFF: {data}")
+        event_logger.info("Machine alarm OFF: %s", data)
         
         # MCALARMOFF_ACK format: SEQ_ID|RESULT|MACHINE|MODULE
         ack_msg = f"MCALARMOFF_ACK\t{seq_id}\t0\t{data['Machine']}\t{data['ModuleNo']}"
         self._send_message(ack_msg)
 
+        alarm = self.alarm_index.alarm_off(data['Machine'], data['ModuleNo'], data['ErrorCode'],
+                                           data['SubErrorCode'], data['time'].timestamp())
+        if alarm:
+            self.rollups.add_alarm(alarm['machine'], alarm['module'], alarm['start'], alarm['end'])
+            self.alarm_writer.add(machine=alarm['machine'],
+                                  module=alarm['module'],
+                                  error_code=alarm['error_code'],
+                                  sub_error_code=alarm['sub_error_code'],
+                                  start_time=datetime.fromtimestamp(alarm['start']),
+                                  end_time=datetime.fromtimestamp(alarm['end']),
+                                  duration=alarm['duration'])
+
     def handle_headusage(self, parts):
         """6.20.1 Head Pickup Count Report (HEADUSAGE)"""
         seq_id = parts[1]
+        # The spec gives 10 fields per head (HeadNo .. NoPickup). Older
+        # firmware sends 12, with two extra trailing fields, so take the
+        # block width from NumList and read the first 10 of each block.
+        blocks = parts[7:]
+        width = 10
+        try:
+            count = int(parts[6])
+            if count and len(blocks) % count == 0 and len(blocks) // count >= 10:
+                width = len(blocks) // count
+        except ValueError:
+            backend_logger.error("HEADUSAGE invalid NumList: %s", parts[6])
         data = {
             "time": self._parse_time(parts[2]),
             "LineName": parts[3],
             "Machine": parts[4],
             "ModuleNo": parts[5],
-            "components": self._parse_components(parts[7:], 12, [
+            "components": self._parse_components(blocks, width, [
                 'head_no', 'head_id', 'head_name', 'pickup_count',
                 'error_head', 'error_reject', 'reject_head',
                 'dislodged_head', 'rescan_count', 'no_pickup'
             ])
         }
-        backend_logger.info(f"Head usage report: {data}")
+        event_logger.info("Head usage report: %s", data)
         
         # HEADUSAGE_ACK format: SEQ_ID|RESULT|MACHINE|MODULE
         ack_msg = f"HEADUSAGE_ACK\t{seq_id}\t0\t{data['Machine']}\t{data['ModuleNo']}"
         self._send_message(ack_msg)
 
+        try:
+            self.heatmap.add_heads(data['ModuleNo'], data['components'], data['time'].timestamp())
+        except (ValueError, KeyError) as e:
+            backend_logger.error("HEADUSAGE counters error: %s", str(e))
+
         # Add to FujiHostInterface class
     
-    def send_feederlist_request(self, program_name="NXTIIIPAMH241005pin", group_name="PAM"):
-        """Send FEEDERLIST request to get feeder positions"""
-        self.seq_id += 1
+    def send_feederlist_request(self, program_name="NXTIIIPAMH241005pin", group_name=FEEDER_GROUP, timeout=20.0):
+        """Send FEEDERLIST request to get feeder positions.
+
+        Returns a concurrent Future resolved by the matching FEEDERLIST_ACK.
+        Several requests can be in flight at once, each tracked by its SeqID.
+        """
+        seq_id = self.seq.next()
         side=""
         current_time = datetime.now().strftime("%Y%m%d%H%M%S")
         feederlist_msg = (
-                f"FEEDERLIST\t{self.seq_id}\t{current_time}\t{LINE_NAME}\t{MACHINE}\t"
+                f"FEEDERLIST\t{seq_id}\t{current_time}\t{LINE_NAME}\t{MACHINE}\t"
                 f"{group_name}\t{program_name}{side}"
-            )        
+            )
+        future = self.pending_requests.register(seq_id, "FEEDERLIST", timeout)
         self._send_message(feederlist_msg)
+        if not self.connected:
+            self.pending_requests.fail(seq_id, ConnectionError("FEEDERLIST could not be sent"))
+        return future
+
+    def _feeder_cache_key(self, program_name, group_name=FEEDER_GROUP):
+        """FEEDERLIST is always requested for MACHINE, so entries are keyed and invalidated on it"""
+        return (MACHINE, group_name, program_name)
+
+    def get_feeder_list(self, program_name, group_name=FEEDER_GROUP, timeout=20.0, refresh=False):
+        """Cached FEEDERLIST lookup. Returns a Future of the parsed FEEDERLIST_ACK"""
+        key = self._feeder_cache_key(program_name, group_name)
+        if not refresh:
+            reply = self.feeder_cache.get(key)
+            if reply is not None:
+                future = Future()
+                future.set_result(reply)
+                return future
+            future = self.feeder_cache.inflight(key)
+            if future is not None:
+                return future
+        future = self.send_feederlist_request(program_name, group_name, timeout)
+        self.feeder_cache.track(key, future)
+        return future
 
     def handle_feederlist_ack(self, parts):
         """Process FEEDERLIST_ACK reply"""
@@ -559,44 +1080,61 @@ class FujiHostInterface:
         program = parts[5]
         
         feeder_data = []
-        if result == "0":
-            # Parse feeder position data
-            num_feeder = int(parts[6])
-            index = 7
-            
-            for _ in range(num_feeder):
-                module = parts[index]
-                stage = parts[index+1]
-                slot = parts[index+2]
-                feeder_name = parts[index+3]
-                qty = parts[index+4]
-                
-                # Parse parts
-                num_parts = int(parts[index+5])
-                parts_list = parts[index+6 : index+6+num_parts]
-                index += 6 + num_parts
-                
-                # Parse references
-                num_refs = int(parts[index])
-                refs_list = parts[index+1 : index+1+num_refs]
-                index += 1 + num_refs
-                
-                feeder_data.append({
-                    'module': module,
-                    'stage': stage,
-                    'slot': slot,
-                    'feeder_name': feeder_name,
-                    'qty': qty,
-                    'parts': parts_list,
-                    'references': refs_list
-                })
-                
-            backend_logger.info(f"Received feeder positions for {program}")
-            print("Feeder Position Data:")
-            for fd in feeder_data:
-                print(f"Module {fd['module']} | Slot {fd['slot']} | Feeder {fd['feeder_name']}")
-                print(f"-> Parts: {', '.join(fd['parts'])}")
-                print(f"-> Refs: {', '.join(fd['references'])}")
+        try:
+            if result == "0":
+                feeder_data = self._parse_feederlist(parts)
+                self.verifier.load_feeder_list(program, feeder_data)
+                backend_logger.info("Received feeder positions for %s", program)
+                console.info("Received %s feeder positions for %s", len(feeder_data), program)
+                self.process_feeder_data(program, feeder_data)
+            else:
+                backend_logger.warning("FEEDERLIST NG for %s! Result: %s", program, result)
+        except (ValueError, IndexError) as e:
+            backend_logger.error("FEEDERLIST_ACK parse error: %s", str(e))
+            self.pending_requests.fail(seq_id, e)
+            return
+
+        self.pending_requests.resolve(seq_id, "FEEDERLIST", {
+            'result': result,
+            'machine': machine,
+            'group': group,
+            'program': program,
+            'feeders': feeder_data
+        })
+
+    def _parse_feederlist(self, parts):
+        """Parse the feeder position blocks of a FEEDERLIST_ACK"""
+        feeder_data = []
+        num_feeder = int(parts[6])
+        index = 7
+
+        for _ in range(num_feeder):
+            module = parts[index]
+            stage = parts[index+1]
+            slot = parts[index+2]
+            feeder_name = parts[index+3]
+            qty = parts[index+4]
+
+            # Parse parts
+            num_parts = int(parts[index+5])
+            parts_list = parts[index+6 : index+6+num_parts]
+            index += 6 + num_parts
+
+            # Parse references
+            num_refs = int(parts[index])
+            refs_list = parts[index+1 : index+1+num_refs]
+            index += 1 + num_refs
+
+            feeder_data.append({
+                'module': intern(module),
+                'stage': intern(stage),
+                'slot': intern(slot),
+                'feeder_name': intern(feeder_name),
+                'qty': qty,
+                'parts': [intern(p) for p in parts_list],
+                'references': refs_list
+            })
+        return feeder_data
 
     def handle_bomlist(self, parts):
         """6.10.1 BOM list notification"""
@@ -627,21 +1165,12 @@ class FujiHostInterface:
             ack_msg = f"BOMLIST_ACK\t{seq_id}\t0\t{machine}\t{lane}\t{program}"
             self._send_message(ack_msg)
             
-            backend_logger.info(f"Received BOM list for {program}")
-            self.process_bom(bom_items)
+            backend_logger.info("Received BOM list for %s", program)
+            self.process_bom(program, bom_items)
 
         except Exception as e:
-            backend_logger.error(f"BOMLIST error: {str(e)}")
+            backend_logger.error("BOMLIST error: %s", str(e))
 
-    def process_bom(self, bom_items):
-        """Process BOM data"""
-        print("\n=== BOM List ===")
-        backend_logger.info("=== BOM List ===")
-        for item in bom_items:
-            
-            print(f"Block {item['block']}: Part {item['part']} ({item['reference']})")
-            backend_logger.info(f"Block {item['block']}: Part {item['part']} ({item['reference']})")
-    
 
     def handle_pcbcheckin(self, parts):
         """6.28.1 Panel checkin notification"""
@@ -659,11 +1188,14 @@ class FujiHostInterface:
             ack_msg = f"PCBCHECKIN_ACK\t{seq_id}\t0\t{machine}\t{lane}\t{program}\t{panel_id}"
             self._send_message(ack_msg)
             
-            backend_logger.info(f"Panel {panel_id} checked in")
-            self.process_panel_checkin(panel_id, msl_time)
+            backend_logger.info("Panel %s checked in", panel_id)
+            self.panel_writer.add(panel_id=panel_id, event='checkin', time=time, line=line,
+                                  machine=machine, lane=lane, program=program,
+                                  msl_minutes=_int_or_none(msl_time), status=None, components=None)
+            self.process_panel_checkin(panel_id, msl_time, time)
 
         except Exception as e:
-            backend_logger.error(f"PCBCHECKIN error: {str(e)}")
+            backend_logger.error("PCBCHECKIN error: %s", str(e))
         
     def handle_pcbcheckout(self, parts):
         """6.29.1 Panel checkout notification"""
@@ -683,31 +1215,32 @@ class FujiHostInterface:
             index = 11
             
             for _ in range(num_components):
-                comp = {
-                    'module': parts[index],
-                    'stage': parts[index+1],
-                    'slot': parts[index+2],
-                    'part': parts[index+3],
-                    'reel': parts[index+4],
-                    'feeder': parts[index+5],
-                    'pickups': parts[index+6],
-                    'errors': parts[index+7],
-                    'rejects': parts[index+8],
-                    'dislodged': parts[index+9],
-                    'nopickup': parts[index+10]
-                }
-                components.append(comp)
+                # A malformed block is dropped so the panel is still ACKed
+                try:
+                    components.append(Component(*parts[index:index+11]))
+                except (TypeError, ValueError) as e:
+                    backend_logger.warning("PCBCHECKOUT %s: skipped component block at field %s: %s",
+                                           panel_id, index, str(e))
                 index +=11
 
             # Send ACK
             ack_msg = f"PCBCHECKOUT_ACK\t{seq_id}\t0\t{machine}\t{lane}\t{program}\t{panel_id}"
             self._send_message(ack_msg)
             
-            backend_logger.info(f"Panel {panel_id} checked out")
-            self.process_panel_checkout(panel_id, components)
+            backend_logger.info("Panel %s checked out", panel_id)
+            self.panel_writer.add(panel_id=panel_id, event='checkout', time=time, line=line,
+                                  machine=machine, lane=lane, program=program,
+                                  msl_minutes=_int_or_none(msl_time), status=status,
+                                  components=len(components))
+            for comp in components:
+                self.component_writer.add(panel_id=panel_id, time=time, program=program, **comp.to_dict())
+            self.rollups.add_panel(machine, components, time.timestamp())
+            self.trace.record_panel(panel_id, components, line=line, machine=machine,
+                                    program=program, when=time.timestamp())
+            self.process_panel_checkout(panel_id, components, line=line, when=time.timestamp())
 
         except Exception as e:
-            backend_logger.error(f"PCBCHECKOUT error: {str(e)}")
+            backend_logger.error("PCBCHECKOUT error: %s", str(e))
 
      # Add to FujiHostInterface class
 
@@ -733,15 +1266,21 @@ class FujiHostInterface:
                 })
                 index +=3
 
+            for f in feeders:
+                f['result'], reason = self.verifier.verify_slot(module, f['stage'], f['slot'], program)
+                if reason:
+                    backend_logger.warning("FEEDERSETUP NG for feeder %s: %s", f['feeder_id'], reason)
+
             ack_msg = (f"FEEDERSETUP_ACK\t{seq_id}\t{machine}\t{module}\t{num_feeders}\t" +
-                    "\t".join([f"{f['stage']}\t{f['slot']}\t0\t{f['feeder_id']}" 
+                    "\t".join([f"{f['stage']}\t{f['slot']}\t{f['result']}\t{f['feeder_id']}" 
                                 for f in feeders]))
             self._send_message(ack_msg)
             
-            self.process_feeder_setup(feeders)
+            # Setting feeders does not change the program's planned layout, so the cache stays
+            self.process_feeder_setup(module, feeders)
 
         except Exception as e:
-            backend_logger.error(f"FEEDERSETUP error: {str(e)}")
+            backend_logger.error("FEEDERSETUP error: %s", str(e))
 
     def handle_partsrefill(self, parts):
         """6.25.1 Part resupply request"""
@@ -754,6 +1293,10 @@ class FujiHostInterface:
             slot = parts[6]
             
             refill_data = {
+                'time': time,
+                'module': module,
+                'stage': stage,
+                'slot': slot,
                 'feeder_id': parts[7],
                 'status': parts[8],
                 'comp_chg': parts[9],
@@ -780,13 +1323,34 @@ class FujiHostInterface:
                 })
                 index +=11
 
-            ack_msg = f"PARTSREFILL_ACK\t{seq_id}\t0"
+            result, reason = VERIFY_OK, None
+            for reel in refill_data['reels']:
+                result, reason = self.verifier.verify_part(module, stage, slot, reel['part_no'])
+                if result != VERIFY_OK:
+                    break
+
+            ack_msg = f"PARTSREFILL_ACK\t{seq_id}\t{result}"
             self._send_message(ack_msg)
+
+            for reel in refill_data['reels']:
+                self.refill_writer.add(time=time, machine=machine, module=module, stage=stage, slot=slot,
+                                       feeder_id=refill_data['feeder_id'],
+                                       reel_id=reel['reel_id'],
+                                       part_no=reel['part_no'],
+                                       vendor=reel['vendor'],
+                                       lot=reel['lot'],
+                                       datecode=reel['datecode'],
+                                       qty=_int_or_none(reel['qty']),
+                                       result=result)
             
+            if result != VERIFY_OK:
+                backend_logger.warning("PARTSREFILL NG at %s-%s-%s: %s", module, stage, slot, reason)
+                self.slot_state.apply(module, stage, slot, error=reason, event="PARTSREFILL_NG")
+                return
             self.process_parts_refill(refill_data)
 
         except Exception as e:
-            backend_logger.error(f"PARTSREFILL error: {str(e)}")
+            backend_logger.error("PARTSREFILL error: %s", str(e))
 
     def handle_slotsttchg(self, parts):
         """6.23.1 Change device status command"""
@@ -813,10 +1377,10 @@ class FujiHostInterface:
             ack_msg = f"SLOTSTTCHG_ACK\t{seq_id}\t0\t{machine}\t{module}"
             self._send_message(ack_msg)
             
-            self.process_slot_status_changes(changes)
+            self.process_slot_status_changes(module, changes)
 
         except Exception as e:
-            backend_logger.error(f"SLOTSTTCHG error: {str(e)}")
+            backend_logger.error("SLOTSTTCHG error: %s", str(e))
 
     def handle_errorreport(self, parts):
         """6.26.1 Error report"""
@@ -842,7 +1406,7 @@ class FujiHostInterface:
             self.process_error_report(error_data)
 
         except Exception as e:
-            backend_logger.error(f"ERRORREPORT error: {str(e)}")
+            backend_logger.error("ERRORREPORT error: %s", str(e))
 
     def handle_prodcompletedii(self, parts):
         """6.27.1 Production completed II"""
@@ -872,60 +1436,95 @@ class FujiHostInterface:
             self.process_production_complete_ii(prod_data)
 
         except Exception as e:
-            backend_logger.error(f"PRODCOMPLETEDII error: {str(e)}")
+            backend_logger.error("PRODCOMPLETEDII error: %s", str(e))
 
-    def process_bom(self, bom_items):
-        """Process and store BOM data with error handling"""
+    def process_bom(self, program, bom_items):
+        """Store a BOMLIST as a new version of the program's BOM when its content changed"""
         try:
-            backend_logger.info("Processing BOM data...")
-            self.production_state['bom_data'].clear()
-            
-            for item in bom_items:
-                part_number = item['part']
-                if part_number not in self.production_state['bom_data']:
-                    self.production_state['bom_data'][part_number] = {
-                        'references': [],
-                        'blocks': []
-                    }
-                
-                self.production_state['bom_data'][part_number]['references'].append(item['reference'])
-                self.production_state['bom_data'][part_number]['blocks'].append(item['block'])
-            
-            backend_logger.info(f"Processed {len(bom_items)} BOM items")
-            print(f"BOM updated with {len(self.production_state['bom_data'])} unique parts")
+            version, diff = self.bom_store.add(program, bom_items)
+            if diff is None:
+                backend_logger.info("BOM for %s unchanged (version %s)", program, version.version)
+                return
+            self.verifier.load_bom(program, version.part_refs)
+            received = datetime.fromtimestamp(version.received)
+            for (block, reference), part in version.items.items():
+                self.bom_writer.add(program=program, version=version.version, received=received,
+                                    block=block, part=part, reference=reference)
+            backend_logger.info("BOM for %s version %s: %s items, %s added, %s removed, %s changed",
+                                program, version.version, len(version.items),
+                                len(diff['added']), len(diff['removed']), len(diff['changed']))
+            if diff['from'] is not None:
+                for change in diff['changed']:
+                    backend_logger.info("BOM %s block %s %s: %s -> %s", program, change['block'],
+                                        change['reference'], change['from'], change['to'])
+            console.info("BOM for %s updated to version %s with %s unique parts", program, version.version, len(version.part_refs))
 
         except Exception as e:
-            backend_logger.error(f"BOM processing failed: {str(e)}")
+            backend_logger.error("BOM processing failed: %s", str(e))
             self._send_system_alert("BOM_PROCESSING_ERROR")
 
-    def process_panel_checkin(self, panel_id, msl_time):
+    def process_production_complete_ii(self, prod_data):
+        """Feed the PRODCOMPLETEDII cycle time into the per program/module sketches"""
+        try:
+            cycle_time = float(prod_data['cycle_time'])
+            self.cycle_times.add(prod_data['line'], prod_data['machine'], prod_data['module'],
+                                 prod_data['program'], cycle_time, prod_data['time'].timestamp())
+            self.cycle_writer.add(time=prod_data['time'],
+                                  line=prod_data['line'],
+                                  machine=prod_data['machine'],
+                                  module=prod_data['module'],
+                                  lane=prod_data['lane'],
+                                  program=prod_data['program'],
+                                  panel=prod_data['panel'],
+                                  blocks=_int_or_none(prod_data['blocks']),
+                                  skips=_int_or_none(prod_data['skips']),
+                                  cycle_time=cycle_time)
+            backend_logger.info("Production completed II: panel %s cycle time %s", prod_data['panel'], cycle_time)
+        except ValueError as ve:
+            backend_logger.error("Invalid cycle time: %s", str(ve))
+        except Exception as e:
+            backend_logger.error("Production complete II processing failed: %s", str(e))
+
+    def process_panel_checkin(self, panel_id, msl_time, checkin_time=None):
         """Handle panel check-in with validation"""
         try:
             if panel_id in self.production_state['active_panels']:
                 raise ValueError(f"Panel {panel_id} already in system")
             
-            self.production_state['active_panels'][panel_id] = {
-                'checkin_time': datetime.now(),
-                'msl_deadline': self._parse_time(msl_time),
-                'placement_data': {},
-                'status': 'IN_PROGRESS'
-            }
-            backend_logger.info(f"Panel {panel_id} checked in successfully")
-            print(f"New panel registered: {panel_id}")
+            checkin = (checkin_time or datetime.now()).timestamp()
+            # CriticalMslRemainingTime is the shortest remaining floor life in minutes
+            panel = PanelRecord(panel_id, checkin, checkin + int(msl_time) * 60)
+            self.production_state['active_panels'][panel_id] = panel
+            self.panel_timers.schedule(panel_id, 'msl_warning', panel.msl_deadline - MSL_WARNING_LEAD_TIME)
+            self.panel_timers.schedule(panel_id, 'msl_expired', panel.msl_deadline)
+            self.panel_timers.schedule(panel_id, 'stale', time.time() + PANEL_TTL)
+            backend_logger.info("Panel %s checked in successfully", panel_id)
+            console.info("New panel registered: %s", panel_id)
 
         except ValueError as ve:
-            backend_logger.warning(f"Invalid panel checkin: {str(ve)}")
+            backend_logger.warning("Invalid panel checkin: %s", str(ve))
         except Exception as e:
-            backend_logger.error(f"Panel checkin processing error: {str(e)}")
+            backend_logger.error("Panel checkin processing error: %s", str(e))
 
-    def process_panel_checkout(self, panel_id, components):
+    def process_panel_checkout(self, panel_id, components, line=LINE_NAME, when=None):
         """Process panel checkout and calculate metrics"""
         try:
-            if panel_id not in self.production_state['active_panels']:
+            # Retire the panel first so its MSL/stale timers cannot fire while stats update
+            panel_data = self.production_state['active_panels'].pop(panel_id, None)
+            self.panel_timers.cancel(panel_id, PANEL_TIMERS)
+
+            # Counters are valid even for panels checked in before a restart
+            self.panel_stats.add_panel(line, components, when)
+            self.heatmap.add_components(components, when)
+            for comp in components:
+                self.reel_queue.consume((int(comp['module']), int(comp['stage']), int(comp['slot'])),
+                                        int(comp['pickups']), when)
+            self._check_reel_alerts()
+
+            if panel_data is None:
                 raise KeyError(f"Unknown panel {panel_id}")
             
-            panel_data = self.production_state['active_panels'].pop(panel_id)
-            panel_data['checkout_time'] = datetime.now()
+            panel_data.checkout_time = int(time.time())
             
             # Calculate placement statistics
             total = 0
@@ -934,86 +1533,246 @@ class FujiHostInterface:
                 total += int(comp['pickups'])
                 errors += int(comp['errors']) + int(comp['rejects']) + int(comp['dislodged'])
             
-            panel_data['yield'] = ((total - errors) / total * 100) if total > 0 else 0
-            panel_data['components'] = components
+            panel_data.yield_pct = ((total - errors) / total * 100) if total > 0 else 0
             
-            backend_logger.info(f"Panel {panel_id} completed with {panel_data['yield']:.1f}% yield")
-            print(f"Panel {panel_id} checkout processed. Yield: {panel_data['yield']:.1f}%")
+            backend_logger.info("Panel %s completed with %.1f%% yield", panel_id, panel_data.yield_pct)
+            console.info("Panel %s checkout processed. Yield: %.1f%%", panel_id, panel_data.yield_pct)
 
         except KeyError as ke:
-            backend_logger.error(f"Panel checkout error: {str(ke)}")
+            backend_logger.error("Panel checkout error: %s", str(ke))
         except Exception as e:
-            backend_logger.error(f"Panel processing failed: {str(e)}")
+            backend_logger.error("Panel processing failed: %s", str(e))
+
+    def _module_program(self, module):
+        """Program a module is running: its last PGCHANGEII, else the line's current program"""
+        return self.production_state['module_programs'].get(module, self.production_state['current_program'])
+
+    def process_feeder_data(self, program, feeder_data):
+        """Merge the planned layout of a FEEDERLIST_ACK into the modules running `program`.
 
-    def process_feeder_data(self, feeder_data):
-        """Update feeder configuration state"""
+        Replies for other programs (lookups, prefetches) only feed the cache
+        and the verifier; they never touch the live slot state.
+        """
         try:
-            self.production_state['feeder_config'].clear()
+            # Parse everything first so a bad entry leaves the current state untouched
+            configs = [(fd, FeederConfig(fd['feeder_name'], fd['parts'], fd['references'], fd['qty']))
+                       for fd in feeder_data if self._module_program(fd['module']) == program]
+            planned = {}
+            for fd, config in configs:
+                planned.setdefault(int(fd['module']), {})[(int(fd['stage']), int(fd['slot']))] = (
+                    fd['parts'][0] if fd['parts'] else None, config.quantity)
+            if not planned:
+                backend_logger.info("Feeder positions for %s not applied: no module is running it", program)
+                return
+
+            feeder_config = self.production_state['feeder_config']
+            for key in [key for key in feeder_config if int(key.split("-", 1)[0]) in planned]:
+                del feeder_config[key]
+            for fd, config in configs:
+                feeder_config[f"{fd['module']}-{fd['stage']}-{fd['slot']}"] = config
+            for module, slots in planned.items():
+                self.slot_state.merge_plan(module, slots)
             
-            for fd in feeder_data:
-                config_key = f"{fd['module']}-{fd['stage']}-{fd['slot']}"
-                self.production_state['feeder_config'][config_key] = {
-                    'feeder_type': fd['feeder_name'],
-                    'part_numbers': fd['parts'],
-                    'references': fd['references'],
-                    'quantity': int(fd['quantity']),
-                    'last_updated': datetime.now()
-                }
-            
-            backend_logger.info(f"Updated {len(feeder_data)} feeder positions")
-            print(f"Feeder configuration updated with {len(self.production_state['feeder_config'])} entries")
+            backend_logger.info("Updated %s feeder positions", len(configs))
+            console.info("Feeder configuration updated with %s entries", len(self.production_state['feeder_config']))
 
         except ValueError as ve:
-            backend_logger.error(f"Invalid feeder data format: {str(ve)}")
+            backend_logger.error("Invalid feeder data format: %s", str(ve))
+        except Exception as e:
+            backend_logger.error("Feeder data processing failed: %s", str(e))
+
+    def process_feeder_setup(self, module, feeders):
+        """Record the feeders set on each slot (FEEDERSETUP)"""
+        try:
+            for f in feeders:
+                self.slot_state.apply(module, f['stage'], f['slot'],
+                                      feeder_id=f['feeder_id'],
+                                      status=None,
+                                      sub_status=None,
+                                      error=None,
+                                      event="FEEDERSETUP")
+            backend_logger.info("Feeder setup on module %s: %s slots", module, len(feeders))
+        except Exception as e:
+            backend_logger.error("Feeder setup processing failed: %s", str(e))
+
+    def process_slot_status_changes(self, module, changes):
+        """Apply SLOTSTTCHG device status changes"""
+        try:
+            for c in changes:
+                self.slot_state.apply(module, c['stage'], c['slot'],
+                                      status=c['status'],
+                                      sub_status=c['sub_status'],
+                                      event="SLOTSTTCHG")
+            backend_logger.info("Slot status changed on module %s: %s slots", module, len(changes))
         except Exception as e:
-            backend_logger.error(f"Feeder data processing failed: {str(e)}")
+            backend_logger.error("Slot status processing failed: %s", str(e))
+
+    def process_parts_refill(self, refill_data):
+        """Record the reels resupplied to a slot (PARTSREFILL)"""
+        try:
+            reels = refill_data['reels']
+            self.slot_state.apply(refill_data['module'], refill_data['stage'], refill_data['slot'],
+                                  feeder_id=refill_data['feeder_id'],
+                                  part_no=reels[0]['part_no'] if reels else None,
+                                  reel_id=reels[0]['reel_id'] if reels else None,
+                                  qty=sum(int(r['qty']) for r in reels),
+                                  error=None,
+                                  event="PARTSREFILL")
+            if reels:
+                key = (int(refill_data['module']), int(refill_data['stage']), int(refill_data['slot']))
+                self.reel_queue.load_reel(key, reels[0]['reel_id'], reels[0]['part_no'],
+                                          sum(int(r['qty']) for r in reels),
+                                          refill_data['time'].timestamp())
+            backend_logger.info("Parts refill at %s-%s-%s", refill_data['module'], refill_data['stage'], refill_data['slot'])
+        except Exception as e:
+            backend_logger.error("Parts refill processing failed: %s", str(e))
+
+    def process_unload(self, module, components):
+        """Apply UNLOADCOMP: a removed feeder empties the slot, a splice retires the old reel"""
+        try:
+            for comp in components:
+                self.reel_queue.unload((int(module), int(comp['stage']), int(comp['slot'])))
+                if comp['reel_id'] in ("", "Null"):
+                    self.slot_state.apply(module, comp['stage'], comp['slot'],
+                                          feeder_id=None, part_no=None, reel_id=None,
+                                          qty=0, remaining_time=None, status=None,
+                                          sub_status=None, error=None, event="UNLOADCOMP")
+                else:
+                    self.slot_state.apply(module, comp['stage'], comp['slot'],
+                                          remaining_time=int(comp['remaining_time']),
+                                          event="UNLOADCOMP")
+        except Exception as e:
+            backend_logger.error("Unload processing failed: %s", str(e))
 
     def process_error_report(self, error_data):
         """Handle error reports with severity classification"""
         try:
             error_entry = {
-                'timestamp': datetime.now(),
+                'timestamp': error_data['time'],
                 'module': error_data['module'],
+                'stage': error_data['stage'],
                 'slot': error_data['slot'],
                 'code': error_data['status'],
                 'coordinates': (error_data['x'], error_data['y']),
                 'qty_remaining': int(error_data['qty'])
             }
             
-            self.production_state['error_log'].append(error_entry)
+            self.error_index.add(error_data['module'], error_data['stage'], error_data['slot'],
+                                 error_data['status'], error_data['time'].timestamp())
+            self.rollups.add_error_report(error_data['machine'], error_data['module'],
+                                          error_data['time'].timestamp())
+            details = {'machine': error_data['machine'],
+                       'stage': error_data['stage'],
+                       'slot': error_data['slot'],
+                       'qty': error_entry['qty_remaining'],
+                       'tray_count': error_data['tray_count'],
+                       'x': error_data['x'],
+                       'y': error_data['y']}
+            slot_fields = {'error': error_data['status'], 'event': "ERRORREPORT"}
+            # Quantity is a fixed 0 for vision, processing and format errors
+            if error_data['status'] not in ('1', '998', '999'):
+                slot_fields['qty'] = error_entry['qty_remaining']
+            self.slot_state.apply(error_data['module'], error_data['stage'], error_data['slot'],
+                                  **slot_fields)
+            if 'qty' in slot_fields:
+                self.reel_queue.set_quantity(
+                    (int(error_data['module']), int(error_data['stage']), int(error_data['slot'])),
+                    slot_fields['qty'])
+                self._check_reel_alerts()
             
-            # Classify error severity
-            if error_data['status'] in ['900', '901', '902']:
+            # Critical errors are written by the flush thread right away, the rest in batches
+            if error_data['status'] in CRITICAL_ERROR_CODES:
+                self.error_writer.add_urgent(timestamp=error_data['time'],
+                                             error_code=error_data['status'],
+                                             module=error_data['module'],
+                                             details=details)
                 self._escalate_critical_error(error_entry)
-            
-            backend_logger.warning(f"Error logged: {error_data['status']} at {error_data['module']}")
-            print(f"Error {error_data['status']} recorded at module {error_data['module']}")
+            else:
+                self.error_writer.add(timestamp=error_data['time'],
+                                      error_code=error_data['status'],
+                                      module=error_data['module'],
+                                      details=details)
+                backend_logger.warning("Error %s at %s-%s-%s", error_data['status'],
+                                       error_data['module'], error_data['stage'], error_data['slot'])
 
         except Exception as e:
-            backend_logger.error(f"Error processing failed: {str(e)}")
+            backend_logger.error("Error processing failed: %s", str(e))
+
+    def _check_panel_timers(self):
+        """Act on MSL warnings, MSL expiries and stale panels whose timers fired"""
+        active = self.production_state['active_panels']
+        for panel_id, kind in self.panel_timers.advance():
+            panel = active.get(panel_id)
+            if panel is None:
+                continue
+            if kind == 'msl_warning':
+                panel.status = 'MSL_WARNING'
+                backend_logger.warning("Panel %s reaches its MSL limit at %s", panel_id, iso(panel.msl_deadline))
+            elif kind == 'msl_expired':
+                panel.status = 'MSL_EXPIRED'
+                backend_logger.error("Panel %s exceeded its MSL limit", panel_id)
+                self.log_panel_expiry(panel_id, panel, 'MSL_EXPIRED')
+            else:
+                del active[panel_id]
+                self.panel_timers.cancel(panel_id, PANEL_TIMERS)
+                backend_logger.warning("Panel %s evicted: no checkout within %ss", panel_id, PANEL_TTL)
+                self.log_panel_expiry(panel_id, panel, 'STALE')
+
+    def panels_near_msl(self, within=MSL_WARNING_LEAD_TIME):
+        """Active panels whose MSL limit is less than `within` seconds away, soonest first"""
+        now = time.time()
+        panels = []
+        for panel in list(self.production_state['active_panels'].values()):
+            remaining = panel.msl_deadline - now
+            if remaining <= within:
+                panels.append({**panel.to_dict(), 'remaining': round(remaining)})
+        return sorted(panels, key=lambda p: p['remaining'])
+
+    def _check_reel_alerts(self):
+        """Raise an alert for each reel that entered the depletion lead time"""
+        for alert in self.reel_queue.due():
+            with self._reel_alert_lock:
+                self.reel_alert_id += 1
+                alert['id'] = self.reel_alert_id
+                alert['time'] = datetime.now().isoformat()
+                self.reel_alerts.append(alert)
+            backend_logger.warning("Reel %s (%s) at %s-%s-%s runs out in %ss", alert['reel_id'],
+                                   alert['part_no'], alert['module'], alert['stage'], alert['slot'],
+                                   alert['depletes_in'])
 
     def _escalate_critical_error(self, error_entry):
         """Internal method for critical error handling"""
         alert_msg = (f"CRITICAL ERROR {error_entry['code']} | "
                     f"Module: {error_entry['module']} | "
-                    f"Slot: {error_entry['slot']} | "
+                    f"Slot: {error_entry['stage']}-{error_entry['slot']} | "
                     f"Qty Remaining: {error_entry['qty_remaining']}")
-        print(f"! SYSTEM ALERT ! {alert_msg}")
         backend_logger.critical(alert_msg)
+        # Picked up by the dashboard broadcast
+        self.critical_error_id += 1
+        self.critical_errors.append({'id': self.critical_error_id,
+                                     'time': error_entry['timestamp'].isoformat(),
+                                     'code': error_entry['code'],
+                                     'module': error_entry['module'],
+                                     'stage': error_entry['stage'],
+                                     'slot': error_entry['slot'],
+                                     'qty_remaining': error_entry['qty_remaining']})
         # Add actual notification logic here (email, SMS, etc.)
 
     def _send_system_alert(self, alert_type):
         """Unified alerting method"""
         alert_msg = f"{alert_type} | {datetime.now().isoformat()}"
-        print(f"! SYSTEM ALERT ! {alert_msg}")
+        console.info("! SYSTEM ALERT ! %s", alert_msg)
         backend_logger.critical(alert_msg)
 
     def close(self):
         """Close connection gracefully."""
         self.connected = False
+        self.pending_requests.fail_all(ConnectionError("Connection closed"))
+        self._flush_batches(force=True)
+        self._persist_cycle_time_sketches(self.current_db_date)
         if self.sock:
             self.sock.close()
-        print("Connection closed.")
+        console.info("Connection closed.")
 
 # Modify main execution block
 if __name__ == "__main__":
@@ -1026,7 +1785,7 @@ if __name__ == "__main__":
                 fuji.send_feederlist_request()
                 time.sleep(0.5)  # Debounce
             elif keyboard.is_pressed('c'):
-                backend_logger.info(f"close it by keyboard")
+                backend_logger.info("close it by keyboard")
                 fuji.close()
             time.sleep(0.1)
     except KeyboardInterrupt:
@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# test.py pulls in the hardware hotkey library at import time
+pytest.importorskip("keyboard")
+
+
+class FakeSocket:
+    """Collects the frames the interface sends, without STX/ETX and length header"""
+
+    def __init__(self):
+        self.sent = []
+
+    def sendall(self, data):
+        self.sent.append(data[5:-1].decode())
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fuji(tmp_path, monkeypatch):
+    """A connected FujiHostInterface writing its databases under tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    import test as interface
+    instance = interface.FujiHostInterface()
+    instance.sock = FakeSocket()
+    instance.connected = True
+    yield instance
+    instance.connected = False
+    instance._flush_batches(force=True)
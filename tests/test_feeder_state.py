@@ -0,0 +1,71 @@
+PROGRAM = "PROG-A"
+
+
+def pgchange(fuji, program, module="1", machine="NXT1"):
+    fuji.handle_pgchangeii(["PGCHANGEII", "1", "20261019080000", "LINE1", machine, module, "1", program,
+                            "1", "1", "1", "1", "PART-A"])
+
+
+def feederlist_ack(fuji, program, qty="500"):
+    fuji.handle_feederlist_ack(["FEEDERLIST_ACK", "9", "0", "NXT1", "PAM", program, "2",
+                                "1", "1", "1", "W08", qty, "1", "PART-A", "0",
+                                "1", "1", "2", "W08", qty, "1", "PART-B", "0"])
+
+
+def refill(fuji):
+    fuji.handle_partsrefill(["PARTSREFILL", "2", "20261019080100", "NXT1", "1", "1", "1",
+                             "FDR-1", "0", "0", "0", "1",
+                             "REEL-1", "PART-A", "V", "LOT", "DC", "0", "1200", "0", "0", "0", "0"])
+
+
+def test_feederlist_keeps_refilled_slot(fuji):
+    pgchange(fuji, PROGRAM)
+    refill(fuji)
+    feederlist_ack(fuji, PROGRAM)
+
+    slot = fuji.slot_state.get(1, 1, 1)
+    assert slot['feeder_id'] == "FDR-1"
+    assert slot['reel_id'] == "REEL-1"
+    assert slot['qty'] == 1200
+    # The planned layout fills the slot nothing was loaded on
+    planned = fuji.slot_state.get(1, 1, 2)
+    assert planned['part_no'] == "PART-B"
+    assert planned['qty'] == 500
+
+
+def test_feederlist_of_other_program_leaves_slots_alone(fuji):
+    pgchange(fuji, PROGRAM)
+    refill(fuji)
+    version = fuji.slot_state.version
+    feederlist_ack(fuji, "PROG-B", qty="1")
+
+    assert fuji.slot_state.version == version
+    assert fuji.slot_state.get(1, 1, 1)['reel_id'] == "REEL-1"
+    assert fuji.slot_state.get(1, 1, 2) is None
+    assert fuji.production_state['feeder_config'] == {}
+
+
+def test_feederlist_prefetch_is_cached_after_feeder_setup(fuji):
+    pgchange(fuji, PROGRAM)
+    request = fuji.sock.sent[-1].split("\t")
+    assert request[0] == "FEEDERLIST"
+    fuji.handle_feedersetup(["FEEDERSETUP", "3", "20261019080200", "LINE1", "NXT1", "1", PROGRAM,
+                             "1", "1", "1", "FDR-1"])
+    fuji.handle_feederlist_ack(["FEEDERLIST_ACK", request[1], "0", "NXT1", "PAM", PROGRAM, "1",
+                                "1", "1", "1", "W08", "500", "1", "PART-A", "0"])
+
+    future = fuji.get_feeder_list(PROGRAM)
+    assert future.done() and future.result()['program'] == PROGRAM
+    assert fuji.feeder_cache.stats()['hits'] == 1
+
+
+def test_program_change_invalidates_whatever_the_frame_machine_name(fuji):
+    pgchange(fuji, PROGRAM)
+    seq_id = fuji.sock.sent[-1].split("\t")[1]
+    fuji.handle_feederlist_ack(["FEEDERLIST_ACK", seq_id, "0", "NXT1", "PAM", PROGRAM, "0"])
+    assert fuji.feeder_cache.get(fuji._feeder_cache_key(PROGRAM)) is not None
+
+    pgchange(fuji, "PROG-B", machine="NXT1-M")
+    pgchange(fuji, PROGRAM, machine="NXT1-M")
+
+    assert fuji.feeder_cache.get(fuji._feeder_cache_key(PROGRAM)) is None
@@ -0,0 +1,29 @@
+from datetime import datetime
+
+import pytest
+
+# HeadNo HeadID HeadName PickupCount ErrorHead ErrorReject RejectHead DislodgedHead Rescancount NoPickup
+HEAD_1 = ["1", "H24G-1", "H24G", "1000", "20", "5", "3", "2", "4", "6"]
+HEAD_2 = ["2", "H24G-2", "H24G", "500", "0", "0", "0", "0", "0", "0"]
+
+
+def headusage(heads):
+    frame = ["HEADUSAGE", "7", "20261019090000", "LINE1", "NXT1", "3", str(len(heads))]
+    for head in heads:
+        frame.extend(head)
+    return frame
+
+
+def heads_between(fuji):
+    start = datetime(2026, 10, 19, 8).timestamp()
+    return fuji.heatmap.heatmap(start, start + 4 * 3600)['heads']
+
+
+@pytest.mark.parametrize("extra", [[], ["0", "0"]], ids=["spec-10-fields", "12-fields"])
+def test_headusage_blocks(fuji, extra):
+    fuji.handle_headusage(headusage([HEAD_1 + extra, HEAD_2 + extra]))
+
+    assert fuji.sock.sent[-1] == "HEADUSAGE_ACK\t7\t0\tNXT1\t3"
+    heads = heads_between(fuji)
+    assert heads['keys'] == [{'module': 3, 'head_no': 1}, {'module': 3, 'head_no': 2}]
+    assert heads['pickups'] == [1000, 500]
@@ -0,0 +1,211 @@
+import bisect
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Index
+from sqlalchemy.orm import sessionmaker, scoped_session, declarative_base
+
+from batch_writer import BatchWriter
+
+# Component fields a trace can be keyed on
+TRACE_KEYS = ('reel', 'feeder', 'part')
+
+TraceBase = declarative_base()
+
+
+class TraceUsage(TraceBase):
+    """One PCBCHECKOUT component block: what went onto which panel"""
+    __tablename__ = 'trace_usage'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    panel_id = Column(String)
+    checkout_time = Column(DateTime)
+    line = Column(String)
+    machine = Column(String)
+    program = Column(String)
+    module = Column(String)
+    stage = Column(String)
+    slot = Column(String)
+    part = Column(String)
+    reel = Column(String)
+    feeder = Column(String)
+    pickups = Column(Integer)
+    # Covering indexes: key + time range + panel, no table lookup needed
+    __table_args__ = (
+        Index('ix_trace_reel', 'reel', 'checkout_time', 'panel_id'),
+        Index('ix_trace_feeder', 'feeder', 'checkout_time', 'panel_id'),
+        Index('ix_trace_part', 'part', 'checkout_time', 'panel_id'),
+        Index('ix_trace_panel', 'panel_id', 'checkout_time'),
+    )
+
+
+def _posting_time(posting):
+    return posting[0]
+
+
+class RecentTraceIndex:
+    """In-memory inverted index over the last `window` seconds of checkouts.
+
+    A panel keeps one entry per checkout, so a panel that passes several
+    machines keeps the rows of each. Postings per key value are (time, panel)
+    pairs kept sorted and de-duplicated, so a range lookup is a bisect.
+    """
+
+    def __init__(self, window=24 * 3600):
+        self.window = window
+        self._by = {key: {} for key in TRACE_KEYS}
+        self._panels = {}
+        self._order = deque()
+        self.first_seen = None
+        self.latest = None
+
+    def horizon(self):
+        """Oldest time from which this index holds every checkout"""
+        if self.latest is None:
+            return None
+        return max(self.first_seen, self.latest - self.window)
+
+    def add(self, panel_id, when, rows):
+        if self.first_seen is None:
+            self.first_seen = when
+        self.latest = max(self.latest or when, when)
+        self._panels.setdefault(panel_id, []).append((when, rows))
+        posting = (when, panel_id)
+        for row in rows:
+            for key in TRACE_KEYS:
+                postings = self._by[key].setdefault(row[key], [])
+                if not postings or postings[-1] < posting:
+                    postings.append(posting)
+                else:
+                    # Checkout times from different machines can arrive slightly out of order
+                    i = bisect.bisect_left(postings, posting)
+                    if i == len(postings) or postings[i] != posting:
+                        postings.insert(i, posting)
+        self._order.append((when, panel_id))
+        self._evict()
+
+    def _evict(self):
+        horizon = self.latest - self.window
+        while self._order and self._order[0][0] < horizon:
+            when, panel_id = self._order.popleft()
+            checkouts = self._panels.get(panel_id)
+            if not checkouts:
+                continue
+            expired = [rows for t, rows in checkouts if t == when]
+            checkouts[:] = [(t, rows) for t, rows in checkouts if t != when]
+            if not checkouts:
+                del self._panels[panel_id]
+            for rows in expired:
+                for row in rows:
+                    for key in TRACE_KEYS:
+                        postings = self._by[key].get(row[key])
+                        if postings is None:
+                            continue
+                        del postings[:bisect.bisect_left(postings, horizon, key=_posting_time)]
+                        if not postings:
+                            del self._by[key][row[key]]
+
+    def panels(self, key, value, t1, t2):
+        postings = self._by[key].get(value, ())
+        lo = bisect.bisect_left(postings, t1, key=_posting_time)
+        hi = bisect.bisect_right(postings, t2, lo, key=_posting_time)
+        return set(postings[lo:hi])
+
+    def panel(self, panel_id):
+        """Rows of every recorded checkout of a panel, oldest first"""
+        checkouts = self._panels.get(panel_id)
+        if not checkouts:
+            return None
+        return [row for _, rows in sorted(checkouts, key=lambda c: c[0]) for row in rows]
+
+
+class TraceStore:
+    """Traceability index spanning days: SQLite tables plus a recent in-memory window"""
+
+    def __init__(self, path="traceability.db", window=24 * 3600):
+        self._lock = threading.Lock()
+        self.engine = create_engine(f'sqlite:///{path}')
+        TraceBase.metadata.create_all(self.engine)
+        self.Session = scoped_session(sessionmaker(bind=self.engine))
+        self.writer = BatchWriter(lambda: self.Session(), TraceUsage, max_rows=500, max_age=10.0)
+        self.recent = RecentTraceIndex(window)
+
+    def record_panel(self, panel_id, components, line=None, machine=None, program=None, when=None):
+        """Index the component blocks of one checked-out panel"""
+        when = when or time.time()
+        checkout_time = datetime.fromtimestamp(when)
+        line, machine, program = (sys.intern(v) if v else v for v in (line, machine, program))
+        rows = [{'panel_id': panel_id,
+                 'checkout_time': checkout_time,
+                 'line': line,
+                 'machine': machine,
+                 'program': program,
+                 'module': comp['module'],
+                 'stage': comp['stage'],
+                 'slot': comp['slot'],
+                 'part': comp['part'],
+                 'reel': comp['reel'],
+                 'feeder': comp['feeder'],
+                 'pickups': int(comp['pickups'])}
+                for comp in components]
+        with self._lock:
+            self.recent.add(panel_id, when, rows)
+        for row in rows:
+            self.writer.add(**row)
+
+    def panels(self, key, value, t1, t2):
+        """Panels that used a reel, feeder or part between t1 and t2, oldest first"""
+        if key not in TRACE_KEYS:
+            raise ValueError(f"Unknown trace key: {key}")
+        with self._lock:
+            horizon = self.recent.horizon()
+            if horizon is not None and t1 >= horizon:
+                hits = self.recent.panels(key, value, t1, t2)
+                return [{'panel_id': panel_id, 'checkout_time': datetime.fromtimestamp(when).isoformat()}
+                        for when, panel_id in sorted(hits)]
+        self.writer.flush()
+        column = getattr(TraceUsage, key)
+        session = self.Session()
+        try:
+            rows = (session.query(TraceUsage.panel_id, TraceUsage.checkout_time)
+                    .filter(column == value,
+                            TraceUsage.checkout_time >= datetime.fromtimestamp(t1),
+                            TraceUsage.checkout_time <= datetime.fromtimestamp(t2))
+                    .distinct()
+                    .order_by(TraceUsage.checkout_time)
+                    .all())
+            return [{'panel_id': panel_id, 'checkout_time': checkout_time.isoformat()}
+                    for panel_id, checkout_time in rows]
+        finally:
+            session.close()
+
+    def panel(self, panel_id):
+        """Every component block recorded for a panel"""
+        with self._lock:
+            rows = self.recent.panel(panel_id)
+            if rows is not None:
+                return [{**row, 'checkout_time': row['checkout_time'].isoformat()} for row in rows]
+        self.writer.flush()
+        session = self.Session()
+        try:
+            rows = (session.query(TraceUsage)
+                    .filter(TraceUsage.panel_id == panel_id)
+                    .order_by(TraceUsage.checkout_time)
+                    .all())
+            return [{'panel_id': r.panel_id,
+                     'checkout_time': r.checkout_time.isoformat(),
+                     'line': r.line,
+                     'machine': r.machine,
+                     'program': r.program,
+                     'module': r.module,
+                     'stage': r.stage,
+                     'slot': r.slot,
+                     'part': r.part,
+                     'reel': r.reel,
+                     'feeder': r.feeder,
+                     'pickups': r.pickups}
+                    for r in rows]
+        finally:
+            session.close()